@@ -4,13 +4,16 @@ from uuid import uuid4
 import requests
 
 import meniscus.api.correlation.correlation_exceptions as errors
+from meniscus.api.normalization.patterns import get_producer_patterns
 from meniscus.api.tenant.resources import MESSAGE_TOKEN
 from meniscus.api.utils.request import http_request
 from meniscus.data.cache_handler import ConfigCache
 from meniscus.data.cache_handler import TenantCache
 from meniscus.data.cache_handler import TokenCache
+from meniscus.data.model.util import find_event_producer
 from meniscus.data.model.util import find_event_producer_for_host
 from meniscus.data.model.util import find_host
+from meniscus.data.model.util import find_host_profile
 from meniscus.data.model.util import load_tenant_from_dict
 
 
@@ -58,6 +61,7 @@ class Correlator(object):
 
             #initialize correlation dictionary with default values
         correlation_dict = {
+            'tenant_id': self.tenant.tenant_id,
             'host_id': host.get_id(),
             'ep_id': None,
             'pattern': None,
@@ -67,6 +71,8 @@ class Correlator(object):
 
         producer = find_event_producer_for_host(
             self.tenant, host, self.message['pname'])
+        if not producer:
+            producer = self._match_event_producer(host)
 
         if producer:
             self._durable = producer.durable
@@ -93,6 +99,27 @@ class Correlator(object):
 
         #todo(sgonzales) pass message to normalization worker
 
+    def _match_event_producer(self, host):
+        """
+        returns the first event producer of the host's profile whose
+        pattern matches the text of the message, or None. Only used when
+        the pname names none of them, so a producer named by pname always
+        wins and a message matching no pattern is correlated as before.
+        """
+        text = self.message.get('msg')
+        if not host.profile or not isinstance(text, basestring):
+            return None
+
+        profile = find_host_profile(self.tenant, profile_id=host.profile)
+        if not profile or not profile.event_producers:
+            return None
+
+        match = get_producer_patterns(self.tenant).match(
+            text, profile.has_event_producer)
+        if not match:
+            return None
+        return find_event_producer(self.tenant, producer_id=match[0])
+
 
 class TenantIdentification(object):
     def __init__(self, tenant_id, message_token):
@@ -121,15 +148,13 @@ class TenantIdentification(object):
             #if tenant is not in cache, ask the coordinator
             if not tenant:
                 tenant = self._get_tenant_from_coordinator()
-                token_cache.set_token(self.tenant_id, tenant.token)
-                tenant_cache.set_tenant(tenant)
+                tenant_cache.set_many([tenant])
         else:
             self._validate_token_with_coordinator()
 
             #get tenant from coordinator
             tenant = self._get_tenant_from_coordinator()
-            token_cache.set_token(self.tenant_id, tenant.token)
-            tenant_cache.set_tenant(tenant)
+            tenant_cache.set_many([tenant])
 
         return tenant
 
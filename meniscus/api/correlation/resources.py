@@ -19,6 +19,8 @@ from meniscus.api.correlation.correlation_process \
     import validate_event_message_body
 from meniscus.api.tenant.resources import MESSAGE_TOKEN
 from meniscus.personas.common.routing import RoutingException
+from meniscus.personas.common.send_queue import SEND_QUEUE_RETRY_AFTER
+from meniscus.personas.common.send_queue import SendQueueFullException
 
 
 class PublishMessageResource(ApiResource):
@@ -58,9 +60,16 @@ class PublishMessageResource(ApiResource):
             correlator = Correlator(tenant, body)
             correlator.process_message()
             try:
-                self.router.route_message(correlator.message)
-            except RoutingException as ex:
+                #a durable message is only accepted once it was routed
+                self.router.route_message(correlator.message,
+                                          wait=correlator.is_durable())
+            except RoutingException:
                 abort(falcon.HTTP_500, 'error routing message')
+            except SendQueueFullException:
+                raise falcon.HTTPServiceUnavailable(
+                    'Service Unavailable',
+                    'message queue is full, retry later',
+                    SEND_QUEUE_RETRY_AFTER)
             if correlator.is_durable():
                 resp.status = falcon.HTTP_202
                 resp.body = format_response_body(
@@ -0,0 +1,170 @@
+import time
+
+from meniscus.api.normalization.drivers.rfc5424 import build_timestamp
+from meniscus.api.normalization.drivers.rfc5424 import get_parser
+from meniscus.api.normalization.drivers.rfc5424 import ParserError
+from meniscus.api.normalization.drivers.rfc5424 import SyslogMessage
+
+"""
+A parser for bsd style syslog messages as described in rfc3164
+
+    <PRI>Mmm dd hh:mm:ss HOSTNAME TAG[PID]: MSG
+
+and a sniffer that hands each message to the parser for its format. Both
+produce the same SyslogMessage as the rfc5424 parsers.
+"""
+
+FORMAT_RFC5424 = 'rfc5424'
+FORMAT_RFC3164 = 'rfc3164'
+
+#the index the > closing the priority is found before, as in <191>
+PRIORITY_END = 5
+
+#Mmm dd hh:mm:ss and the space after it
+TIMESTAMP_LENGTH = 16
+
+MONTHS = dict((name, '{0:02d}'.format(number)) for number, name in
+              enumerate(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul',
+                         'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], 1))
+
+
+def _not_syslog():
+    return ParserError('String is not a syslog message')
+
+
+def sniff_format(data, start=0, end=None):
+    """
+    returns the format of a syslog message told from the character after
+    its priority, a version digit for rfc5424 and the month of the
+    timestamp for rfc3164, or None if data is not a syslog message
+    """
+    if not data.startswith('<', start):
+        return None
+    close = data.find('>', start + 1, start + PRIORITY_END)
+    if close < start + 2 or not data[start + 1:close].isdigit() or (
+            end is not None and close + 1 >= end):
+        return None
+
+    following = data[close + 1:close + 2]
+    if following.isdigit():
+        return FORMAT_RFC5424
+    if following.isalpha():
+        return FORMAT_RFC3164
+    return None
+
+
+class RFC3164MessageParser(object):
+    """
+    The timestamp of an rfc3164 message has no year or offset. It is taken
+    to be in UTC and in the current year, or in the last year for a month
+    more than one ahead of the current one. Fields the format does not
+    carry are nil, as they would be in an rfc5424 message.
+    """
+
+    def parse(self, data, start=0, end=None):
+        if start or end is not None:
+            #rarely used, so the message is copied out rather than parsed
+            #in place
+            data = data[start:end]
+        if not data.startswith('<'):
+            raise _not_syslog()
+        close = data.find('>', 1, PRIORITY_END)
+        if close < 2 or not data[1:close].isdigit():
+            raise _not_syslog()
+
+        index = close + 1
+        header = data[index:index + TIMESTAMP_LENGTH]
+        month = MONTHS.get(header[:3])
+        if month is None or len(header) < TIMESTAMP_LENGTH or \
+                header[3] != ' ' or header[6] != ' ' or header[9] != ':' or \
+                header[12] != ':' or header[15] != ' ':
+            raise ParserError('Invalid rfc3164 timestamp')
+        day = header[4:6].lstrip(' ')
+        hours = header[7:9]
+        minutes = header[10:12]
+        seconds = header[13:15]
+        if not day.isdigit() or not (hours + minutes + seconds).isdigit():
+            raise ParserError('Invalid rfc3164 timestamp')
+
+        message = SyslogMessage()
+        message.priority = data[1:close]
+        message.timestamp = self.parse_datetime(
+            month, day, hours, minutes, seconds)
+        message.message_id = '-'
+
+        index += TIMESTAMP_LENGTH
+        hostname, index = self._next_word(data, index)
+        if hostname.endswith(':'):
+            #the hostname was left out and the word is the tag
+            tag = hostname
+            hostname = '-'
+        else:
+            tag, tag_end = self._next_word(data, index)
+            if tag.endswith(':'):
+                index = tag_end
+            else:
+                tag = ''
+        message.hostname = hostname or '-'
+
+        application = tag[:-1]
+        process_id = '-'
+        bracket = application.find('[')
+        if bracket > 0 and application.endswith(']'):
+            process_id = application[bracket + 1:-1]
+            application = application[:bracket]
+        message.application = application or '-'
+        message.process_id = process_id
+        message.message = data[index:]
+        return message
+
+    def _next_word(self, data, index):
+        """
+        returns the word at index and the index after the space that ends
+        it, or the word to the end of data and the length of data
+        """
+        space = data.find(' ', index)
+        if space < 0:
+            return data[index:], len(data)
+        return data[index:space], space + 1
+
+    def parse_datetime(self, month, day, hours, minutes, seconds):
+        now = time.gmtime()
+        year = now.tm_year
+        if int(month) > now.tm_mon + 1:
+            year -= 1
+        try:
+            return build_timestamp(str(year), month, day, hours, minutes,
+                                   seconds, '')
+        except ParserError:
+            raise ParserError('Invalid rfc3164 timestamp')
+
+
+class SyslogSniffer(object):
+    """
+    Parses syslog messages of either format with the parser for it, so
+    rfc3164 messages and lines that are not syslog at all are never run
+    through the rfc5424 parser only to fail. With lazy, rfc5424 messages
+    are scanned into messages that decode their fields when read, if the
+    rfc5424 parser can do so.
+    """
+
+    def __init__(self, rfc5424_parser=None, rfc3164_parser=None,
+                 lazy=False):
+        if rfc5424_parser is None:
+            rfc5424_parser = get_parser()
+        if rfc3164_parser is None:
+            rfc3164_parser = RFC3164MessageParser()
+        parse_rfc5424 = rfc5424_parser.parse
+        if lazy:
+            parse_rfc5424 = getattr(rfc5424_parser, 'parse_lazy',
+                                    parse_rfc5424)
+        self.parsers = {
+            FORMAT_RFC5424: parse_rfc5424,
+            FORMAT_RFC3164: rfc3164_parser.parse
+        }
+
+    def parse(self, data, start=0, end=None):
+        parse = self.parsers.get(sniff_format(data, start, end))
+        if parse is None:
+            raise _not_syslog()
+        return parse(data, start, end)
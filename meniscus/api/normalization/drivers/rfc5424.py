@@ -1,10 +1,63 @@
+import calendar
 from datetime import datetime
+from datetime import timedelta
+from datetime import tzinfo
 import re
+import time
+
+from oslo.config import cfg
+
+from meniscus.config import get_config
+from meniscus.config import init_config
 
 """
 A parser for the syslog rfc5424
 """
 
+PARSER_REGEX = 'regex'
+PARSER_SCANNER = 'scanner'
+
+#the most digits an rfc6587 octet count may have, counting the space after it
+OCTET_COUNT_DIGITS = 10
+
+# normalization configuration options
+_NORMALIZATION_GROUP = cfg.OptGroup(name='normalization',
+                                    title='Normalization Options')
+get_config().register_group(_NORMALIZATION_GROUP)
+
+_NORMALIZATION_OPTIONS = [
+    cfg.StrOpt('rfc5424_parser',
+               default=PARSER_REGEX,
+               help="""The engine used to parse syslog messages, either
+                       regex or scanner. The scanner produces the same
+                       messages several times faster."""
+               ),
+    cfg.BoolOpt('epoch_timestamps',
+                default=False,
+                help="""Give message timestamps as integer microseconds
+                        since the epoch instead of datetimes."""
+                ),
+    cfg.BoolOpt('defer_structured_data',
+                default=False,
+                help="""Keep the structured data of messages read by the
+                        scanner as text until an element is read."""
+                )
+]
+
+get_config().register_opts(_NORMALIZATION_OPTIONS, group=_NORMALIZATION_GROUP)
+try:
+    init_config()
+    conf = get_config()
+except cfg.ConfigFilesNotFoundError:
+    conf = get_config()
+
+RFC5424_PARSER = conf.normalization.rfc5424_parser
+EPOCH_TIMESTAMPS = conf.normalization.epoch_timestamps
+DEFER_STRUCTURED_DATA = conf.normalization.defer_structured_data
+
+#distinct timestamp prefixes and offsets kept before the caches are cleared
+TIMESTAMP_CACHE_SIZE = 1024
+
 
 class ParserError(Exception):
     """
@@ -32,10 +85,9 @@ class TailToken(object):
         self.source = source
 
     def __repr__(self):
-        return 'Token(Tokens.{0}, {1},'\
-            ' {2}, {3}, {4})'.format(self.type,
-                                     repr(self.value),
-                                     repr(self.source))
+        return 'Token(Tokens.{0}, {1}, {2})'.format(self.type,
+                                                   repr(self.value),
+                                                   repr(self.source))
 
     def matches(self, type):
         return self.type is type
@@ -59,8 +111,16 @@ class TailTokenizer(object):
         self.next_token()
 
     def next_token(self):
+        """
+        returns the next token, raising ParserError past the end of the
+        source. The lookahead is None once the source is used up.
+        """
         token = self.lookahead
-        self.lookahead = next(self)
+        if token is None and self.iter is None:
+            raise ParserError('Unexpected end of message')
+        self.lookahead = next(self, None)
+        if self.lookahead is None:
+            self.iter = None
         return token
 
     def __iter__(self):
@@ -116,7 +176,8 @@ class MessageTailParser(object):
     def parse_structured_data(self, name):
         structured_data = StructuredData(name)
 
-        while not self.tokenizer.lookahead.matches(TailToken.SD_END):
+        while self.tokenizer.lookahead is not None and \
+                not self.tokenizer.lookahead.matches(TailToken.SD_END):
             token = self.tokenizer.next_token()
 
             if not token.matches(TailToken.SD_PARAM_NAME):
@@ -144,6 +205,11 @@ class MessageTailParser(object):
 
 class SyslogMessage(object):
 
+    #slots keep the many messages in flight per worker free of a dict each
+    __slots__ = ('structured_data', 'priority', 'timestamp', 'hostname',
+                 'application', 'process_id', 'message', 'message_id',
+                 'version')
+
     def __init__(self):
         self.structured_data = []
         self.priority = None
@@ -167,9 +233,40 @@ class SyslogMessage(object):
                                            repr(self.structured_data),
                                            self.message)
 
+    def as_dict(self):
+        """
+        returns the message in the form the syslog persona routes
+        """
+        timestamp = self.timestamp
+        if hasattr(timestamp, 'isoformat'):
+            timestamp = timestamp.isoformat()
+        return {
+            'priority': self.priority,
+            'version': self.version,
+            'timestamp': timestamp,
+            'hostname': self.hostname,
+            'appname': self.application,
+            'processid': self.process_id,
+            'messageid': self.message_id,
+            'sd': routed_structured_data(self.structured_data),
+            'message': self.message
+        }
+
+
+def routed_structured_data(structured_data):
+    """
+    returns structured data in the form the syslog persona routes, deferred
+    structured data that was never read being routed as its text
+    """
+    if getattr(structured_data, 'unread', False):
+        return structured_data.raw
+    return dict((sd.name, dict(sd)) for sd in structured_data)
+
 
 class StructuredData(dict):
 
+    __slots__ = ('name',)
+
     def __init__(self, name):
         super(StructuredData, self).__init__()
         self.name = name
@@ -178,6 +275,126 @@ class StructuredData(dict):
         return 'StructuredData({0}, {1})'.format(self.name, dict(self))
 
 
+class TimezoneOffset(tzinfo):
+    """
+    A fixed offset from UTC in minutes
+    """
+
+    def __init__(self, minutes):
+        self.minutes = minutes
+        self.offset = timedelta(minutes=minutes)
+        hours, offset_minutes = divmod(abs(minutes), 60)
+        self.name = '{0}{1:02d}:{2:02d}'.format(
+            minutes < 0 and '-' or '+', hours, offset_minutes)
+
+    def __getinitargs__(self):
+        return (self.minutes,)
+
+    def __repr__(self):
+        return 'TimezoneOffset({0})'.format(self.minutes)
+
+    def utcoffset(self, dt):
+        return self.offset
+
+    def dst(self, dt):
+        return ZERO
+
+    def tzname(self, dt):
+        return self.name
+
+
+ZERO = timedelta(0)
+UTC = TimezoneOffset(0)
+
+
+class TimestampBuilder(object):
+    """
+    Builds offset aware timestamps, or integer microseconds since the epoch,
+    from the text of the timestamp fields. Messages from one source mostly
+    share their second and offset, so the timestamp up to the seconds is
+    kept for each distinct prefix and only the fraction is worked out for
+    every message.
+    """
+
+    def __init__(self, epoch=False, cache_size=TIMESTAMP_CACHE_SIZE):
+        self.epoch = epoch
+        self.cache_size = cache_size
+        self.seconds = dict()
+        self.timezones = dict()
+
+    def timezone(self, tz_sign, tz_hours, tz_minutes):
+        key = (tz_sign, tz_hours, tz_minutes)
+        timezone = self.timezones.get(key)
+        if timezone is None:
+            if int(tz_hours) > 23 or int(tz_minutes) > 59:
+                raise ValueError('offset out of range')
+            minutes = int(tz_hours) * 60 + int(tz_minutes)
+            if tz_sign == '-':
+                minutes = -minutes
+            if len(self.timezones) >= self.cache_size:
+                self.timezones.clear()
+            timezone = self.timezones[key] = TimezoneOffset(minutes)
+        return timezone
+
+    def build(self, year, month, day, hours, minutes, seconds,
+              fractional_seconds, tz_sign=None, tz_hours=None,
+              tz_minutes=None):
+        """
+        raises ParserError when a field is out of range, a date that does
+        not exist or an offset of a day or more
+        """
+        key = (year, month, day, hours, minutes, seconds,
+               tz_sign, tz_hours, tz_minutes)
+        try:
+            second = self.seconds.get(key)
+            if second is None:
+                if tz_sign:
+                    timezone = self.timezone(tz_sign, tz_hours, tz_minutes)
+                else:
+                    timezone = UTC
+                second = datetime(int(year), int(month), int(day),
+                                  int(hours), int(minutes), int(seconds), 0,
+                                  timezone)
+                if self.epoch:
+                    second = calendar.timegm(
+                        second.utctimetuple()) * 1000000
+                if len(self.seconds) >= self.cache_size:
+                    self.seconds.clear()
+                self.seconds[key] = second
+
+            #the fraction starts with its separator and is read to
+            #microseconds
+            microseconds = int((fractional_seconds[1:7] + '00000')[:6])
+        except ValueError:
+            raise ParserError('Invalid timestamp')
+        if self.epoch:
+            return second + microseconds
+        return second.replace(microsecond=microseconds)
+
+    def now(self):
+        """
+        returns the current time for messages that carry no timestamp
+        """
+        if self.epoch:
+            return int(time.time() * 1000000)
+        return datetime.now(UTC)
+
+
+TIMESTAMP_BUILDER = TimestampBuilder(EPOCH_TIMESTAMPS)
+
+
+def build_timestamp(year, month, day, hours, minutes, seconds,
+                    fractional_seconds, tz_sign=None, tz_hours=None,
+                    tz_minutes=None):
+    """
+    builds a timestamp from the text of the timestamp fields, tz_sign is
+    None when the timestamp is in UTC
+    """
+    return TIMESTAMP_BUILDER.build(year, month, day, hours, minutes,
+                                   seconds, fractional_seconds, tz_sign,
+                                   tz_hours, tz_minutes)
+
+
 class RFC5424MessageParser(object):
 
     PRIORITY = 1
@@ -213,8 +430,10 @@ class RFC5424MessageParser(object):
                             (?:-\s+)?(.+)
                             ''', re.X)
 
-    def parse(self, data):
-        match = self.HEAD_REGEX.match(data)
+    def parse(self, data, start=0, end=None):
+        if end is None:
+            end = len(data)
+        match = self.HEAD_REGEX.match(data, start, end)
 
         if not match:
             raise ParserError('String is not a syslog message')
@@ -233,7 +452,7 @@ class RFC5424MessageParser(object):
         if not match.group(self.EMPTY_DATETIME):
             message.timestamp = self.parse_datetime(match)
         else:
-            message.timestamp = datetime.now()
+            message.timestamp = TIMESTAMP_BUILDER.now()
 
         message.hostname = match.group(self.HOSTNAME)
         message.application = match.group(self.APPLICATION_NAME)
@@ -245,28 +464,122 @@ class RFC5424MessageParser(object):
         return message
 
     def parse_datetime(self, match):
-        year = int(match.group(self.YEAR))
-        month = int(match.group(self.MONTH))
-        day = int(match.group(self.DAY))
-        hours = int(match.group(self.HOURS))
-        minutes = int(match.group(self.MINUTES))
-        seconds = int(match.group(self.SECONDS))
-
-        fractional_seconds = float(match.group(self.FRACTIONAL_SECONDS))
-        microseconds = int(1000000 * fractional_seconds)
+        return build_timestamp(match.group(self.YEAR),
+                               match.group(self.MONTH),
+                               match.group(self.DAY),
+                               match.group(self.HOURS),
+                               match.group(self.MINUTES),
+                               match.group(self.SECONDS),
+                               match.group(self.FRACTIONAL_SECONDS),
+                               match.group(self.TZ_OFFSET_SIGN),
+                               match.group(self.TZ_OFFSET_HOURS),
+                               match.group(self.TZ_OFFSET_MINUTES))
+
+
+def get_parser(engine=RFC5424_PARSER):
+    """
+    returns a new parser for the named engine
+    """
+    if engine == PARSER_SCANNER:
+        #imported here as the scanner module builds on this one
+        from meniscus.api.normalization.drivers.rfc5424_scanner import \
+            RFC5424MessageScanner
+        return RFC5424MessageScanner()
+    if engine == PARSER_REGEX:
+        return RFC5424MessageParser()
+    raise ValueError('unknown rfc5424 parser: {0}'.format(engine))
 
-        if not match.group(self.EMPTY_TIMEZONE):
-            # Timezone offset specified
-            sign = match.group(self.TZ_OFFSET_SIGN) == '-' and -1 or 1
-            hours = hours + sign * int(match.group(self.TZ_OFFSET_HOURS))
-            minutes = minutes + sign * int(match.group(self.TZ_OFFSET_HOURS))
 
-        return datetime(year, month, day, hours, minutes,
-                        seconds, microseconds)
+_PARSER = None
 
 
-PARSER = RFC5424MessageParser()
+def _default_parser():
+    global _PARSER
+    if _PARSER is None:
+        _PARSER = get_parser()
+    return _PARSER
 
 
 def parse_rfc5424(self, msg):
-    return PARSER.parse(msg)
+    return _default_parser().parse(msg)
+
+
+def _skip_frame(buffer, index, length):
+    """
+    returns the index after the newline that ends the frame at index, used
+    to find the next frame after one whose framing is broken
+    """
+    end = buffer.find('\n', index)
+    if end < 0:
+        return length
+    return end + 1
+
+
+def parse_many(buffer, parser=None, final=False):
+    """
+    Parses the syslog frames in buffer, framed as in rfc6587 either by an
+    octet count and a space or by a trailing newline. Frames are parsed
+    where they lie in the buffer, the parser being given their offsets, so
+    a stream may be read into a buffer and handed over whole.
+
+    Returns the parsed messages, a list of (offset, ParserError) for the
+    frames that could not be parsed and the offset where the unfinished
+    frame at the end of the buffer begins, which is the length of the
+    buffer when every frame was complete. Passing final means no more
+    data will follow and a last frame without its newline is parsed too.
+    """
+    if parser is None:
+        parser = _default_parser()
+    messages = []
+    errors = []
+    length = len(buffer)
+    index = 0
+
+    while index < length:
+        character = buffer[index]
+        if character in '\r\n':
+            index += 1
+            continue
+
+        if '0' <= character <= '9':
+            # octet counting: MSG-LEN SP SYSLOG-MSG
+            separator = buffer.find(' ', index, index + OCTET_COUNT_DIGITS)
+            count = buffer[index:separator]
+            if separator < 0:
+                count = buffer[index:length]
+                if not final and count.isdigit() and \
+                        len(count) < OCTET_COUNT_DIGITS:
+                    break
+            if separator < 0 or not count.isdigit():
+                errors.append((index, ParserError(
+                    'Invalid octet count: {0}'.format(
+                        repr(count[:OCTET_COUNT_DIGITS])))))
+                index = _skip_frame(buffer, index, length)
+                continue
+            start = separator + 1
+            end = start + int(count)
+            if end > length:
+                if not final:
+                    break
+                errors.append((index, ParserError(
+                    'Frame ends before its octet count')))
+                index = length
+                continue
+            next_index = end
+        else:
+            # non-transparent framing: SYSLOG-MSG LF
+            start = index
+            end = buffer.find('\n', index)
+            if end < 0:
+                if not final:
+                    break
+                end = length
+            next_index = end + 1
+
+        try:
+            messages.append(parser.parse(buffer, start, end))
+        except ParserError as ex:
+            errors.append((index, ex))
+        index = next_index
+
+    return messages, errors, min(index, length)
@@ -0,0 +1,527 @@
+import re
+
+from meniscus.api.normalization.drivers.rfc5424 import build_timestamp
+from meniscus.api.normalization.drivers.rfc5424 import \
+    DEFER_STRUCTURED_DATA
+from meniscus.api.normalization.drivers.rfc5424 import ParserError
+from meniscus.api.normalization.drivers.rfc5424 import \
+    routed_structured_data
+from meniscus.api.normalization.drivers.rfc5424 import StructuredData
+from meniscus.api.normalization.drivers.rfc5424 import SyslogMessage
+from meniscus.api.normalization.drivers.rfc5424 import TIMESTAMP_BUILDER
+
+"""
+A single pass parser for the syslog rfc5424. It delimits the header fields
+with one match and walks the message tail by index instead of tokenizing
+the structured data, and produces the same SyslogMessage as
+RFC5424MessageParser. The loops are written out in place because function
+calls dominate the cost of parsing.
+"""
+
+WHITESPACE = ' \t\n\r\f\v'
+WORD_CHARACTERS = ('abcdefghijklmnopqrstuvwxyz'
+                   'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+                   '0123456789_')
+
+#the header fields are delimited in one match rather than walked a
+#character at a time, the timestamp being checked when it is decoded
+HEADER_FIELDS = re.compile(r'''
+                           <(\d{1,3})>(\d)
+                           \s+(\S+)
+                           \s+([^\s\[]+)
+                           \s+([^\s\[]+)
+                           \s+([^\s\[]+)
+                           \s+([^\s\[]+)
+                           \s+''', re.X)
+HEADER_GROUPS = xrange(1, 8)
+
+#the fraction of the seconds is any separator followed by digits
+TIMESTAMP = re.compile(r'''
+                       (\d+)-(\d+)-(\d+)
+                       T
+                       (\d+):(\d+):(\d+)([^\d\n]\d+)
+                       (?:Z|([+-])(\d+):(\d+))''', re.X)
+
+#the kinds of token found in the message tail
+SD_END = 1
+SD_NAME = 2
+SD_PARAM_NAME = 3
+SD_PARAM_VALUE = 4
+MSG = 5
+
+
+def _not_syslog():
+    return ParserError('String is not a syslog message')
+
+
+def _last_text(data, start, end):
+    """
+    returns the last index from start up to end that is not a newline,
+    or -1 if there is none
+    """
+    for index in xrange(end - 1, start - 1, -1):
+        if data[index] != '\n':
+            return index
+    return -1
+
+
+def _token_type(tail, index, length):
+    """
+    returns the type of the tail token at index, index being past any
+    whitespace
+    """
+    if index < length:
+        character = tail[index]
+        if character == ']':
+            return SD_END
+        if character == '[' and index + 1 < length and \
+                tail[index + 1] in WORD_CHARACTERS:
+            return SD_NAME
+        if character != '"':
+            if tail.find('=', index + 1) > index + 1:
+                return SD_PARAM_NAME
+        elif tail.find('"', index + 1) > 0:
+            return SD_PARAM_VALUE
+    return MSG
+
+
+def _name_end(tail, index):
+    """
+    returns the index after the SD-ID of the element at index
+    """
+    end = index + 2
+    while tail[end] in WORD_CHARACTERS:
+        end += 1
+    return end
+
+
+def _parse_element(tail, index, length):
+    """
+    parses the structured data element at index, a '[' followed by a word
+    character, and returns it along with the index after it
+    """
+    name_end = _name_end(tail, index)
+    structured_data = StructuredData(tail[index + 1:name_end])
+    return structured_data, _element_end(tail, name_end, length,
+                                         structured_data)
+
+
+def _element_end(tail, index, length, structured_data=None):
+    """
+    returns the index after the structured data element whose params start
+    at index, adding the params to structured_data when one is given.
+    Elements are only ever delimited here, so a deferred element ends where
+    the same element parsed eagerly does.
+    """
+    while True:
+        character = tail[index]
+        while character in WHITESPACE:
+            index += 1
+            character = tail[index]
+        if character == ']':
+            return index + 1
+
+        end = tail.find('=', index + 1)
+        if end <= index + 1 or character == '"' or (
+                character == '[' and tail[index + 1] in WORD_CHARACTERS):
+            raise ParserError('Expected structured data param '
+                              'name. Got: {0}'.format(
+                                  _token_type(tail, index, length)))
+        name_start = index
+
+        index = end + 1
+        character = tail[index]
+        while character in WHITESPACE:
+            index += 1
+            character = tail[index]
+        value_end = tail.find('"', index + 1)
+        if value_end < 0 or character != '"':
+            raise ParserError('Expected structured data param '
+                              'value. Got: {0}'.format(
+                                  _token_type(tail, index, length)))
+        if structured_data is not None:
+            structured_data[tail[name_start:end]] = tail[index + 1:value_end]
+        index = value_end + 1
+
+
+class DeferredStructuredData(object):
+    """
+    The structured data of a message kept as the text of the message tail
+    and the bounds of its elements. Elements are only parsed into
+    StructuredData when read, and get() parses just the elements with one
+    SD-ID, so messages that are only stored never build them. Elements are
+    delimited by the same walk over their params that parses them, so a
+    malformed element is rejected when the message is parsed, as it is
+    when parsing eagerly.
+    """
+
+    __slots__ = ('_tail', '_elements', '_parsed')
+
+    def __init__(self, tail, elements):
+        self._tail = tail
+        self._elements = elements
+        self._parsed = [None] * len(elements)
+
+    @property
+    def raw(self):
+        """
+        the text of the structured data section
+        """
+        bounds = [element for element in self._elements
+                  if element[1] is not None]
+        if not bounds:
+            return ''
+        return self._tail[bounds[0][1]:bounds[-1][2]]
+
+    @property
+    def unread(self):
+        """
+        whether there are elements and none has been read or appended, the
+        raw text then being all there is to the structured data
+        """
+        return bool(self._elements) and \
+            self._parsed.count(None) == len(self._parsed)
+
+    def _element(self, position):
+        structured_data = self._parsed[position]
+        if structured_data is None:
+            name, start, end = self._elements[position]
+            structured_data, end = _parse_element(
+                self._tail, start, len(self._tail) - 1)
+            self._parsed[position] = structured_data
+        return structured_data
+
+    def get(self, sd_id):
+        """
+        returns the elements with the given SD-ID
+        """
+        return [self._element(position)
+                for position, element in enumerate(self._elements)
+                if element[0] == sd_id]
+
+    def append(self, structured_data):
+        self._elements.append((structured_data.name, None, None))
+        self._parsed.append(structured_data)
+
+    def __len__(self):
+        return len(self._elements)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._element(element) for element in
+                    xrange(*position.indices(len(self._elements)))]
+        if position < 0:
+            position += len(self._elements)
+        if not 0 <= position < len(self._elements):
+            raise IndexError('structured data index out of range')
+        return self._element(position)
+
+    def __iter__(self):
+        for position in xrange(len(self._elements)):
+            yield self._element(position)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def parse_structured_data(raw):
+    """
+    returns the routed text of deferred structured data as the dict routed
+    for structured data parsed eagerly
+    """
+    length = len(raw)
+    tail = raw + '\0'
+    structured_data = dict()
+    index = 0
+    while True:
+        while tail[index] in WHITESPACE:
+            index += 1
+        if _token_type(tail, index, length) != SD_NAME:
+            if index < length:
+                raise ParserError('Expected structured data element')
+            return structured_data
+        element, index = _parse_element(tail, index, length)
+        structured_data[element.name] = dict(element)
+
+
+def _decode_field(start, end):
+    def decode(message):
+        offsets = message._offsets
+        return message._data[offsets[start]:offsets[end]]
+    return decode
+
+
+class _decoded(object):
+    """
+    Decodes a field of a LazySyslogMessage on first access and stores it on
+    the message, where later reads and assignments find it directly.
+    """
+
+    def __init__(self, name, decode):
+        self.name = name
+        self.decode = decode
+
+    def __get__(self, message, owner):
+        if message is None:
+            return self
+        value = self.decode(message)
+        message.__dict__[self.name] = value
+        return value
+
+
+class LazySyslogMessage(SyslogMessage):
+    """
+    A syslog message that keeps the line it was scanned from and the offsets
+    of its fields. Fields are sliced out of the line when first read; the
+    timestamp is only converted to a datetime and the structured data only
+    parsed when asked for, so errors in them are raised on access.
+    """
+
+    #decoded fields are kept in the instance dict
+    __slots__ = ('_scanner', '_data', '_length', '_offsets', '_received',
+                 '__dict__')
+
+    def __init__(self, scanner, data, length, offsets, received=None):
+        self._scanner = scanner
+        self._data = data
+        self._length = length
+        self._offsets = offsets
+        self._received = received
+
+    def _decode_timestamp(self):
+        if self._received is not None:
+            return self._received
+        timestamp_start, timestamp_end = self._offsets[4:6]
+        timestamp, end = self._scanner._parse_timestamp(
+            self._data, timestamp_start, self._length)
+        if end != timestamp_end:
+            raise _not_syslog()
+        return timestamp
+
+    def _decode_tail(self, name):
+        tail_start, tail_end = self._offsets[14:16]
+        structured_data, message = self._scanner._parse_tail(
+            self._data[tail_start:tail_end])
+        #keep a value assigned before the tail was parsed
+        self.__dict__.setdefault('structured_data', structured_data)
+        self.__dict__.setdefault('message', message)
+        return self.__dict__[name]
+
+    priority = _decoded('priority', _decode_field(0, 1))
+    version = _decoded('version', _decode_field(2, 3))
+    raw_timestamp = _decoded('raw_timestamp', _decode_field(4, 5))
+    hostname = _decoded('hostname', _decode_field(6, 7))
+    application = _decoded('application', _decode_field(8, 9))
+    process_id = _decoded('process_id', _decode_field(10, 11))
+    message_id = _decoded('message_id', _decode_field(12, 13))
+    timestamp = _decoded('timestamp', _decode_timestamp)
+    structured_data = _decoded(
+        'structured_data', lambda message: message._decode_tail(
+            'structured_data'))
+    message = _decoded(
+        'message', lambda message: message._decode_tail('message'))
+
+    def _routed_timestamp(self):
+        if 'timestamp' in self.__dict__ or self._received is not None or \
+                TIMESTAMP_BUILDER.epoch:
+            timestamp = self.timestamp
+            if hasattr(timestamp, 'isoformat'):
+                timestamp = timestamp.isoformat()
+            return timestamp
+        #checked, but routed as it was written
+        self._decode_timestamp()
+        return self._data[self._offsets[4]:self._offsets[5]]
+
+    def as_dict(self):
+        """
+        returns the message in the form the syslog persona routes, with the
+        timestamp as it was written unless it was read or assigned, the
+        message had none or timestamps are given as epoch microseconds.
+        Fields not yet read are sliced straight from the line.
+        """
+        if self.__dict__:
+            return {
+                'priority': self.priority,
+                'version': self.version,
+                'timestamp': self._routed_timestamp(),
+                'hostname': self.hostname,
+                'appname': self.application,
+                'processid': self.process_id,
+                'messageid': self.message_id,
+                'sd': routed_structured_data(self.structured_data),
+                'message': self.message
+            }
+
+        data = self._data
+        offsets = self._offsets
+        structured_data, message = self._scanner._parse_tail(
+            data[offsets[14]:offsets[15]])
+        return {
+            'priority': data[offsets[0]:offsets[1]],
+            'version': data[offsets[2]:offsets[3]],
+            'timestamp': self._routed_timestamp(),
+            'hostname': data[offsets[6]:offsets[7]],
+            'appname': data[offsets[8]:offsets[9]],
+            'processid': data[offsets[10]:offsets[11]],
+            'messageid': data[offsets[12]:offsets[13]],
+            'sd': routed_structured_data(structured_data),
+            'message': message
+        }
+
+
+class RFC5424MessageScanner(object):
+    """
+    Messages are parsed where they lie in data, between start and end, so
+    frames are not copied out of the buffer they were read into. Only the
+    fields are sliced from it.
+    """
+
+    def __init__(self, defer_structured_data=DEFER_STRUCTURED_DATA):
+        self.defer_structured_data = defer_structured_data
+
+    def parse(self, data, start=0, end=None):
+        length = len(data) if end is None else end
+        (priority_start, priority_end, version_start, version_end,
+         timestamp_start, timestamp_end, hostname_start, hostname_end,
+         application_start, application_end, process_id_start,
+         process_id_end, message_id_start, message_id_end, tail_start,
+         tail_end) = self._scan(data, start, length)
+
+        message = SyslogMessage()
+        #the tail is parsed first as it is where most malformed messages
+        #fail, and building the timestamp costs the most
+        message.structured_data, message.message = self._parse_tail(
+            data[tail_start:tail_end])
+        message.priority = data[priority_start:priority_end]
+        message.version = data[version_start:version_end]
+        if timestamp_end - timestamp_start == 1 and \
+                data[timestamp_start] == '-':
+            message.timestamp = TIMESTAMP_BUILDER.now()
+        else:
+            message.timestamp, end = self._parse_timestamp(
+                data, timestamp_start, length)
+            if end != timestamp_end:
+                raise _not_syslog()
+        message.hostname = data[hostname_start:hostname_end]
+        message.application = data[application_start:application_end]
+        message.process_id = data[process_id_start:process_id_end]
+        message.message_id = data[message_id_start:message_id_end]
+        return message
+
+    def parse_lazy(self, data, start=0, end=None):
+        """
+        scans the header of a message and returns a LazySyslogMessage that
+        decodes its fields when they are read
+        """
+        length = len(data) if end is None else end
+        offsets = self._scan(data, start, length)
+        received = None
+        if offsets[5] - offsets[4] == 1 and data[offsets[4]] == '-':
+            received = TIMESTAMP_BUILDER.now()
+        return LazySyslogMessage(self, data, length, offsets, received)
+
+    def _scan(self, data, start, length):
+        """
+        returns the start and end offsets of the header fields and the
+        message tail of the message from start up to length in data
+        """
+        match = HEADER_FIELDS.match(data, start, length)
+        if match is None:
+            raise _not_syslog()
+        span = match.span
+        offsets = [offset for group in HEADER_GROUPS
+                   for offset in span(group)]
+
+        tail_start = self._tail_start(data, offsets[-1], match.end(),
+                                      length)
+        tail_end = data.find('\n', tail_start, length)
+        if tail_end < 0:
+            tail_end = length
+        offsets.append(tail_start)
+        offsets.append(tail_end)
+        return offsets
+
+    def _parse_timestamp(self, data, index, length):
+        """
+        parses the timestamp at index and returns it along with the index
+        after it
+        """
+        match = TIMESTAMP.match(data, index, length)
+        if match is None:
+            raise _not_syslog()
+        timestamp = build_timestamp(*match.groups())
+        return timestamp, match.end()
+
+    def _tail_start(self, data, separator_start, index, length):
+        """
+        returns where the message tail starts given the whitespace after the
+        message id, skipping a nil structured data value. Mirrors the
+        backtracking of the regex parser when only whitespace remains.
+        """
+        if data.startswith('-', index, length) and index + 1 < length and \
+                data[index + 1] in WHITESPACE:
+            end = index + 1
+            while end < length and data[end] in WHITESPACE:
+                end += 1
+            if end < length and data[end] != '\n':
+                return end
+            start = _last_text(data, index + 2, end)
+            if start >= 0:
+                return start
+            return index
+
+        if index < length:
+            return index
+
+        start = _last_text(data, separator_start + 1, length)
+        if start < 0:
+            raise _not_syslog()
+        return start
+
+    def _parse_tail(self, tail):
+        """
+        returns the structured data and the message content of a tail
+        """
+        length = len(tail)
+        #a sentinel that is not whitespace or punctuation lets the loops
+        #below read one past the end without checking the length
+        tail += '\0'
+        defer = self.defer_structured_data
+        structured_data_list = []
+        index = 0
+
+        while True:
+            while tail[index] in WHITESPACE:
+                index += 1
+            token = _token_type(tail, index, length)
+            if token != SD_NAME:
+                break
+
+            if defer:
+                name_end = _name_end(tail, index)
+                end = _element_end(tail, name_end, length)
+                structured_data_list.append(
+                    (tail[index + 1:name_end], index, end))
+                index = end
+            else:
+                structured_data, index = _parse_element(tail, index, length)
+                structured_data_list.append(structured_data)
+
+        if defer:
+            structured_data_list = DeferredStructuredData(
+                tail, structured_data_list)
+
+        if token == SD_PARAM_VALUE and tail.startswith('""', index):
+            #the regex tokenizer read an empty quoted string as a
+            #message without content
+            return structured_data_list, None
+        if token != MSG:
+            raise ParserError('Expected syslog message content. '
+                              'Got: {0}'.format(token))
+        return structured_data_list, tail[index:length]
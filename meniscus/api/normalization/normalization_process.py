@@ -0,0 +1,335 @@
+from multiprocessing import Process
+from multiprocessing import Queue
+import threading
+import time
+
+from oslo.config import cfg
+from portal.env import get_logger
+from meniscus.api.normalization.drivers.rfc3164 import sniff_format
+from meniscus.api.normalization.drivers.rfc3164 import SyslogSniffer
+from meniscus.api.normalization.drivers.rfc5424 import ParserError
+from meniscus.api.normalization.drivers.rfc5424_scanner import \
+    parse_structured_data
+from meniscus.api.normalization.patterns import PATTERN_CACHE_SIZE
+from meniscus.api.normalization.patterns import PatternEngine
+from meniscus.api.utils import sys_assist
+from meniscus.config import get_config
+from meniscus.config import init_config
+from meniscus.personas.common.counters import SharedCounters
+from meniscus.personas.common.routing import Router
+from meniscus.personas.common.routing import RoutingException
+
+# normalization worker configuration options
+_NORMALIZATION_WORKERS_GROUP = cfg.OptGroup(
+    name='normalization_workers', title='Normalization Worker Options')
+get_config().register_group(_NORMALIZATION_WORKERS_GROUP)
+
+_NORMALIZATION_WORKERS_OPTIONS = [
+    cfg.IntOpt('processes',
+               default=0,
+               help="""Number of processes messages are normalized in. 0
+                       starts one per cpu core."""
+               ),
+    cfg.IntOpt('batch_size',
+               default=100,
+               help="""Maximum number of messages handed to a
+                       normalization process at a time."""
+               ),
+    cfg.FloatOpt('batch_linger',
+                 default=0.1,
+                 help="""Maximum time in seconds a message waits for its
+                         batch to fill before it is handed over."""
+                 ),
+    cfg.IntOpt('queue_size',
+               default=1000,
+               help="""Maximum number of batches waiting for a
+                       normalization process before new messages block."""
+               ),
+    cfg.IntOpt('pattern_cache_size',
+               default=PATTERN_CACHE_SIZE,
+               help="""Maximum number of compiled event producer patterns
+                       each normalization process keeps."""
+               ),
+    cfg.FloatOpt('restart_delay',
+                 default=1.0,
+                 help="""Time in seconds between checks that the
+                         normalization processes are alive, a process found
+                         dead is started again."""
+                 )
+]
+
+get_config().register_opts(_NORMALIZATION_WORKERS_OPTIONS,
+                           group=_NORMALIZATION_WORKERS_GROUP)
+try:
+    init_config()
+    conf = get_config()
+except cfg.ConfigFilesNotFoundError:
+    conf = get_config()
+
+NORMALIZATION_PROCESSES = conf.normalization_workers.processes
+NORMALIZATION_BATCH_SIZE = conf.normalization_workers.batch_size
+NORMALIZATION_BATCH_LINGER = conf.normalization_workers.batch_linger
+NORMALIZATION_QUEUE_SIZE = conf.normalization_workers.queue_size
+NORMALIZATION_PATTERN_CACHE_SIZE = \
+    conf.normalization_workers.pattern_cache_size
+NORMALIZATION_RESTART_DELAY = conf.normalization_workers.restart_delay
+
+WORKER_COUNTERS = ('messages', 'normalized', 'pattern_matches', 'errors',
+                   'routing_failures', 'restarts', 'busy_seconds')
+
+_LOG = get_logger('meniscus.api.normalization.normalization_process')
+
+#cee fields filled from the fields of a message read by the syslog persona
+SYSLOG_FIELDS = [
+    ('host', 'hostname'),
+    ('pname', 'appname'),
+    ('pid', 'processid'),
+    ('time', 'timestamp'),
+    ('msg', 'message'),
+    ('native', 'sd')
+]
+
+
+def _format_time(timestamp):
+    if hasattr(timestamp, 'isoformat'):
+        return timestamp.isoformat()
+    return timestamp
+
+
+def normalize_syslog_line(message, parser):
+    """
+    fills the cee fields of a message whose msg is an rfc5424 or rfc3164
+    syslog line, returns False when msg is not one
+    """
+    line = message.get('msg')
+    if not line or sniff_format(line) is None:
+        return False
+    try:
+        syslog_message = parser.parse(line)
+    except ParserError:
+        return False
+
+    message.setdefault('host', syslog_message.hostname)
+    message.setdefault('pname', syslog_message.application)
+    message.setdefault('pid', syslog_message.process_id)
+    message['time'] = _format_time(syslog_message.timestamp)
+    message['msg'] = syslog_message.message
+    if syslog_message.structured_data:
+        native = message.setdefault('native', dict())
+        for structured_data in syslog_message.structured_data:
+            native[structured_data.name] = dict(structured_data)
+    return True
+
+
+def normalize_syslog_fields(message):
+    """
+    fills the cee fields of a message sent on by the syslog persona from
+    its syslog fields, returns False when it has none
+    """
+    if 'hostname' not in message or 'message' not in message:
+        return False
+    for cee_field, syslog_field in SYSLOG_FIELDS:
+        if syslog_field in message and cee_field not in message:
+            message[cee_field] = message[syslog_field]
+    if isinstance(message.get('native'), basestring):
+        #structured data the scanner deferred is routed as its text
+        message['native'] = parse_structured_data(message['native'])
+    return True
+
+
+def normalize_message(message, parser):
+    """
+    adds the cee fields to a message that can be worked out from it,
+    returns False if the message was left as it was
+    """
+    return (normalize_syslog_line(message, parser) or
+            normalize_syslog_fields(message))
+
+
+class NormalizationPool(object):
+    """
+    Normalizes messages in a pool of processes and routes them on to
+    storage. Messages are handed to the processes in batches over a shared
+    queue, a batch being handed over once it is full or batch_linger
+    seconds after its first message. Each process has its own parser,
+    pattern engine, router and counters, and is started again if it exits.
+    The pool must be created before the processes that put messages into
+    it are forked.
+    """
+
+    def __init__(self, processes=NORMALIZATION_PROCESSES,
+                 batch_size=NORMALIZATION_BATCH_SIZE,
+                 batch_linger=NORMALIZATION_BATCH_LINGER,
+                 queue_size=NORMALIZATION_QUEUE_SIZE,
+                 pattern_cache_size=NORMALIZATION_PATTERN_CACHE_SIZE,
+                 restart_delay=NORMALIZATION_RESTART_DELAY,
+                 router_factory=Router):
+        self.processes = processes or int(sys_assist.get_cpu_core_count())
+        self.restart_delay = restart_delay
+        self._batch_size = batch_size
+        self._batch_linger = batch_linger
+        self._pattern_cache_size = pattern_cache_size
+        self._router_factory = router_factory
+        self._queue = Queue(queue_size)
+        self._batch = list()
+        self._lock = threading.RLock()
+        self._flush_timer = None
+        self._workers = [None] * self.processes
+        self._stopping = threading.Event()
+        self._supervisor = None
+        self.worker_stats = [SharedCounters(*WORKER_COUNTERS)
+                             for worker in range(self.processes)]
+
+    def _start_worker(self, worker_id):
+        worker = Process(target=self._work, args=(worker_id,))
+        worker.daemon = True
+        worker.start()
+        self._workers[worker_id] = worker
+
+    def start(self):
+        for worker_id in range(self.processes):
+            self._start_worker(worker_id)
+        self._supervisor = threading.Thread(target=self._supervise)
+        self._supervisor.daemon = True
+        self._supervisor.start()
+
+    def _supervise(self):
+        while not self._stopping.wait(self.restart_delay):
+            self.restart_exited()
+
+    def restart_exited(self):
+        """
+        start again the processes that have exited, so that the queue does
+        not fill up and block the messages put into it
+        """
+        for worker_id, worker in enumerate(self._workers):
+            if worker is not None and not worker.is_alive():
+                _LOG.error('Normalization process {0} exited with {1}, '
+                           'starting it again'.format(worker_id,
+                                                      worker.exitcode))
+                self.worker_stats[worker_id].increment('restarts')
+                self._start_worker(worker_id)
+
+    def stop(self):
+        """
+        hand over the last batch and wait for the processes to finish
+        """
+        self._stopping.set()
+        self.flush()
+        workers = [worker for worker in self._workers if worker is not None]
+        for worker in workers:
+            self._queue.put(None)
+        for worker in workers:
+            worker.join()
+        self._workers = [None] * self.processes
+
+    def put(self, message):
+        with self._lock:
+            self._batch.append(message)
+            if len(self._batch) >= self._batch_size:
+                self.flush()
+            else:
+                self._schedule_flush()
+
+    def put_many(self, messages):
+        for message in messages:
+            self.put(message)
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(
+                self._batch_linger, self._flush_on_timer)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._flush_timer = None
+            self.flush()
+
+    def flush(self):
+        """
+        hand the buffered messages to the processes as one batch, blocking
+        while the queue is full
+        """
+        with self._lock:
+            if not self._batch:
+                return
+            batch = self._batch
+            self._batch = list()
+            self._queue.put(batch)
+
+    def _work(self, worker_id):
+        parser = SyslogSniffer()
+        engine = PatternEngine(self._pattern_cache_size)
+        router = self._router_factory()
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                break
+            self.process_batch(worker_id, batch, parser, engine, router)
+
+        try:
+            router.flush()
+        except RoutingException:
+            pass
+
+    def process_batch(self, worker_id, batch, parser, engine, router):
+        """
+        normalize a batch, apply the event producer patterns and route its
+        messages, counting the work against the worker
+        """
+        start = time.time()
+        normalized = 0
+        pattern_matches = 0
+        errors = 0
+        routing_failures = 0
+        for message in batch:
+            if not isinstance(message, dict):
+                errors += 1
+                continue
+            try:
+                if normalize_message(message, parser):
+                    normalized += 1
+                if engine.apply(message):
+                    pattern_matches += 1
+            except Exception:
+                #one bad message must not take the batch and the process
+                #with it, it is stored as far as it was normalized
+                errors += 1
+                _LOG.exception('Failed to normalize a message')
+            try:
+                router.route_message(message)
+            except RoutingException:
+                #no storage worker is reachable, the message is dropped
+                routing_failures += 1
+
+        stats = self.worker_stats[worker_id]
+        stats.increment('messages', len(batch))
+        stats.increment('normalized', normalized)
+        stats.increment('pattern_matches', pattern_matches)
+        stats.increment('errors', errors)
+        stats.increment('routing_failures', routing_failures)
+        stats.increment('busy_seconds', time.time() - start)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def get_stats(self):
+        workers = dict()
+        messages = 0
+        for worker_id, counters in enumerate(self.worker_stats):
+            stats = counters.get_stats()
+            messages_per_second = 0
+            if stats['busy_seconds']:
+                messages_per_second = stats['messages'] / stats['busy_seconds']
+            stats['messages_per_second'] = messages_per_second
+            workers[str(worker_id)] = stats
+            messages += stats['messages']
+
+        return {
+            'processes': self.processes,
+            'depth': self.depth(),
+            'messages': messages,
+            'workers': workers
+        }
@@ -0,0 +1,382 @@
+from collections import deque
+import re
+
+from meniscus.data.cache_handler import LocalCache
+
+"""
+Event producer patterns describe the text of a producer's messages as
+literal text with fields, in the manner of liblognorm samples:
+
+    sshd[%pid:number%]: Accepted %method:word% for %user:word% from %ip:ipv4%
+
+A field is written %name:type%, %% is a literal percent sign. A pattern
+without fields names a rulebase, such as apache2.cee, and is not applied
+here.
+"""
+
+#the text each field type matches, besides quoted for the text between
+#double quotes and char-to:X for the text up to the character X
+FIELD_TYPES = {
+    'word': r'\S+',
+    'number': r'-?\d+',
+    'ipv4': r'\d{1,3}(?:\.\d{1,3}){3}',
+    'rest': r'.*'
+}
+
+#captured fields that are cee fields, everything else is native to the
+#event producer
+CEE_FIELDS = ('host', 'pname', 'pid', 'time', 'msg', 'pri', 'proto',
+              'action', 'domain', 'subject', 'object', 'status')
+
+PATTERN_CACHE_SIZE = 1000
+PRODUCER_PATTERNS_CACHE_SIZE = 100
+
+FIELD_NAME = re.compile(r'^[A-Za-z_]\w*$')
+
+
+class PatternError(Exception):
+    """Raised when an event producer pattern can not be compiled."""
+    pass
+
+
+def _field_expression(spec):
+    name, separator, field_type = spec.partition(':')
+    if not FIELD_NAME.match(name):
+        raise PatternError('Invalid field name: {0}'.format(name))
+
+    if field_type.startswith('char-to:') and len(field_type) == 9:
+        return '(?P<{0}>[^{1}]*)'.format(name, re.escape(field_type[8]))
+    if field_type == 'quoted':
+        return '"(?P<{0}>[^"]*)"'.format(name)
+    if field_type not in FIELD_TYPES:
+        raise PatternError('Unknown field type: {0}'.format(field_type))
+    return '(?P<{0}>{1})'.format(name, FIELD_TYPES[field_type])
+
+
+def compile_pattern(pattern):
+    """
+    returns the CompiledPattern for a pattern, or None for a pattern that
+    names a rulebase. Raises PatternError for a malformed pattern.
+    """
+    if '%' not in pattern:
+        return None
+
+    parts = pattern.split('%')
+    if len(parts) % 2 == 0:
+        raise PatternError('Unterminated field in pattern')
+
+    expression = []
+    literals = []
+    literal = ''
+    for position, part in enumerate(parts):
+        if position % 2 == 0:
+            literal += part
+        elif not part:
+            #%% is a literal percent sign
+            literal += '%'
+        else:
+            literals.append(literal)
+            expression.append(re.escape(literal))
+            expression.append(_field_expression(part))
+            literal = ''
+    literals.append(literal)
+    expression.append(re.escape(literal))
+
+    try:
+        regex = re.compile(''.join(expression) + r'\Z', re.S)
+    except re.error as ex:
+        raise PatternError('Invalid pattern: {0}'.format(ex))
+    if not regex.groupindex:
+        return None
+    return CompiledPattern(regex, max(literals, key=len), literals[0])
+
+
+class CompiledPattern(object):
+    """
+    A pattern compiled to a regular expression, along with its longest
+    literal and the literal it starts with. Text that does not contain
+    them can not match, which is checked before running the expression.
+    """
+
+    def __init__(self, regex, required, prefix):
+        self.regex = regex
+        self.required = required
+        self.prefix = prefix
+
+    def prefilter(self, text):
+        return text.startswith(self.prefix) and self.required in text
+
+    def match(self, text):
+        """
+        returns the fields of text, or None if it does not match
+        """
+        if not self.prefilter(text):
+            return None
+        match = self.regex.match(text)
+        if match is None:
+            return None
+        return match.groupdict()
+
+
+class PatternEngine(object):
+    """
+    Applies event producer patterns to the text of messages. Patterns are
+    compiled on first use and kept in a least recently used cache keyed
+    by tenant, event producer and pattern, so a changed pattern is compiled
+    again and unused ones are evicted.
+    """
+
+    def __init__(self, cache_size=PATTERN_CACHE_SIZE):
+        self.cache = LocalCache(cache_size)
+        self.stats = dict(compiled=0, invalid=0, matched=0, unmatched=0,
+                          prefiltered=0)
+
+    def get_pattern(self, tenant_id, producer_id, pattern):
+        """
+        returns the compiled pattern, or None if the pattern is a rulebase
+        name or can not be compiled
+        """
+        key = (tenant_id, producer_id, hash(pattern))
+        #patterns that compile to None are cached in a tuple
+        entry = self.cache.get(key)
+        if entry is None:
+            try:
+                entry = (compile_pattern(pattern),)
+                self.stats['compiled'] += 1
+            except PatternError:
+                entry = (None,)
+                self.stats['invalid'] += 1
+            self.cache.set(key, entry, 0)
+        return entry[0]
+
+    def apply(self, message):
+        """
+        fills the fields of a message from the text of its msg with the
+        pattern of its event producer, returns True if the pattern matched
+        """
+        correlation = message.get('meniscus', dict()).get(
+            'correlation', dict())
+        pattern = correlation.get('pattern')
+        text = message.get('msg')
+        if not pattern or not isinstance(text, basestring):
+            return False
+
+        compiled = self.get_pattern(correlation.get('tenant_id'),
+                                    correlation.get('ep_id'), pattern)
+        if compiled is None:
+            return False
+        if not compiled.prefilter(text):
+            self.stats['prefiltered'] += 1
+            return False
+
+        match = compiled.regex.match(text)
+        if match is None:
+            self.stats['unmatched'] += 1
+            return False
+
+        self.stats['matched'] += 1
+        for name, value in match.groupdict().items():
+            if name in CEE_FIELDS:
+                message[name] = value
+            else:
+                message.setdefault('native', dict())[name] = value
+        return True
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['cached'] = len(self.cache)
+        return stats
+
+
+class LiteralMatcher(object):
+    """
+    Finds which of a set of literals occur in a text in one pass over it,
+    with an Aho-Corasick automaton. Literals are added to and removed from
+    the trie as they change, and the failure links are rebuilt on the first
+    search after a literal was added.
+    """
+
+    def __init__(self):
+        self._goto = [dict()]
+        self._outputs = [set()]
+        self._fail = [0]
+        self._report = [0]
+        self._nodes = dict()
+        self._always = set()
+        self._linked = True
+
+    def __len__(self):
+        return len(self._nodes) + len(self._always)
+
+    def add(self, literal, value):
+        """
+        reports value whenever literal occurs in a searched text, an empty
+        literal occurs in every text
+        """
+        self.discard(value)
+        if not literal:
+            self._always.add(value)
+            return
+
+        node = 0
+        for char in literal:
+            following = self._goto[node].get(char)
+            if following is None:
+                following = len(self._goto)
+                self._goto[node][char] = following
+                self._goto.append(dict())
+                self._outputs.append(set())
+            node = following
+        self._outputs[node].add(value)
+        self._nodes[value] = node
+        self._linked = False
+
+    def discard(self, value):
+        #the trie keeps the nodes of a removed literal, they report nothing
+        self._always.discard(value)
+        node = self._nodes.pop(value, None)
+        if node is not None:
+            self._outputs[node].discard(value)
+
+    def _link(self):
+        goto = self._goto
+        outputs = self._outputs
+        fail = [0] * len(goto)
+        report = [0] * len(goto)
+
+        #breadth first, so the links of shorter prefixes are set first
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, following in goto[node].iteritems():
+                queue.append(following)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[following] = target
+                #the nearest node down the failure links with literals
+                report[following] = target if outputs[target] \
+                    else report[target]
+
+        self._fail = fail
+        self._report = report
+        self._linked = True
+
+    def search(self, text):
+        """
+        returns the set of values whose literals occur in text
+        """
+        if not self._linked:
+            self._link()
+
+        goto = self._goto
+        outputs = self._outputs
+        fail = self._fail
+        report = self._report
+        found = set(self._always)
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            match = node if outputs[node] else report[node]
+            while match:
+                found.update(outputs[match])
+                match = report[match]
+        return found
+
+
+class ProducerPatterns(object):
+    """
+    The compiled patterns of a tenant's event producers, with a literal
+    matcher over their longest literals that narrows the producers whose
+    pattern can match a text down to a few candidates in one pass.
+    """
+
+    def __init__(self):
+        self.patterns = dict()
+        self.matcher = LiteralMatcher()
+        self.tenant = None
+        self.version = None
+
+    def __len__(self):
+        return len(self.matcher)
+
+    def update(self, producer_id, pattern):
+        """
+        adds or replaces the pattern of an event producer, patterns that
+        are unchanged are left alone
+        """
+        current = self.patterns.get(producer_id)
+        if current is not None and current[0] == pattern:
+            return
+
+        try:
+            compiled = compile_pattern(pattern)
+        except PatternError:
+            compiled = None
+        self.patterns[producer_id] = (pattern, compiled)
+        if compiled is None:
+            self.matcher.discard(producer_id)
+        else:
+            self.matcher.add(compiled.required, producer_id)
+
+    def remove(self, producer_id):
+        self.patterns.pop(producer_id, None)
+        self.matcher.discard(producer_id)
+
+    def sync(self, event_producers):
+        """
+        brings the patterns up to date with a list of event producers,
+        only the producers that were added, changed or removed are touched
+        """
+        current = dict((producer.get_id(), producer.pattern)
+                       for producer in event_producers)
+        for producer_id in self.patterns.keys():
+            if producer_id not in current:
+                self.remove(producer_id)
+        for producer_id, pattern in current.iteritems():
+            self.update(producer_id, pattern)
+
+    def candidates(self, text):
+        """
+        returns the ids of the producers whose longest literal occurs in
+        text, in order
+        """
+        return sorted(self.matcher.search(text))
+
+    def match(self, text, accept=None):
+        """
+        returns the id of the first candidate producer accepted by accept
+        whose pattern matches text along with the fields, or None
+        """
+        for producer_id in self.candidates(text):
+            if accept is not None and not accept(producer_id):
+                continue
+            fields = self.patterns[producer_id][1].match(text)
+            if fields is not None:
+                return producer_id, fields
+        return None
+
+
+#the producer patterns of the tenants recently seen by this process
+_PRODUCER_PATTERNS = LocalCache(PRODUCER_PATTERNS_CACHE_SIZE)
+
+
+def get_producer_patterns(tenant):
+    """
+    returns the producer patterns of a tenant, synced with its event
+    producers whenever the tenant was reloaded or has changed since
+    """
+    patterns = _PRODUCER_PATTERNS.get(tenant.tenant_id)
+    if patterns is None:
+        patterns = ProducerPatterns()
+        _PRODUCER_PATTERNS.set(tenant.tenant_id, patterns, 0)
+
+    if patterns.tenant is not tenant or patterns.version != tenant.version:
+        patterns.sync(tenant.event_producers)
+        #holding on to the tenant keeps its identity from being reused
+        patterns.tenant = tenant
+        patterns.version = tenant.version
+    return patterns
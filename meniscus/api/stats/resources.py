@@ -0,0 +1,24 @@
+import falcon
+
+from meniscus.api import ApiResource
+from meniscus.api import format_response_body
+
+
+class StatsResource(ApiResource):
+    """
+    Return the runtime statistics of the worker process answering the request
+    """
+
+    def __init__(self, **stats_sources):
+        """
+        stats_sources maps a name to an object providing get_stats()
+        """
+        self.stats_sources = stats_sources
+
+    def on_get(self, req, resp):
+        stats = dict()
+        for name, source in self.stats_sources.items():
+            stats[name] = source.get_stats()
+
+        resp.status = falcon.HTTP_200
+        resp.body = format_response_body({'stats': stats})
@@ -1,7 +1,223 @@
-from meniscus.api.datastore_init import db_handler
+import threading
+import time
 
+from oslo.config import cfg
+from portal.env import get_logger
+from meniscus.config import get_config
+from meniscus.config import init_config
+from meniscus.data.handler import DatabaseHandlerError
+from meniscus.personas.common.counters import SharedCounters
 
-def persist_message(message):
-    """Takes a message dict and persists it to the configured database."""
-    _sink = db_handler()
-    _sink.put('logs', message)
+# storage configuration options
+_STORAGE_GROUP = cfg.OptGroup(name='storage', title='Storage Options')
+get_config().register_group(_STORAGE_GROUP)
+
+_STORAGE_OPTIONS = [
+    cfg.IntOpt('max_batch_size',
+               default=500,
+               help="""Maximum number of messages written to the datastore
+                       in a single bulk insert."""
+               ),
+    cfg.FloatOpt('max_linger',
+                 default=1.0,
+                 help="""Maximum time in seconds a message is buffered
+                         before it is written to the datastore."""
+                 ),
+    cfg.FloatOpt('durable_max_linger',
+                 default=0.1,
+                 help="""Maximum time in seconds a message from a durable
+                         event producer is buffered before it is written to
+                         the datastore."""
+                 ),
+    cfg.IntOpt('max_pending',
+               default=100000,
+               help="""Maximum number of messages each tier keeps buffered
+                       while the datastore can not be written to. They are
+                       written once it can be again, messages past the limit
+                       are dropped."""
+               ),
+    cfg.BoolOpt('ordered_writes',
+                default=False,
+                help="""Sets whether a bulk insert stops at the first
+                        failed message instead of continuing past it."""
+                )
+]
+
+get_config().register_opts(_STORAGE_OPTIONS, group=_STORAGE_GROUP)
+try:
+    init_config()
+    conf = get_config()
+except cfg.ConfigFilesNotFoundError:
+    conf = get_config()
+
+MAX_BATCH_SIZE = conf.storage.max_batch_size
+MAX_LINGER = conf.storage.max_linger
+DURABLE_MAX_LINGER = conf.storage.durable_max_linger
+MAX_PENDING = conf.storage.max_pending
+ORDERED_WRITES = conf.storage.ordered_writes
+
+_LOG = get_logger('meniscus.api.storage.persistence')
+
+
+def is_durable(message):
+    """
+    returns the durable flag the correlation worker set for the message's
+    event producer
+    """
+    correlation = message.get('meniscus', dict()).get('correlation', dict())
+    return bool(correlation.get('durable'))
+
+
+class BulkWriter(object):
+    """
+    Buffers messages and writes them to the datastore with bulk inserts once
+    max_batch_size messages are pending or max_linger seconds have passed.
+    durable is passed through to the datastore to select the write concern.
+
+    A batch the datastore fails to take is put back in front of the buffer
+    and written again every max_linger seconds until it succeeds, when the
+    buffer grows past max_pending the newest messages are dropped.
+    """
+
+    def __init__(self, sink, object_name='logs',
+                 max_batch_size=MAX_BATCH_SIZE, max_linger=MAX_LINGER,
+                 ordered=ORDERED_WRITES, durable=None,
+                 max_pending=MAX_PENDING):
+        self._sink = sink
+        self._object_name = object_name
+        self._max_batch_size = max_batch_size
+        self._max_linger = max_linger
+        self._ordered = ordered
+        self._durable = durable
+        self._max_pending = max_pending
+        self._buffer = list()
+        self._failing = False
+        self._lock = threading.RLock()
+        self._flush_timer = None
+        self.stats = SharedCounters('messages', 'batches', 'write_seconds',
+                                    'max_write_seconds', 'failed_writes',
+                                    'dropped')
+
+    def put(self, message):
+        with self._lock:
+            self._buffer.append(message)
+            #while the datastore fails, only the timer retries the writes
+            if len(self._buffer) >= self._max_batch_size and \
+                    not self._failing:
+                try:
+                    self.flush()
+                except DatabaseHandlerError:
+                    pass
+            else:
+                self._trim()
+                self._schedule_flush()
+
+    def put_many(self, messages):
+        for message in messages:
+            self.put(message)
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(
+                self._max_linger, self._flush_on_timer)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_on_timer(self):
+        with self._lock:
+            self._flush_timer = None
+            try:
+                self.flush()
+            except DatabaseHandlerError:
+                #the batch was put back and the next write is scheduled
+                pass
+
+    def _trim(self):
+        dropped = len(self._buffer) - self._max_pending
+        if dropped > 0:
+            del self._buffer[self._max_pending:]
+            self.stats.increment('dropped', dropped)
+            _LOG.error('Datastore write buffer full, dropped {0} messages'
+                       .format(dropped))
+
+    def flush(self):
+        """
+        write every buffered message to the datastore in bulk inserts of up
+        to max_batch_size messages. Raises DatabaseHandlerError after
+        putting the messages not written back in the buffer.
+        """
+        with self._lock:
+            while self._buffer:
+                self._write(self._buffer[:self._max_batch_size])
+
+    def _write(self, documents):
+        del self._buffer[:len(documents)]
+        start = time.time()
+        try:
+            self._sink.put_many(self._object_name, documents,
+                                ordered=self._ordered, durable=self._durable)
+        except DatabaseHandlerError as ex:
+            self._buffer[:0] = documents
+            self._failing = True
+            self.stats.increment('failed_writes')
+            _LOG.error('Datastore write of {0} messages failed, retrying in '
+                       '{1} seconds: {2}'.format(len(documents),
+                                                 self._max_linger, ex))
+            self._trim()
+            self._schedule_flush()
+            raise
+        else:
+            self._failing = False
+            write_seconds = time.time() - start
+
+            self.stats.increment('messages', len(documents))
+            self.stats.increment('batches')
+            self.stats.increment('write_seconds', write_seconds)
+            self.stats.maximum('max_write_seconds', write_seconds)
+
+    def get_stats(self):
+        stats = self.stats.get_stats()
+        messages_per_second = 0
+        average_write_seconds = 0
+        if stats['write_seconds']:
+            messages_per_second = stats['messages'] / stats['write_seconds']
+        if stats['batches']:
+            average_write_seconds = stats['write_seconds'] / stats['batches']
+
+        stats.update({
+            'messages_per_second': messages_per_second,
+            'average_write_seconds': average_write_seconds
+        })
+        return stats
+
+
+class TieredWriter(object):
+    """
+    Sends messages from durable event producers to a journaled, acknowledged
+    writer and everything else to an unacknowledged writer
+    """
+
+    def __init__(self, sink, object_name='logs'):
+        self.durable_writer = BulkWriter(
+            sink, object_name, max_linger=DURABLE_MAX_LINGER, durable=True)
+        self.standard_writer = BulkWriter(sink, object_name, durable=False)
+
+    def put(self, message):
+        if is_durable(message):
+            self.durable_writer.put(message)
+        else:
+            self.standard_writer.put(message)
+
+    def put_many(self, messages):
+        for message in messages:
+            self.put(message)
+
+    def flush(self):
+        self.durable_writer.flush()
+        self.standard_writer.flush()
+
+    def get_stats(self):
+        return {
+            'durable': self.durable_writer.get_stats(),
+            'standard': self.standard_writer.get_stats()
+        }
@@ -263,9 +263,9 @@ class HostProfilesResource(ApiResource):
                     _producer_not_found()
 
             #update the list of event_producers
-            new_host_profile.event_producers = producer_ids
+            new_host_profile.set_event_producers(producer_ids)
 
-        tenant.profiles.append(new_host_profile)
+        tenant.add_profile(new_host_profile)
         self.db.update('tenant', tenant.format_for_save())
 
         resp.status = falcon.HTTP_201
@@ -336,7 +336,7 @@ class HostProfileResource(ApiResource):
                       .format(duplicate_profile.name,
                               duplicate_profile.get_id()))
 
-            profile.name = body['name']
+            tenant.update_profile(profile, name=body['name'])
 
         if 'event_producer_ids' in body.keys():
             producer_ids = body['event_producer_ids']
@@ -350,7 +350,7 @@ class HostProfileResource(ApiResource):
                     _producer_not_found()
 
             #update the list of event_producers
-            profile.event_producers = producer_ids
+            tenant.update_profile(profile, event_producers=producer_ids)
 
         self.db.update('tenant', tenant.format_for_save())
         resp.status = falcon.HTTP_200
@@ -368,10 +368,7 @@ class HostProfileResource(ApiResource):
             _profile_not_found()
 
         #remove any references to the profile being deleted
-        tenant.profiles.remove(profile)
-        for host in tenant.hosts:
-            if host.profile == profile.get_id():
-                host.profile = None
+        tenant.remove_profile(profile)
 
         self.db.update('tenant', tenant.format_for_save())
 
@@ -448,7 +445,7 @@ class EventProducersResource(ApiResource):
             event_producer_durable,
             event_producer_encrypted)
 
-        tenant.event_producers.append(new_event_producer)
+        tenant.add_event_producer(new_event_producer)
         self.db.update('tenant', tenant.format_for_save())
 
         resp.status = falcon.HTTP_201
@@ -523,16 +520,19 @@ class EventProducerResource(ApiResource):
                       'EventProducer with name {0} already exists with id={1}.'
                       .format(duplicate_producer.name,
                               duplicate_producer.get_id()))
-            event_producer.name = body['name']
+            tenant.update_event_producer(event_producer, name=body['name'])
 
         if 'pattern' in body.keys():
-            event_producer.pattern = str(body['pattern'])
+            tenant.update_event_producer(event_producer,
+                                         pattern=str(body['pattern']))
 
         if 'durable' in body.keys():
-            event_producer.durable = body['durable']
+            tenant.update_event_producer(event_producer,
+                                         durable=body['durable'])
 
         if 'encrypted' in body.keys():
-            event_producer.encrypted = body['encrypted']
+            tenant.update_event_producer(event_producer,
+                                         encrypted=body['encrypted'])
 
         self.db.update('tenant', tenant.format_for_save())
 
@@ -552,10 +552,7 @@ class EventProducerResource(ApiResource):
             _producer_not_found()
 
         #remove any references to the event producer being deleted
-        tenant.event_producers.remove(event_producer)
-        for profile in tenant.profiles:
-            if event_producer.get_id() in profile.event_producers:
-                profile.event_producers.remove(event_producer.get_id())
+        tenant.remove_event_producer(event_producer)
 
         self.db.update('tenant', tenant.format_for_save())
 
@@ -602,11 +599,11 @@ class HostsResource(ApiResource):
         hostname = body['hostname']
 
         # Check if the tenant already has a host with this hostname
-        for host in tenant.hosts:
-            if host.hostname == hostname:
-                abort(falcon.HTTP_400,
-                      'Host with hostname {0} already exists with id={1}'
-                      .format(hostname, host.get_id()))
+        host = find_host(tenant, host_name=hostname)
+        if host:
+            abort(falcon.HTTP_400,
+                  'Host with hostname {0} already exists with id={1}'
+                  .format(hostname, host.get_id()))
 
         ip_address_v4 = None
         if 'ip_address_v4' in body.keys():
@@ -635,7 +632,7 @@ class HostsResource(ApiResource):
             hostname, ip_address_v4,
             ip_address_v6, profile_id)
 
-        tenant.hosts.append(new_host)
+        tenant.add_host(new_host)
         self.db.update('tenant', tenant.format_for_save())
 
         resp.status = falcon.HTTP_201
@@ -694,24 +691,24 @@ class HostResource(ApiResource):
         if 'hostname' in body.keys() and host.hostname != body['hostname']:
             # Check if the tenant already has a host with this hostname
             hostname = str(body['hostname'])
-            for duplicate_host in tenant.hosts:
-                if duplicate_host.hostname == hostname:
-                    abort(falcon.HTTP_400,
-                          'Host with hostname {0} already exists with'
-                          ' id={1}'.format(hostname, duplicate_host.get_id()))
-            host.hostname = hostname
+            duplicate_host = find_host(tenant, host_name=hostname)
+            if duplicate_host:
+                abort(falcon.HTTP_400,
+                      'Host with hostname {0} already exists with'
+                      ' id={1}'.format(hostname, duplicate_host.get_id()))
+            tenant.update_host(host, hostname=hostname)
 
         if 'ip_address_v4' in body.keys():
-            host.ip_address_v4 = body['ip_address_v4']
+            tenant.update_host(host, ip_address_v4=body['ip_address_v4'])
 
         if 'ip_address_v6' in body.keys():
-            host.ip_address_v6 = body['ip_address_v6']
+            tenant.update_host(host, ip_address_v6=body['ip_address_v6'])
 
         if 'profile_id' in body.keys():
+            profile_id = None
             if body['profile_id']:
-                host.profile = int(body['profile_id'])
-            else:
-                host.profile = None
+                profile_id = int(body['profile_id'])
+            tenant.update_host(host, profile=profile_id)
 
             if host.profile:
                 #verify the profile exists and belongs to the tenant
@@ -736,7 +733,7 @@ class HostResource(ApiResource):
             _host_not_found()
 
         #delete the host
-        tenant.hosts.remove(host)
+        tenant.remove_host(host)
         self.db.update('tenant', tenant.format_for_save())
 
         resp.status = falcon.HTTP_200
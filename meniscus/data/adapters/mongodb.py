@@ -1,4 +1,5 @@
 from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 
 from oslo.config import cfg
 from meniscus.config import get_config
@@ -101,6 +102,35 @@ class MongoDatasourceHandler(DatasourceHandler):
         self._check_connection()
         self.database[object_name].insert(document)
 
+    def put_many(self, object_name, documents=None, ordered=True,
+                 durable=None):
+        """
+        inserts the documents in a single bulk operation. Unordered inserts
+        continue past a failed document instead of aborting the batch.
+        Durable inserts wait for the write to reach the journal, non durable
+        inserts are not acknowledged and None uses the client's default.
+        Failed inserts raise DatabaseHandlerError, so that callers can keep
+        the documents and try again.
+        """
+        if documents is None:
+            documents = list()
+        self._check_connection()
+
+        write_concern = dict()
+        if durable is True:
+            write_concern = {'w': 1, 'j': True}
+        elif durable is False:
+            write_concern = {'w': 0}
+
+        if documents:
+            try:
+                self.database[object_name].insert(
+                    documents, continue_on_error=not ordered,
+                    **write_concern)
+            except PyMongoError as ex:
+                raise DatabaseHandlerError(
+                    'Bulk insert failed: {0}'.format(ex))
+
     def update(self, object_name, document=None):
         if document is None:
             document = dict()
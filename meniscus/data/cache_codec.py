@@ -0,0 +1,131 @@
+import marshal
+import struct
+
+from meniscus.data.model.tenant import EventProducer
+from meniscus.data.model.tenant import Host
+from meniscus.data.model.tenant import HostProfile
+from meniscus.data.model.tenant import Tenant
+from meniscus.data.model.tenant import Token
+from meniscus.data.model.util import load_tenant_from_dict
+from meniscus.data.model.util import load_token_from_dict
+from meniscus.openstack.common import jsonutils
+
+CODEC_JSON = 'json'
+CODEC_BINARY = 'binary'
+
+#first byte of every value written by the binary codec
+BINARY_VERSION = '\x01'
+MARSHAL_VERSION = 2
+
+#first byte of values written along with the time they expire at
+EXPIRES_MARKER = '\x00'
+EXPIRES_FORMAT = struct.Struct('!d')
+
+
+class JsonCodec(object):
+    """
+    Stores tenants and tokens as the json text of their format() dicts
+    """
+
+    name = CODEC_JSON
+
+    def dumps_tenant(self, tenant):
+        return jsonutils.dumps(tenant.format())
+
+    def loads_tenant(self, data):
+        return load_tenant_from_dict(jsonutils.loads(data))
+
+    def dumps_token(self, token):
+        return jsonutils.dumps(token.format())
+
+    def loads_token(self, data):
+        return load_token_from_dict(jsonutils.loads(data))
+
+
+class BinaryCodec(object):
+    """
+    Stores tenants and tokens as marshalled tuples of their fields in a fixed
+    order behind a version byte. Dropping the field names and the json
+    punctuation makes entries smaller, and decoding skips the json parser.
+    The field order may only change along with BINARY_VERSION.
+    """
+
+    name = CODEC_BINARY
+
+    def _pack(self, fields):
+        return BINARY_VERSION + marshal.dumps(fields, MARSHAL_VERSION)
+
+    def _unpack(self, data):
+        return marshal.loads(data[len(BINARY_VERSION):])
+
+    def _token_fields(self, token):
+        return token.valid, token.previous, token.last_changed
+
+    def dumps_tenant(self, tenant):
+        return self._pack((
+            tenant.tenant_id,
+            self._token_fields(tenant.token),
+            [(h.get_id(), h.hostname, h.ip_address_v4, h.ip_address_v6,
+              h.profile) for h in tenant.hosts],
+            [(p.get_id(), p.name, p.event_producers)
+             for p in tenant.profiles],
+            [(e.get_id(), e.name, e.pattern, e.durable, e.encrypted)
+             for e in tenant.event_producers]))
+
+    def loads_tenant(self, data):
+        tenant_id, token, hosts, profiles, producers = self._unpack(data)
+        return Tenant(tenant_id, Token(*token),
+                      [Host(*h) for h in hosts],
+                      [HostProfile(*p) for p in profiles],
+                      [EventProducer(*e) for e in producers])
+
+    def dumps_token(self, token):
+        return self._pack(self._token_fields(token))
+
+    def loads_token(self, data):
+        return Token(*self._unpack(data))
+
+
+CODECS = {
+    CODEC_JSON: JsonCodec(),
+    CODEC_BINARY: BinaryCodec()
+}
+
+
+def get_codec(name):
+    if name not in CODECS:
+        raise ValueError('unknown cache codec: {0}'.format(name))
+    return CODECS[name]
+
+
+def codec_for(data):
+    """
+    returns the codec that wrote a cached value so that entries written
+    before a codec change can still be read, or None if no codec knows it
+    """
+    if data.startswith(BINARY_VERSION):
+        return CODECS[CODEC_BINARY]
+    if data.startswith('{'):
+        return CODECS[CODEC_JSON]
+    return None
+
+
+def with_expiry(data, expires_at):
+    """
+    prefixes a cached value with the time it expires at in seconds since the
+    epoch, 0 standing for never
+    """
+    return EXPIRES_MARKER + EXPIRES_FORMAT.pack(expires_at) + data
+
+
+def split_expiry(data):
+    """
+    returns a cached value without its expiry time along with that time,
+    None for values written without one
+    """
+    if not data.startswith(EXPIRES_MARKER):
+        return data, None
+    header_end = len(EXPIRES_MARKER) + EXPIRES_FORMAT.size
+    expires_at, = EXPIRES_FORMAT.unpack(
+        data[len(EXPIRES_MARKER):header_end])
+    return data[header_end:], expires_at
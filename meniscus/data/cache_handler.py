@@ -1,13 +1,20 @@
+from collections import OrderedDict
 from datetime import datetime
+import threading
+import time
 
 from oslo.config import cfg
 
 from meniscus.config import get_config
 from meniscus.config import init_config
-from meniscus.data.model.util import load_tenant_from_dict
-from meniscus.data.model.util import load_token_from_dict
+from meniscus.data.cache_codec import CODEC_BINARY
+from meniscus.data.cache_codec import codec_for
+from meniscus.data.cache_codec import get_codec
+from meniscus.data.cache_codec import split_expiry
+from meniscus.data.cache_codec import with_expiry
 from meniscus.data.model.worker import WorkerConfiguration
 from meniscus.openstack.common import jsonutils
+from meniscus.personas.common.counters import SharedCounters
 from meniscus.proxy import NativeProxy
 
 
@@ -48,6 +55,18 @@ _CACHE_OPTIONS = [
     cfg.StrOpt('cache_blacklist',
                default='cache-blacklist',
                help="""The name of the cache to store worker blacklist"""
+               ),
+    cfg.IntOpt('local_cache_size',
+               default=1000,
+               help="""Number of tenants and tokens each process keeps
+                       in memory in front of the shared cache. A value of 0
+                       disables the in process cache."""
+               ),
+    cfg.StrOpt('codec',
+               default=CODEC_BINARY,
+               help="""The encoding used for tenants and tokens in the shared
+                       cache, either binary or json. Entries written with
+                       either codec can always be read."""
                )
 ]
 
@@ -66,6 +85,153 @@ CACHE_TENANT = conf.cache.cache_tenant
 CACHE_TOKEN = conf.cache.cache_token
 CACHE_BROADCAST = conf.cache.cache_broadcast
 CACHE_BLACKLIST = conf.cache.cache_blacklist
+LOCAL_CACHE_SIZE = conf.cache.local_cache_size
+CACHE_CODEC = get_codec(conf.cache.codec)
+
+
+class LocalCache(object):
+    """
+    A per process, least recently used cache of objects with an expiry time.
+    Used in front of the shared cache to skip decoding and rebuilding the
+    cached objects on every lookup.
+    """
+
+    def __init__(self, max_size=LOCAL_CACHE_SIZE):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return None
+
+            value, expires_at = item
+            if expires_at and expires_at < time.time():
+                return None
+
+            #re-insert to mark the key as most recently used
+            self._items[key] = item
+            return value
+
+    def set(self, key, value, cache_expires):
+        if self.max_size <= 0:
+            return
+
+        expires_at = None
+        if cache_expires:
+            expires_at = time.time() + cache_expires
+
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (value, expires_at)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class CacheSizeStats(object):
+    """
+    Tracks the size of the values written to each shared cache, for tuning
+    the items and blocksize of the uwsgi cache2 definitions.
+    """
+
+    def __init__(self, *cache_names):
+        self._counters = dict(
+            (cache_name, SharedCounters('writes', 'bytes', 'max_bytes'))
+            for cache_name in cache_names)
+
+    def record(self, cache_name, value):
+        counters = self._counters[cache_name]
+        counters.increment('writes')
+        counters.increment('bytes', len(value))
+        counters.maximum('max_bytes', len(value))
+
+    def get_stats(self):
+        stats = dict()
+        for cache_name, counters in self._counters.items():
+            cache_stats = counters.get_stats()
+            cache_stats['average_bytes'] = 0
+            if cache_stats['writes']:
+                cache_stats['average_bytes'] = (
+                    cache_stats['bytes'] / cache_stats['writes'])
+            stats[cache_name] = cache_stats
+        return stats
+
+
+CACHE_SIZE_STATS = CacheSizeStats(CACHE_TENANT, CACHE_TOKEN)
+
+
+def _expires_at(cache_expires):
+    if not cache_expires:
+        return 0
+    return time.time() + cache_expires
+
+
+def _expires_in(data):
+    """
+    returns a shared cache entry without its expiry time along with the
+    seconds it has left, the entry being None if it has already expired.
+    Copies kept in process then expire along with the shared entry.
+    """
+    data, expires_at = split_expiry(data)
+    if expires_at is None:
+        #written before entries carried their expiry time
+        return data, DEFAULT_EXPIRES
+    if not expires_at:
+        return data, 0
+    expires_in = expires_at - time.time()
+    if expires_in <= 0:
+        return None, 0
+    return data, expires_in
+
+
+def _loads_tenant(tenant_data):
+    """
+    returns the tenant in a shared cache entry along with the seconds it
+    has left, or None for the tenant if the entry is expired or unreadable
+    """
+    tenant_data, expires_in = _expires_in(tenant_data)
+    if tenant_data is None:
+        return None, 0
+    #entries from an unknown codec version are treated as a miss
+    codec = codec_for(tenant_data)
+    if codec is None:
+        return None, 0
+    return codec.loads_tenant(tenant_data), expires_in
+
+
+def _loads_token(token_data):
+    token_data, expires_in = _expires_in(token_data)
+    if token_data is None:
+        return None, 0
+    codec = codec_for(token_data)
+    if codec is None:
+        return None, 0
+    return codec.loads_token(token_data), expires_in
+
+
+def _dumps_tenant(tenant, expires_at):
+    tenant_data = with_expiry(CACHE_CODEC.dumps_tenant(tenant), expires_at)
+    CACHE_SIZE_STATS.record(CACHE_TENANT, tenant_data)
+    return tenant_data
+
+
+def _dumps_token(token, expires_at):
+    token_data = with_expiry(CACHE_CODEC.dumps_token(token), expires_at)
+    CACHE_SIZE_STATS.record(CACHE_TOKEN, token_data)
+    return token_data
 
 
 class Cache(object):
@@ -81,107 +247,155 @@ class ConfigCache(Cache):
         self.cache.cache_clear(CACHE_CONFIG)
 
     def set_config(self, worker_config):
-        if self.cache.cache_exists('worker_configuration', CACHE_CONFIG):
-            self.cache.cache_update(
-                'worker_configuration',
-                jsonutils.dumps(worker_config.format()),
-                CONFIG_EXPIRES, CACHE_CONFIG)
-        else:
-            self.cache.cache_set(
-                'worker_configuration',
-                jsonutils.dumps(worker_config.format()),
-                CONFIG_EXPIRES, CACHE_CONFIG)
+        self.cache.cache_update(
+            'worker_configuration',
+            jsonutils.dumps(worker_config.format()),
+            CONFIG_EXPIRES, CACHE_CONFIG)
 
     def get_config(self):
-        if self.cache.cache_exists('worker_configuration', CACHE_CONFIG):
-            config = jsonutils.loads(
-                self.cache.cache_get('worker_configuration', CACHE_CONFIG))
-            worker_config = WorkerConfiguration(**config)
-            return worker_config
-        return None
+        config = self.cache.cache_get('worker_configuration', CACHE_CONFIG)
+        if config is None:
+            return None
+        return WorkerConfiguration(**jsonutils.loads(config))
 
     def delete_config(self):
-        if self.cache.cache_exists('worker_configuration', CACHE_CONFIG):
-            self.cache.cache_del('worker_configuration', CACHE_CONFIG)
+        self.cache.cache_del('worker_configuration', CACHE_CONFIG)
 
     def set_routes(self, pipeline_workers):
-        if self.cache.cache_exists('routes', CACHE_CONFIG):
-            self.cache.cache_update(
-                'routes',
-                jsonutils.dumps(pipeline_workers),
-                CONFIG_EXPIRES, CACHE_CONFIG)
-        else:
-            self.cache.cache_set(
-                'routes',
-                jsonutils.dumps(pipeline_workers),
-                CONFIG_EXPIRES, CACHE_CONFIG)
+        self.cache.cache_update(
+            'routes',
+            jsonutils.dumps(pipeline_workers),
+            CONFIG_EXPIRES, CACHE_CONFIG)
 
     def get_routes(self):
-        if self.cache.cache_exists('routes', CACHE_CONFIG):
-            pipeline_workers = jsonutils.loads(
-                self.cache.cache_get('routes', CACHE_CONFIG))
-            return pipeline_workers
-        return None
+        pipeline_workers = self.cache.cache_get('routes', CACHE_CONFIG)
+        if pipeline_workers is None:
+            return None
+        return jsonutils.loads(pipeline_workers)
 
     def delete_routes(self):
-        if self.cache.cache_exists('routes', CACHE_CONFIG):
-            self.cache.cache_del('routes', CACHE_CONFIG)
+        self.cache.cache_del('routes', CACHE_CONFIG)
 
 
 class TenantCache(Cache):
+    local_cache = LocalCache()
+
     def clear(self):
+        self.local_cache.clear()
         self.cache.cache_clear(CACHE_TENANT)
 
     def set_tenant(self, tenant):
-        if self.cache.cache_exists(tenant.tenant_id, CACHE_TENANT):
-            self.cache.cache_update(
-                tenant.tenant_id, jsonutils.dumps(tenant.format()),
-                DEFAULT_EXPIRES, CACHE_TENANT)
-        else:
-            self.cache.cache_set(
-                tenant.tenant_id, jsonutils.dumps(tenant.format()),
-                DEFAULT_EXPIRES, CACHE_TENANT)
+        self.local_cache.set(tenant.tenant_id, tenant, DEFAULT_EXPIRES)
+        self.cache.cache_update(
+            tenant.tenant_id,
+            _dumps_tenant(tenant, _expires_at(DEFAULT_EXPIRES)),
+            DEFAULT_EXPIRES, CACHE_TENANT)
 
     def get_tenant(self, tenant_id):
-        if self.cache.cache_exists(tenant_id, CACHE_TENANT):
-            tenant_dict = jsonutils.loads(
-                self.cache.cache_get(tenant_id, CACHE_TENANT))
-            tenant = load_tenant_from_dict(tenant_dict)
+        tenant = self.local_cache.get(tenant_id)
+        if tenant:
             return tenant
 
-        return None
+        tenant_data = self.cache.cache_get(tenant_id, CACHE_TENANT)
+        if tenant_data is None:
+            return None
+
+        tenant, expires_in = _loads_tenant(tenant_data)
+        if tenant is None:
+            return None
+
+        self.local_cache.set(tenant_id, tenant, expires_in)
+        return tenant
 
     def delete_tenant(self, tenant_id):
-        if self.cache.cache_exists(tenant_id, CACHE_TENANT):
-            self.cache.cache_del(tenant_id, CACHE_TENANT)
+        self.local_cache.delete(tenant_id)
+        self.cache.cache_del(tenant_id, CACHE_TENANT)
+
+    def set_many(self, tenants):
+        """
+        caches each tenant along with its token
+        """
+        entries = list()
+        expires_at = _expires_at(DEFAULT_EXPIRES)
+        for tenant in tenants:
+            self.local_cache.set(tenant.tenant_id, tenant, DEFAULT_EXPIRES)
+            TokenCache.local_cache.set(
+                tenant.tenant_id, tenant.token, DEFAULT_EXPIRES)
+            entries.append((tenant.tenant_id,
+                            _dumps_tenant(tenant, expires_at),
+                            CACHE_TENANT))
+            entries.append((tenant.tenant_id,
+                            _dumps_token(tenant.token, expires_at),
+                            CACHE_TOKEN))
+
+        self.cache.cache_update_many(entries, DEFAULT_EXPIRES)
+
+    def get_many(self, tenant_ids):
+        """
+        returns a (tenant, token) pair for each tenant id, with None in place
+        of anything that is not cached
+        """
+        pairs = dict()
+        missing = list()
+        for tenant_id in tenant_ids:
+            pairs[tenant_id] = [self.local_cache.get(tenant_id),
+                                TokenCache.local_cache.get(tenant_id)]
+            if pairs[tenant_id][0] is None:
+                missing.append((tenant_id, CACHE_TENANT))
+            if pairs[tenant_id][1] is None:
+                missing.append((tenant_id, CACHE_TOKEN))
+
+        for (tenant_id, cache_name), value in zip(
+                missing, self.cache.cache_get_many(missing)):
+            if value is None:
+                continue
+            if cache_name == CACHE_TENANT:
+                tenant, expires_in = _loads_tenant(value)
+                if tenant:
+                    self.local_cache.set(tenant_id, tenant, expires_in)
+                pairs[tenant_id][0] = tenant
+            else:
+                token, expires_in = _loads_token(value)
+                if token:
+                    TokenCache.local_cache.set(tenant_id, token, expires_in)
+                pairs[tenant_id][1] = token
+
+        return [tuple(pairs[tenant_id]) for tenant_id in tenant_ids]
 
 
 class TokenCache(Cache):
+    local_cache = LocalCache()
+
     def clear(self):
+        self.local_cache.clear()
         self.cache.cache_clear(CACHE_TOKEN)
 
     def set_token(self, tenant_id, token):
-
-        if self.cache.cache_exists(tenant_id, CACHE_TOKEN):
-            self.cache.cache_update(
-                tenant_id, jsonutils.dumps(token.format()),
-                DEFAULT_EXPIRES, CACHE_TOKEN)
-        else:
-            self.cache.cache_set(
-                tenant_id, jsonutils.dumps(token.format()),
-                DEFAULT_EXPIRES, CACHE_TOKEN)
+        #a new or reset token replaces any copy held in process
+        self.local_cache.set(tenant_id, token, DEFAULT_EXPIRES)
+        self.cache.cache_update(
+            tenant_id, _dumps_token(token, _expires_at(DEFAULT_EXPIRES)),
+            DEFAULT_EXPIRES, CACHE_TOKEN)
 
     def get_token(self, tenant_id):
-        if self.cache.cache_exists(tenant_id, CACHE_TOKEN):
-            token_dict = jsonutils.loads(
-                self.cache.cache_get(tenant_id, CACHE_TOKEN))
-            token = load_token_from_dict(token_dict)
+        token = self.local_cache.get(tenant_id)
+        if token:
             return token
-        return None
+
+        token_data = self.cache.cache_get(tenant_id, CACHE_TOKEN)
+        if token_data is None:
+            return None
+
+        token, expires_in = _loads_token(token_data)
+        if token is None:
+            return None
+
+        self.local_cache.set(tenant_id, token, expires_in)
+        return token
 
     def delete_token(self, tenant_id):
-        if self.cache.cache_exists(tenant_id, CACHE_TOKEN):
-            self.cache.cache_del(tenant_id, CACHE_TOKEN)
+        self.local_cache.delete(tenant_id)
+        self.cache.cache_del(tenant_id, CACHE_TOKEN)
 
 
 class BroadcastCache(Cache):
@@ -189,24 +403,15 @@ class BroadcastCache(Cache):
         self.cache.cache_clear(CACHE_BROADCAST)
 
     def set_message_and_targets(self, message_type, target_list):
-        if self.cache.cache_exists(message_type, CACHE_BROADCAST):
-            self.cache.cache_update(
-                message_type, str(target_list),
-                DEFAULT_EXPIRES, CACHE_BROADCAST)
-        else:
-            self.cache.cache_set(
-                message_type, str(target_list),
-                DEFAULT_EXPIRES, CACHE_BROADCAST)
+        self.cache.cache_update(
+            message_type, str(target_list),
+            DEFAULT_EXPIRES, CACHE_BROADCAST)
 
     def get_targets(self, message_type):
-        if self.cache.cache_exists(message_type, CACHE_BROADCAST):
-            targets = self.cache.cache_get(message_type, CACHE_BROADCAST)
-            return targets
-        return None
+        return self.cache.cache_get(message_type, CACHE_BROADCAST)
 
     def delete_message(self, message_type):
-        if self.cache.cache_exists(message_type, CACHE_BROADCAST):
-            self.cache.cache_del(message_type, CACHE_BROADCAST)
+        self.cache.cache_del(message_type, CACHE_BROADCAST)
 
 
 class BlacklistCache(Cache):
@@ -216,12 +421,8 @@ class BlacklistCache(Cache):
 
     def add_blacklist_worker(self, worker_id):
         if worker_id:
-            if self.cache.cache_exists(worker_id, CACHE_BLACKLIST):
-                self.cache.cache_update(worker_id, datetime.now(),
-                                        BLACKLIST_EXPIRES, CACHE_BLACKLIST)
-            else:
-                self.cache.cache_set(worker_id, datetime.now(),
-                                     BLACKLIST_EXPIRES, CACHE_BLACKLIST)
+            self.cache.cache_update(worker_id, datetime.now(),
+                                    BLACKLIST_EXPIRES, CACHE_BLACKLIST)
         else:
             #TODO(dmend): Log trying to blacklist
             pass
@@ -85,6 +85,12 @@ class DatasourceHandler():
             document = dict()
         raise NotImplementedError
 
+    def put_many(self, object_name, documents=None, ordered=True,
+                 durable=None):
+        if documents is None:
+            documents = list()
+        raise NotImplementedError
+
     def update(self, object_name, document=None):
         if document is None:
             document = dict()
@@ -30,7 +30,9 @@ described.
 class HostProfile(object):
     """
 Host profiles are reusable collections of event producers with an
-associated, unique name for lookup.
+associated, unique name for lookup. The list of event producers must only
+be changed through set_event_producers and remove_event_producer, which
+keep its membership set current.
 """
 
     def __init__(self, _id, name, event_producer_ids=None):
@@ -40,10 +42,28 @@ associated, unique name for lookup.
         self._id = _id
         self.name = name
         self.event_producers = event_producer_ids
+        self._producer_ids = None
 
     def get_id(self):
         return self._id
 
+    def set_event_producers(self, event_producer_ids):
+        self.event_producers = event_producer_ids
+        self._producer_ids = None
+
+    def remove_event_producer(self, producer_id):
+        if producer_id in self.event_producers:
+            self.event_producers.remove(producer_id)
+            self._producer_ids = None
+
+    def has_event_producer(self, producer_id):
+        """
+        set based membership test, the set is built on first use
+        """
+        if self._producer_ids is None:
+            self._producer_ids = frozenset(self.event_producers)
+        return producer_id in self._producer_ids
+
     def format(self):
         return {'id': self._id,
                 'name': self.name,
@@ -112,24 +132,123 @@ class Token(object):
                 }
 
 
+class TenantIndex(object):
+    """
+Lookup tables over a tenant's hosts, profiles and event producers by id
+and by name. Where names or ids repeat, the first in the list wins, as it
+did for a linear scan.
+"""
+
+    def __init__(self, tenant):
+        self.hosts_by_id = self._map(tenant.hosts, lambda h: h.get_id())
+        self.hosts_by_name = self._map(tenant.hosts, lambda h: h.hostname)
+        self.profiles_by_id = self._map(
+            tenant.profiles, lambda p: p.get_id())
+        self.profiles_by_name = self._map(tenant.profiles, lambda p: p.name)
+        self.producers_by_id = self._map(
+            tenant.event_producers, lambda e: e.get_id())
+        self.producers_by_name = self._map(
+            tenant.event_producers, lambda e: e.name)
+
+    def _map(self, items, key):
+        return dict((key(item), item) for item in reversed(items))
+
+
 class Tenant(object):
     """
 Tenants are users of the environments being monitored for
-application events.
+application events. Hosts, profiles and event producers must only be
+added, changed or removed through the tenant's methods, each of which
+drops the lookup tables and bumps version, so that anything derived from
+the tenant can tell it has changed.
 """
 
-    def __init__(self, tenant_id, token, hosts=list(), profiles=list(),
-                 event_producers=list(),  _id=None):
+    def __init__(self, tenant_id, token, hosts=None, profiles=None,
+                 event_producers=None,  _id=None):
+        if hosts is None:
+            hosts = []
+        if profiles is None:
+            profiles = []
+        if event_producers is None:
+            event_producers = []
+
         self._id = _id
         self.tenant_id = str(tenant_id)
         self.token = token
         self.hosts = hosts
         self.profiles = profiles
         self.event_producers = event_producers
+        self.version = 0
+        self._index = None
 
     def get_id(self):
         return self._id
 
+    def get_index(self):
+        """
+        returns the lookup tables for the tenant, building them on first use
+        and again after the tenant changes
+        """
+        if self._index is None:
+            self._index = TenantIndex(self)
+        return self._index
+
+    def _changed(self):
+        self._index = None
+        self.version += 1
+
+    def _update(self, item, fields):
+        for name, value in fields.items():
+            setattr(item, name, value)
+        self._changed()
+
+    def add_host(self, host):
+        self.hosts.append(host)
+        self._changed()
+
+    def update_host(self, host, **fields):
+        self._update(host, fields)
+
+    def remove_host(self, host):
+        self.hosts.remove(host)
+        self._changed()
+
+    def add_profile(self, profile):
+        self.profiles.append(profile)
+        self._changed()
+
+    def update_profile(self, profile, **fields):
+        if 'event_producers' in fields:
+            profile.set_event_producers(fields.pop('event_producers'))
+        self._update(profile, fields)
+
+    def remove_profile(self, profile):
+        """
+        removes the profile and unassigns it from the hosts it was
+        assigned to
+        """
+        self.profiles.remove(profile)
+        for host in self.hosts:
+            if host.profile == profile.get_id():
+                host.profile = None
+        self._changed()
+
+    def add_event_producer(self, event_producer):
+        self.event_producers.append(event_producer)
+        self._changed()
+
+    def update_event_producer(self, event_producer, **fields):
+        self._update(event_producer, fields)
+
+    def remove_event_producer(self, event_producer):
+        """
+        removes the event producer and any reference to it in a profile
+        """
+        self.event_producers.remove(event_producer)
+        for profile in self.profiles:
+            profile.remove_event_producer(event_producer.get_id())
+        self._changed()
+
     def format(self):
         return {'tenant_id': self.tenant_id,
                 'hosts': [h.format() for h in self.hosts],
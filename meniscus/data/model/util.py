@@ -61,15 +61,13 @@ def find_host(tenant, host_id=None, host_name=None):
     """
     searches the given tenant for a host matching either the id or hostname
     """
+    index = tenant.get_index()
     if host_id:
-        host_id = int(host_id)
-        for host in tenant.hosts:
-            if host_id == host.get_id():
-                return host
+        host = index.hosts_by_id.get(int(host_id))
+        if host:
+            return host
     if host_name:
-        for host in tenant.hosts:
-            if host_name == host.hostname:
-                return host
+        return index.hosts_by_name.get(host_name)
     return None
 
 
@@ -77,15 +75,13 @@ def find_host_profile(tenant, profile_id=None, profile_name=None):
     """
     searches the given tenant for a profile matching either the id or name
     """
+    index = tenant.get_index()
     if profile_id:
-        profile_id = int(profile_id)
-        for profile in tenant.profiles:
-            if profile_id == profile.get_id():
-                return profile
+        profile = index.profiles_by_id.get(int(profile_id))
+        if profile:
+            return profile
     if profile_name:
-        for profile in tenant.profiles:
-            if profile_name == profile.name:
-                return profile
+        return index.profiles_by_name.get(profile_name)
 
     return None
 
@@ -94,16 +90,14 @@ def find_event_producer(tenant, producer_id=None, producer_name=None):
     """
     searches the given tenant for a producer matching either the id or name
     """
+    index = tenant.get_index()
     if producer_id:
-        producer_id = int(producer_id)
-        for producer in tenant.event_producers:
-            if producer_id == producer.get_id():
-                return producer
+        producer = index.producers_by_id.get(int(producer_id))
+        if producer:
+            return producer
 
     if producer_name:
-        for producer in tenant.event_producers:
-            if producer_name == producer.name:
-                return producer
+        return index.producers_by_name.get(producer_name)
 
     return None
 
@@ -127,7 +121,7 @@ def find_event_producer_for_host(tenant, host, producer_name):
     if not producer:
         return None
 
-    if producer.get_id() in profile.event_producers:
+    if profile.has_event_producer(producer.get_id()):
         return producer
 
     return None
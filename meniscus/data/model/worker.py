@@ -62,7 +62,8 @@ class Worker(object):
             'worker_id': self.worker_id,
             'ip_address_v4': self.ip_address_v4,
             'ip_address_v6': self.ip_address_v6,
-            'status': self.status
+            'status': self.status,
+            'load_average': self.system_info.load_average
         }
 
 
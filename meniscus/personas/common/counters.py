@@ -0,0 +1,33 @@
+from multiprocessing import Value
+
+
+class SharedCounters(object):
+    """
+    Named counters kept in shared memory so that a persona's api process can
+    report on work done by the processes it starts. Counters must be created
+    before the worker processes are forked.
+    """
+
+    def __init__(self, *names):
+        self._values = dict((name, Value('d', 0.0)) for name in names)
+
+    def increment(self, name, amount=1):
+        value = self._values[name]
+        with value.get_lock():
+            value.value += amount
+
+    def maximum(self, name, amount):
+        """
+        raise the counter to amount if amount is larger than its value
+        """
+        value = self._values[name]
+        with value.get_lock():
+            if amount > value.value:
+                value.value = amount
+
+    def get(self, name):
+        return self._values[name].value
+
+    def get_stats(self):
+        return dict((name, value.value)
+                    for name, value in self._values.items())
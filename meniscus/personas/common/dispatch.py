@@ -17,3 +17,9 @@ class Dispatch(object):
         except Exception as ex:
             #TODO(dmend) Log this
             raise DispatchException()
+
+    def dispatch_messages(self, messages, sock):
+        """
+        write a batch of messages to the socket as a single json document
+        """
+        self.dispatch_message(list(messages), sock)
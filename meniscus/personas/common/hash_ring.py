@@ -0,0 +1,56 @@
+import bisect
+import hashlib
+
+
+def _hash(key):
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return int(hashlib.md5(key).hexdigest()[:8], 16)
+
+
+class HashRing(object):
+    """
+    A consistent hash ring. Each node is placed on the ring at a number of
+    virtual points so that keys spread evenly, and adding or removing a node
+    only remaps the keys that hashed to that node's points.
+    """
+
+    def __init__(self, nodes=None, replicas=100):
+        self.replicas = replicas
+        self._points = list()
+        self._owners = dict()
+
+        if nodes:
+            for node in nodes:
+                self.add_node(node)
+
+    def __len__(self):
+        return len(set(self._owners.values()))
+
+    def _node_points(self, node):
+        return [_hash('{0}:{1}'.format(node, replica))
+                for replica in range(self.replicas)]
+
+    def add_node(self, node):
+        for point in self._node_points(node):
+            if point not in self._owners:
+                bisect.insort(self._points, point)
+            self._owners[point] = node
+
+    def remove_node(self, node):
+        for point in self._node_points(node):
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                self._points.pop(bisect.bisect_left(self._points, point))
+
+    def get_node(self, key):
+        """
+        return the node owning the first point at or after the key's hash
+        """
+        if not self._points:
+            return None
+
+        index = bisect.bisect(self._points, _hash(key))
+        if index == len(self._points):
+            index = 0
+        return self._owners[self._points[index]]
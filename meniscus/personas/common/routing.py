@@ -1,13 +1,96 @@
+import fcntl
 import httplib
+import random
 import socket
+import struct
+import termios
+import threading
+import time
 
 import requests
 
+from oslo.config import cfg
+from portal.env import get_logger
 from meniscus.api import personalities
 from meniscus.api.utils.request import http_request
+from meniscus.config import get_config
+from meniscus.config import init_config
 from meniscus.data.cache_handler import BlacklistCache
 from meniscus.data.cache_handler import ConfigCache
 from meniscus.personas.common.dispatch import Dispatch, DispatchException
+from meniscus.personas.common.hash_ring import HashRing
+
+# routing configuration options
+_ROUTING_GROUP = cfg.OptGroup(name='routing', title='Routing Options')
+get_config().register_group(_ROUTING_GROUP)
+
+_ROUTING_OPTIONS = [
+    cfg.IntOpt('batch_size',
+               default=1,
+               help="""Maximum number of messages buffered per service
+                       domain before they are written downstream in a single
+                       dispatch. A value of 1 disables batching."""
+               ),
+    cfg.FloatOpt('batch_linger',
+                 default=0.5,
+                 help="""Maximum time in seconds a buffered message waits
+                         before its batch is flushed downstream."""
+                 ),
+    cfg.StrOpt('balance_strategy',
+               default='round_robin',
+               help="""How messages are spread across the workers of a
+                       service domain. One of round_robin, least_outstanding,
+                       load_average or consistent_hash. least_outstanding
+                       picks the worker with the fewest bytes written to it
+                       that it has not yet acknowledged, and falls back to
+                       round_robin where the platform can not tell."""
+               ),
+    cfg.StrOpt('hash_key',
+               default='tenant',
+               help="""Message attribute used by the consistent_hash
+                       strategy, either tenant or host. Messages without a
+                       tenant are always hashed by host."""
+               ),
+    cfg.IntOpt('hash_replicas',
+               default=100,
+               help="""Number of virtual nodes each worker is given on the
+                       consistent hash ring."""
+               ),
+    cfg.IntOpt('pool_refresh_interval',
+               default=30,
+               help="""Time in seconds after which the connection pool of a
+                       service domain is reconciled with the cached routes."""
+               )
+]
+
+get_config().register_opts(_ROUTING_OPTIONS, group=_ROUTING_GROUP)
+try:
+    init_config()
+    conf = get_config()
+except cfg.ConfigFilesNotFoundError:
+    conf = get_config()
+
+BATCH_SIZE = conf.routing.batch_size
+BATCH_LINGER = conf.routing.batch_linger
+BALANCE_STRATEGY = conf.routing.balance_strategy
+POOL_REFRESH_INTERVAL = conf.routing.pool_refresh_interval
+HASH_KEY = conf.routing.hash_key
+HASH_REPLICAS = conf.routing.hash_replicas
+
+ROUND_ROBIN = 'round_robin'
+LEAST_OUTSTANDING = 'least_outstanding'
+LOAD_AVERAGE = 'load_average'
+CONSISTENT_HASH = 'consistent_hash'
+
+HASH_KEY_TENANT = 'tenant'
+HASH_KEY_HOST = 'host'
+
+DOWNSTREAM_PORT = 9001
+
+#ioctl returning the bytes of a tcp socket not yet acknowledged by the peer
+UNACKED_BYTES = getattr(termios, 'TIOCOUTQ', None)
+
+_LOG = get_logger('meniscus.personas.common.routing')
 
 
 def get_routes_from_coordinator():
@@ -40,36 +123,184 @@ def get_routes_from_coordinator():
 
 
 class RoutingException(Exception):
-    """Raised when router is unable to forward message."""
-    pass
+    """
+    Raised when router is unable to forward message. messages holds the
+    messages that were not sent
+    """
+    def __init__(self, messages=None):
+        super(RoutingException, self).__init__()
+        self.messages = messages or list()
+
+
+class WorkerPool(object):
+    """
+    Open connections to every healthy worker of a single service domain
+    """
+
+    def __init__(self, hash_replicas=HASH_REPLICAS):
+        self.connections = list()
+        self.ring = HashRing(replicas=hash_replicas)
+        self.refreshed = time.time()
+        self._next_index = 0
+
+    def __len__(self):
+        return len(self.connections)
+
+    def worker_ids(self):
+        return [worker['worker_id'] for worker, sock in self.connections]
+
+    def add(self, worker, sock):
+        self.connections.append((worker, sock))
+        self.ring.add_node(worker['worker_id'])
+
+    def update(self, worker):
+        """
+        replace the stored details, such as the load average, of a worker
+        already in the pool
+        """
+        for index, (current, sock) in enumerate(self.connections):
+            if current['worker_id'] == worker['worker_id']:
+                self.connections[index] = (worker, sock)
+                return
+
+    def remove(self, worker_id):
+        for worker_socket in self.connections:
+            worker, sock = worker_socket
+            if worker['worker_id'] == worker_id:
+                self.connections.remove(worker_socket)
+                self.ring.remove_node(worker_id)
+                try:
+                    sock.close()
+                except socket.error:
+                    pass
+                return
+
+    def select(self, strategy=ROUND_ROBIN, routing_key=None):
+        """
+        pick the connection the next message should be written to
+        """
+        if not self.connections:
+            return None
+
+        if strategy == CONSISTENT_HASH and routing_key is not None:
+            return self._select_by_hash(routing_key)
+        if strategy == LEAST_OUTSTANDING and UNACKED_BYTES is not None:
+            return self._select_least_outstanding()
+        if strategy == LOAD_AVERAGE:
+            return self._select_by_load_average()
+        return self._select_round_robin()
+
+    def _select_round_robin(self):
+        worker_socket = self.connections[
+            self._next_index % len(self.connections)]
+        self._next_index += 1
+        return worker_socket
+
+    def _select_by_hash(self, routing_key):
+        worker_id = self.ring.get_node(routing_key)
+        for worker_socket in self.connections:
+            if worker_socket[0]['worker_id'] == worker_id:
+                return worker_socket
+        return None
+
+    @staticmethod
+    def outstanding(sock):
+        """
+        returns the number of bytes written to the socket that the worker
+        has not acknowledged yet, which grows while it falls behind
+        """
+        try:
+            data = fcntl.ioctl(sock.fileno(), UNACKED_BYTES,
+                               struct.pack('i', 0))
+        except (IOError, socket.error):
+            return 0
+        return struct.unpack('i', data)[0]
+
+    def _select_least_outstanding(self):
+        #rotate the starting point so that ties are spread evenly
+        count = len(self.connections)
+        start = self._next_index % count
+        self._next_index += 1
+        candidates = self.connections[start:] + self.connections[:start]
+        return min(candidates, key=lambda worker_socket:
+                   self.outstanding(worker_socket[1]))
+
+    def _select_by_load_average(self):
+        #weighted random choice, a worker with a lower one minute load
+        #average reported to the coordinator receives more messages
+        weights = list()
+        for worker, sock in self.connections:
+            load_average = worker.get('load_average') or dict()
+            weights.append(1.0 / (1.0 + float(load_average.get('1', 0))))
+
+        point = random.random() * sum(weights)
+        for worker_socket, weight in zip(self.connections, weights):
+            point -= weight
+            if point <= 0:
+                return worker_socket
+        return self.connections[-1]
 
 
 class Router(object):
-    def __init__(self):
+    def __init__(self, batch_size=BATCH_SIZE, batch_linger=BATCH_LINGER,
+                 balance_strategy=BALANCE_STRATEGY, hash_key=HASH_KEY):
         self._config_cache = ConfigCache()
         self._blacklist_cache = BlacklistCache()
         self._personality = self._config_cache.get_config().personality
-        self._active_worker_socket = dict()
+        self._worker_pools = dict()
+        self._balance_strategy = balance_strategy
+        self._hash_key = hash_key
+        self._pool_refresh_interval = POOL_REFRESH_INTERVAL
+        self._normalization_routed = False
+        self._normalization_checked = None
         self._dispatch = Dispatch()
+        self._batch_size = batch_size
+        self._batch_linger = batch_linger
+        self._batches = dict()
+        self._batch_lock = threading.RLock()
+        self._flush_timer = None
+        #called with the messages of a batch the flush timer failed to send
+        self.on_failure = None
+        self.dropped_count = 0
 
     def _get_next_service_domain(self):
-        if self._personality == personalities.CORRELATION:
-            return personalities.STORAGE
-        if self._personality == personalities.SYSLOG:
-            return personalities.STORAGE
+        if self._personality in (personalities.CORRELATION,
+                                 personalities.SYSLOG):
+            return self._get_normalization_or_storage()
         if self._personality == personalities.NORMALIZATION:
             return personalities.STORAGE
         return None
 
+    def _get_normalization_or_storage(self):
+        """
+        messages go to normalization workers while the coordinator lists
+        any and one of them is connected, and straight to storage otherwise,
+        as when all of them are blacklisted. The routes are checked as often
+        as the worker pools are refreshed, not per message.
+        """
+        if self._normalization_checked is None or (
+                time.time() - self._normalization_checked >
+                self._pool_refresh_interval):
+            self._normalization_checked = time.time()
+            self._normalization_routed = bool(
+                self._get_route_targets(personalities.NORMALIZATION)) and \
+                bool(self._get_worker_pool(personalities.NORMALIZATION))
+        if self._normalization_routed and \
+                self._worker_pools.get(personalities.NORMALIZATION):
+            return personalities.NORMALIZATION
+        return personalities.STORAGE
+
     def _get_route_targets(self, service_domain):
-        routes = self._config_cache.get_routes()
+        routes = self._config_cache.get_routes() or list()
         for domain in routes:
             if domain['service_domain'] == service_domain:
                 return domain['targets']
         return None
 
     def _blacklist_worker(self, service_domain, worker_id):
-        self._active_worker_socket[service_domain] = None
+        pool = self._worker_pools.get(service_domain)
+        if pool:
+            pool.remove(worker_id)
         self._blacklist_cache.add_blacklist_worker(worker_id)
 
         config = self._config_cache.get_config()
@@ -89,45 +320,187 @@ class Router(object):
                 #Todo log failure to contact coordinator
                 pass
 
-    def _get_worker_socket(self, service_domain):
-        worker_socket = self._active_worker_socket.get(service_domain)
-        if worker_socket:
-            return worker_socket
+    def _connect_worker(self, worker):
+        if worker['ip_address_v6']:
+            protocol = socket.AF_INET6
+            address = (worker['ip_address_v6'], DOWNSTREAM_PORT, 0, 0)
+        else:
+            protocol = socket.AF_INET
+            address = (worker['ip_address_v4'], DOWNSTREAM_PORT)
+
+        sock = socket.socket(protocol, socket.SOCK_STREAM)
+        sock.connect(address)
+        return sock
 
-        for worker in self._get_route_targets(service_domain):
+    def _refresh_worker_pool(self, service_domain, pool):
+        """
+        connect to every routable worker that is not yet in the pool, update
+        the details of those that are and drop connections to workers that
+        are no longer routable
+        """
+        targets = self._get_route_targets(service_domain) or list()
+        routable = dict()
+        for worker in targets:
             if not self._blacklist_cache.is_worker_blacklisted(
                     worker['worker_id']):
+                routable[worker['worker_id']] = worker
 
-                if worker['ip_address_v6']:
-                    protocol = socket.AF_INET6
-                    address = (worker['ip_address_v6'], 9001, 0, 0)
-                else:
-                    protocol = socket.AF_INET
-                    address = (worker['ip_address_v4'], 9001)
+        for worker_id in pool.worker_ids():
+            if worker_id not in routable:
+                pool.remove(worker_id)
 
-                sock = socket.socket(protocol, socket.SOCK_STREAM)
+        connected = pool.worker_ids()
+        for worker_id, worker in routable.items():
+            if worker_id in connected:
+                pool.update(worker)
+                continue
+            try:
+                pool.add(worker, self._connect_worker(worker))
+            except socket.error:
+                self._blacklist_worker(service_domain, worker_id)
 
-                try:
-                    sock.connect(address)
-                    worker_socket = (worker, sock)
-                    self._active_worker_socket[service_domain] = worker_socket
-                    return worker_socket
-                except socket.error as ex:
-                    self._blacklist_worker(
-                        service_domain, worker['worker_id'])
-        return None
+        pool.refreshed = time.time()
 
-    def route_message(self, message):
-        next_service_domain = self._get_next_service_domain()
-        worker_socket = self._get_worker_socket(next_service_domain)
+    def _get_worker_pool(self, service_domain):
+        pool = self._worker_pools.get(service_domain)
+        if pool is None:
+            pool = WorkerPool()
+            self._worker_pools[service_domain] = pool
+            self._refresh_worker_pool(service_domain, pool)
+        elif not pool or (time.time() - pool.refreshed >
+                          self._pool_refresh_interval):
+            self._refresh_worker_pool(service_domain, pool)
+        return pool
+
+    def _get_worker_socket(self, service_domain, routing_key=None):
+        return self._get_worker_pool(service_domain).select(
+            self._balance_strategy, routing_key)
+
+    def _get_routing_key(self, message):
+        """
+        the key a message is placed on the hash ring by, the tenant id from
+        the correlation dict or the tenant and host of the message
+        """
+        correlation = message.get('meniscus', dict()).get(
+            'correlation', dict())
+        tenant_id = correlation.get('tenant_id')
+        if tenant_id and self._hash_key == HASH_KEY_TENANT:
+            return tenant_id
+
+        host = message.get('host') or message.get('hostname')
+        return u'{0}/{1}'.format(tenant_id or u'', host or u'')
+
+    def _send(self, service_domain, dispatch_method, payload,
+              routing_key=None):
+        """
+        send the payload to a worker of the service domain, blacklisting
+        workers as they fail
+        """
+        worker_socket = self._get_worker_socket(service_domain, routing_key)
         while worker_socket:
             worker, sock = worker_socket
             try:
-                self._dispatch.dispatch_message(message, sock)
+                dispatch_method(payload, sock)
                 return
             except DispatchException:
                 #TODO(dmend) log this and report to coordinator
-                self._blacklist_worker(next_service_domain,
-                                       worker['worker_id'])
-            worker_socket = self._get_worker_socket(next_service_domain)
+                self._blacklist_worker(service_domain, worker['worker_id'])
+            worker_socket = self._get_worker_socket(service_domain,
+                                                    routing_key)
         raise RoutingException()
+
+    def _schedule_flush(self):
+        """
+        start a timer that flushes all pending batches once the linger time
+        has passed
+        """
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(
+                self._batch_linger, self._flush_on_timer)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _flush_on_timer(self):
+        with self._batch_lock:
+            self._flush_timer = None
+            try:
+                self.flush()
+            except RoutingException as ex:
+                #no downstream worker is reachable, the batch is dropped
+                #unless a failure handler takes it
+                if self.on_failure is not None:
+                    self.on_failure(ex.messages)
+                    return
+                self.dropped_count += len(ex.messages)
+                _LOG.error('No downstream worker reachable, dropped {0} '
+                           'buffered messages'.format(len(ex.messages)))
+
+    def _flush_batch(self, service_domain):
+        batch = self._batches.pop(service_domain, None)
+        if not batch:
+            return
+
+        if self._balance_strategy != CONSISTENT_HASH:
+            try:
+                self._send(service_domain, self._dispatch.dispatch_messages,
+                           batch)
+            except RoutingException:
+                raise RoutingException(batch)
+            return
+
+        #split the batch by the worker owning each message's routing key
+        ring = self._get_worker_pool(service_domain).ring
+        groups = dict()
+        for message in batch:
+            routing_key = self._get_routing_key(message)
+            group = groups.setdefault(ring.get_node(routing_key),
+                                      (routing_key, list()))
+            group[1].append(message)
+
+        failed = list()
+        for routing_key, messages in groups.values():
+            try:
+                self._send(service_domain, self._dispatch.dispatch_messages,
+                           messages, routing_key)
+            except RoutingException:
+                failed.extend(messages)
+        if failed:
+            raise RoutingException(failed)
+
+    def flush(self):
+        """
+        write all buffered messages downstream, one dispatch per service
+        domain
+        """
+        with self._batch_lock:
+            failed = list()
+            for service_domain in self._batches.keys():
+                try:
+                    self._flush_batch(service_domain)
+                except RoutingException as ex:
+                    failed.extend(ex.messages)
+            if failed:
+                raise RoutingException(failed)
+
+    def route_message(self, message):
+        next_service_domain = self._get_next_service_domain()
+
+        if self._batch_size <= 1:
+            routing_key = None
+            if self._balance_strategy == CONSISTENT_HASH:
+                routing_key = self._get_routing_key(message)
+            try:
+                self._send(next_service_domain,
+                           self._dispatch.dispatch_message, message,
+                           routing_key)
+            except RoutingException:
+                raise RoutingException([message])
+            return
+
+        with self._batch_lock:
+            batch = self._batches.setdefault(next_service_domain, list())
+            batch.append(message)
+            if len(batch) >= self._batch_size:
+                self._flush_batch(next_service_domain)
+            else:
+                self._schedule_flush()
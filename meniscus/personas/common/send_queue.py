@@ -0,0 +1,190 @@
+import Queue
+import threading
+
+from oslo.config import cfg
+from meniscus.config import get_config
+from meniscus.config import init_config
+from meniscus.personas.common.routing import RoutingException
+
+# send queue configuration options
+_SEND_QUEUE_GROUP = cfg.OptGroup(name='send_queue',
+                                 title='Send Queue Options')
+get_config().register_group(_SEND_QUEUE_GROUP)
+
+_SEND_QUEUE_OPTIONS = [
+    cfg.IntOpt('max_size',
+               default=10000,
+               help="""Maximum number of messages waiting to be routed
+                       downstream before new messages are rejected."""
+               ),
+    cfg.IntOpt('retry_after',
+               default=1,
+               help="""Number of seconds a client is asked to wait before
+                       retrying a message rejected by a full queue."""
+               ),
+    cfg.FloatOpt('wait_timeout',
+                 default=5.0,
+                 help="""Maximum time in seconds a caller waiting for its
+                         message to be routed, as the publish api does for
+                         messages of durable event producers, waits before
+                         the message is reported as not routed."""
+                 )
+]
+
+get_config().register_opts(_SEND_QUEUE_OPTIONS, group=_SEND_QUEUE_GROUP)
+try:
+    init_config()
+    conf = get_config()
+except cfg.ConfigFilesNotFoundError:
+    conf = get_config()
+
+SEND_QUEUE_MAX_SIZE = conf.send_queue.max_size
+SEND_QUEUE_RETRY_AFTER = conf.send_queue.retry_after
+SEND_QUEUE_WAIT_TIMEOUT = conf.send_queue.wait_timeout
+
+
+class SendQueueFullException(Exception):
+    """Raised when the send queue can not accept another message."""
+    pass
+
+
+class _Receipt(object):
+    """
+    Lets the caller that queued a message wait until the sender has routed
+    it. A message is either taken by the sender or cancelled by a caller
+    that gave up waiting, never both, so that a message reported as not
+    routed is not routed later.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.routed = False
+        self._lock = threading.Lock()
+        self._taken = False
+        self._cancelled = False
+
+    def take(self):
+        """
+        returns False if the caller has cancelled the message
+        """
+        with self._lock:
+            self._taken = not self._cancelled
+            return self._taken
+
+    def cancel(self):
+        """
+        returns False if the sender has already taken the message
+        """
+        with self._lock:
+            self._cancelled = not self._taken
+            return self._cancelled
+
+
+class SendQueue(object):
+    """
+    A bounded queue in front of a Router. Messages are handed to the router
+    by a background sender thread so that callers never block on downstream
+    sockets, unless they ask to wait for their message to be routed. The
+    router is flushed before a waiting caller is told its message was
+    routed, so that the message is not left in a batch.
+    """
+
+    def __init__(self, router, max_size=SEND_QUEUE_MAX_SIZE,
+                 wait_timeout=SEND_QUEUE_WAIT_TIMEOUT):
+        self._router = router
+        self._max_size = max_size
+        self._wait_timeout = wait_timeout
+        self._queue = Queue.Queue(max_size)
+        self._sender = None
+        self._sender_lock = threading.Lock()
+        self.sent_count = 0
+        self.failed_count = 0
+        self.rejected_count = 0
+        self.expired_count = 0
+
+    def _start_sender(self):
+        """
+        start the sender thread if it is not running. Threads do not survive
+        a fork, so this is checked on every call instead of in __init__
+        """
+        if self._sender and self._sender.is_alive():
+            return
+
+        with self._sender_lock:
+            if self._sender is None or not self._sender.is_alive():
+                self._sender = threading.Thread(target=self._send_messages)
+                self._sender.daemon = True
+                self._sender.start()
+
+    def _send_messages(self):
+        while True:
+            message, receipt = self._queue.get()
+            try:
+                if receipt is None:
+                    self._send(message)
+                elif receipt.take():
+                    receipt.routed = self._send(message, flush=True)
+                else:
+                    #the caller gave up waiting and was told so
+                    self.expired_count += 1
+            finally:
+                if receipt is not None:
+                    receipt.done.set()
+                self._queue.task_done()
+
+    def _send(self, message, flush=False):
+        """
+        route a message, returns whether it left the router. With flush,
+        the router's batches are written out as well
+        """
+        try:
+            self._router.route_message(message)
+            self.sent_count += 1
+            if flush:
+                self._router.flush()
+        except RoutingException as ex:
+            #a batch fails as a whole, count each message in it
+            self.failed_count += len(ex.messages) or 1
+            #without the messages it is not known whether this one failed
+            return bool(ex.messages) and not any(
+                unsent is message for unsent in ex.messages)
+        return True
+
+    def route_message(self, message, wait=False):
+        """
+        queue a message for routing, raises SendQueueFullException if the
+        queue is at capacity. With wait, returns once the router has sent
+        the message and raises RoutingException if it failed to. A message
+        the sender has not taken within wait_timeout seconds is dropped
+        from the queue and RoutingException raised.
+        """
+        self._start_sender()
+        receipt = _Receipt() if wait else None
+        try:
+            self._queue.put_nowait((message, receipt))
+        except Queue.Full:
+            self.rejected_count += 1
+            raise SendQueueFullException()
+
+        if receipt is None:
+            return
+        if not receipt.done.wait(self._wait_timeout):
+            if receipt.cancel():
+                raise RoutingException([message])
+            #the sender is routing the message, its outcome is awaited
+            receipt.done.wait()
+        if not receipt.routed:
+            raise RoutingException([message])
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def get_stats(self):
+        return {
+            'depth': self.depth(),
+            'max_size': self._max_size,
+            'sent': self.sent_count,
+            'failed': self.failed_count,
+            'rejected': self.rejected_count,
+            'expired': self.expired_count
+        }
@@ -0,0 +1,390 @@
+import errno
+import fcntl
+import os
+import struct
+import threading
+import time
+
+from oslo.config import cfg
+from meniscus.config import get_config
+from meniscus.config import init_config
+from meniscus.openstack.common import jsonutils
+from meniscus.personas.common.counters import SharedCounters
+from meniscus.personas.common.routing import Router
+from meniscus.personas.common.routing import RoutingException
+
+# spill queue configuration options
+_SPILL_QUEUE_GROUP = cfg.OptGroup(name='spill_queue',
+                                  title='Spill Queue Options')
+get_config().register_group(_SPILL_QUEUE_GROUP)
+
+_SPILL_QUEUE_OPTIONS = [
+    cfg.StrOpt('directory',
+               default=None,
+               help="""Directory messages are written to while no downstream
+                       worker is reachable, to be routed again once one is.
+                       When unset such messages are dropped."""
+               ),
+    cfg.IntOpt('segment_size',
+               default=16777216,
+               help="""Size in bytes past which a new segment file is
+                       started. Segments are deleted once replayed."""
+               ),
+    cfg.IntOpt('max_size',
+               default=1073741824,
+               help="""Maximum number of bytes of spilled messages each
+                       process keeps on disk, messages spilled past it are
+                       dropped."""
+               ),
+    cfg.IntOpt('replay_rate',
+               default=1000,
+               help="""Maximum number of spilled messages routed again per
+                       second."""
+               ),
+    cfg.FloatOpt('replay_interval',
+                 default=1.0,
+                 help="""Time in seconds between attempts to route spilled
+                         messages again."""
+                 )
+]
+
+get_config().register_opts(_SPILL_QUEUE_OPTIONS, group=_SPILL_QUEUE_GROUP)
+try:
+    init_config()
+    conf = get_config()
+except cfg.ConfigFilesNotFoundError:
+    conf = get_config()
+
+SPILL_DIRECTORY = conf.spill_queue.directory
+SPILL_SEGMENT_SIZE = conf.spill_queue.segment_size
+SPILL_MAX_SIZE = conf.spill_queue.max_size
+SPILL_REPLAY_RATE = conf.spill_queue.replay_rate
+SPILL_REPLAY_INTERVAL = conf.spill_queue.replay_interval
+
+SPILL_COUNTERS = ('spilled', 'replayed', 'dropped')
+
+#each record is the length of the json encoded message followed by it
+RECORD_HEADER = struct.Struct('>I')
+SEGMENT_SUFFIX = '.spill'
+CURSOR_FILE = 'cursor'
+LOCK_FILE = 'lock'
+
+
+def claim_directory(directory):
+    """
+    returns the first numbered subdirectory of directory that no other
+    process holds, and the open lock file holding it. Logs left behind by
+    processes that have exited are claimed again, so their messages are
+    replayed.
+    """
+    index = 0
+    while True:
+        path = os.path.join(directory, str(index))
+        try:
+            os.makedirs(path)
+        except OSError as ex:
+            if ex.errno != errno.EEXIST:
+                raise
+        lock_file = open(os.path.join(path, LOCK_FILE), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return path, lock_file
+        except IOError:
+            lock_file.close()
+        index += 1
+
+
+def spill_size(directory):
+    """
+    returns the number of bytes the segments of every log under directory
+    take up
+    """
+    size = 0
+    for path, directories, names in os.walk(directory):
+        for name in names:
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            try:
+                size += os.path.getsize(os.path.join(path, name))
+            except OSError:
+                #the segment was replayed and deleted meanwhile
+                pass
+    return size
+
+
+class SpillLog(object):
+    """
+    An append only log of messages on disk, split into numbered segment
+    files, in a subdirectory of directory claimed by this process alone.
+    Messages are read back in the order they were appended and a segment
+    is deleted once it has been read. The read position is saved by
+    sync(), so messages read since the last sync are read again after a
+    restart.
+    """
+
+    def __init__(self, directory, segment_size=SPILL_SEGMENT_SIZE,
+                 max_size=SPILL_MAX_SIZE):
+        self.directory, self._lock_file = claim_directory(directory)
+        self.segment_size = segment_size
+        self.max_size = max_size
+        self._lock = threading.RLock()
+
+        self.segments = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX))
+        self.size = sum(os.path.getsize(self._path(segment))
+                        for segment in self.segments)
+        self._writer = None
+        self._reader = None
+        self._read_offset = self._load_cursor()
+        self._next = None
+
+    def _path(self, segment):
+        return os.path.join(self.directory,
+                            '{0:020d}{1}'.format(segment, SEGMENT_SUFFIX))
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as cursor:
+                segment, offset = [int(field)
+                                   for field in cursor.read().split()]
+        except (IOError, ValueError):
+            return 0
+        if self.segments and self.segments[0] == segment:
+            return offset
+        return 0
+
+    def sync(self):
+        """
+        save the read position, so that a restart reads on from there
+        """
+        with self._lock:
+            path = os.path.join(self.directory, CURSOR_FILE)
+            if not self.segments:
+                #segment numbers start over once the log is empty
+                if os.path.exists(path):
+                    os.remove(path)
+                return
+            with open(path + '.tmp', 'w') as cursor:
+                cursor.write('{0} {1}'.format(self.segments[0],
+                                              self._read_offset))
+            os.rename(path + '.tmp', path)
+
+    def _roll(self):
+        if self._writer is not None:
+            self._writer.close()
+        segment = self.segments[-1] + 1 if self.segments else 0
+        self._writer = open(self._path(segment), 'ab')
+        self.segments.append(segment)
+
+    def append(self, message):
+        """
+        write a message to the end of the log, returns False if the log
+        has no room for it
+        """
+        data = jsonutils.dumps(message)
+        record = RECORD_HEADER.pack(len(data)) + data
+        with self._lock:
+            if self.size + len(record) > self.max_size:
+                return False
+            #segments written before a restart are only read
+            if self._writer is None or (
+                    self._writer.tell() and self._writer.tell() +
+                    len(record) > self.segment_size):
+                self._roll()
+            self._writer.write(record)
+            self._writer.flush()
+            self.size += len(record)
+            return True
+
+    def _drop_head(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._writer is not None and len(self.segments) == 1:
+            self._writer.close()
+            self._writer = None
+        path = self._path(self.segments.pop(0))
+        self.size -= os.path.getsize(path)
+        os.remove(path)
+        self._read_offset = 0
+
+    def peek(self):
+        """
+        returns the oldest message not yet popped, or None if there is none
+        """
+        with self._lock:
+            while self._next is None:
+                if not self.segments:
+                    return None
+                if self._reader is None:
+                    self._reader = open(self._path(self.segments[0]), 'rb')
+                    self._reader.seek(self._read_offset)
+                header = self._reader.read(RECORD_HEADER.size)
+                if len(header) == RECORD_HEADER.size:
+                    length, = RECORD_HEADER.unpack(header)
+                    data = self._reader.read(length)
+                    if len(data) == length:
+                        self._next = (jsonutils.loads(data),
+                                      RECORD_HEADER.size + length)
+                        break
+                #the segment is read to its end or to a record cut short
+                #when the process writing it died
+                self._drop_head()
+            return self._next[0]
+
+    def pop(self):
+        """
+        move past the message returned by peek()
+        """
+        with self._lock:
+            if self._next is None and self.peek() is None:
+                return
+            self._read_offset += self._next[1]
+            self._next = None
+
+    def close(self):
+        with self._lock:
+            for log_file in (self._reader, self._writer, self._lock_file):
+                if log_file is not None:
+                    log_file.close()
+            self._reader = None
+            self._writer = None
+            self._lock_file = None
+            self._next = None
+
+
+class SpillQueue(object):
+    """
+    Sits in front of a Router. Messages the router can not send are
+    appended to a SpillLog instead of being dropped, and a background
+    replay thread routes them again, at most replay_rate a second, once
+    the router accepts messages. RoutingException is only raised when the
+    spill log is full.
+
+    Each process using the queue gets a router and spill log of its own,
+    so a queue may be created before worker processes are forked. Its
+    counters are shared with them. The router does not lock around
+    unbatched sends, so every call into it, from the replay thread or
+    any other, is made holding the queue's router lock.
+    """
+
+    def __init__(self, directory, router_factory=Router,
+                 replay_rate=SPILL_REPLAY_RATE,
+                 replay_interval=SPILL_REPLAY_INTERVAL,
+                 spill_log_factory=SpillLog):
+        self.directory = directory
+        self.router_factory = router_factory
+        self.spill_log_factory = spill_log_factory
+        self.replay_rate = replay_rate
+        self.replay_interval = replay_interval
+        self.counters = SharedCounters(*SPILL_COUNTERS)
+        self._pid = None
+        self._router = None
+        self._spill_log = None
+        self._replayer = None
+        self._router_lock = None
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        """
+        create the router and spill log of this process and start the
+        replay thread. Threads and the lock on the spill log's directory
+        do not survive a fork, so this is checked on every call instead
+        of in __init__
+        """
+        if self._pid == os.getpid() and self._replayer.is_alive():
+            return
+
+        with self._start_lock:
+            if self._pid != os.getpid():
+                #a lock held by another thread when the process forked
+                #would never be released
+                self._router_lock = threading.RLock()
+                self._router = self.router_factory()
+                self._router.on_failure = self._spill
+                self._spill_log = self.spill_log_factory(self.directory)
+                self._replayer = None
+                self._pid = os.getpid()
+            if self._replayer is None or not self._replayer.is_alive():
+                self._replayer = self._start_replayer()
+
+    def _start_replayer(self):
+        replayer = threading.Thread(target=self._replay_messages)
+        replayer.daemon = True
+        replayer.start()
+        return replayer
+
+    def _replay_messages(self):
+        limit = max(1, int(self.replay_rate * self.replay_interval))
+        while True:
+            time.sleep(self.replay_interval)
+            self.replay(limit)
+
+    def _spill(self, messages):
+        """
+        append the messages to the spill log, returns the number of
+        messages dropped for want of room
+        """
+        dropped = 0
+        for message in messages:
+            if not self._spill_log.append(message):
+                dropped += 1
+        self.counters.increment('spilled', len(messages) - dropped)
+        self.counters.increment('dropped', dropped)
+        return dropped
+
+    def route_message(self, message):
+        self._start()
+        try:
+            with self._router_lock:
+                self._router.route_message(message)
+        except RoutingException as ex:
+            if self._spill(ex.messages or [message]):
+                raise RoutingException()
+
+    def flush(self):
+        self._start()
+        try:
+            with self._router_lock:
+                self._router.flush()
+        except RoutingException as ex:
+            if self._spill(ex.messages):
+                raise RoutingException()
+
+    def replay(self, limit):
+        """
+        route up to limit spilled messages again, stopping at the first
+        the router can not send. Returns the number of messages replayed
+        """
+        self._start()
+        replayed = 0
+        try:
+            while replayed < limit:
+                message = self._spill_log.peek()
+                if message is None:
+                    break
+                try:
+                    #the lock is taken per message so that live messages
+                    #are not held up for a whole replay
+                    with self._router_lock:
+                        self._router.route_message(message)
+                except RoutingException as ex:
+                    #the message stays first in the log, the rest of its
+                    #batch was already taken from it
+                    self._spill([unsent for unsent in ex.messages
+                                 if unsent is not message])
+                    break
+                self._spill_log.pop()
+                replayed += 1
+        finally:
+            if replayed:
+                self._spill_log.sync()
+                self.counters.increment('replayed', replayed)
+        return replayed
+
+    def get_stats(self):
+        stats = self.counters.get_stats()
+        stats['disk_size'] = spill_size(self.directory)
+        return stats
@@ -1,20 +1,34 @@
+import os
+
 import falcon
 
 from meniscus.api.correlation.resources import PublishMessageResource
 from meniscus.api.callback.resources import CallbackResource
+from meniscus.api.stats.resources import StatsResource
 from meniscus.api.version.resources import VersionResource
+from meniscus.data.cache_handler import CACHE_SIZE_STATS
 from meniscus.personas.common.publish_stats import WorkerStatusPublisher
 from meniscus.personas.common.publish_stats import WorkerStatsPublisher
 from meniscus.personas.common.routing import Router
+from meniscus.personas.common.send_queue import SendQueue
+from meniscus.personas.common.spill_queue import SPILL_DIRECTORY
+from meniscus.personas.common.spill_queue import SpillQueue
 
 
 def start_up():
 
     router = Router()
+    stats_sources = dict()
+    if SPILL_DIRECTORY:
+        router = SpillQueue(os.path.join(SPILL_DIRECTORY, 'correlation'))
+        stats_sources['spill'] = router
+    send_queue = SendQueue(router)
 
     versions = VersionResource()
     callback = CallbackResource()
-    publish_message = PublishMessageResource(router)
+    stats = StatsResource(send_queue=send_queue, cache=CACHE_SIZE_STATS,
+                          **stats_sources)
+    publish_message = PublishMessageResource(send_queue)
 
     # Routing
     application = api = falcon.API()
@@ -22,6 +36,7 @@ def start_up():
     api.add_route('/', versions)
     api.add_route('/v1/tenant/{tenant_id}/publish', publish_message)
     api.add_route('/v1/callback', callback)
+    api.add_route('/v1/stats', stats)
 
     register_worker_online = WorkerStatusPublisher('online')
     register_worker_online.run()
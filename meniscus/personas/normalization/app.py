@@ -1,20 +1,69 @@
+import os
+
 import falcon
 
 from meniscus.api.callback.resources import CallbackResource
+from meniscus.api.normalization.normalization_process import \
+    NormalizationPool
+from meniscus.api.stats.resources import StatsResource
 from meniscus.api.version.resources import VersionResource
 from meniscus.personas.common.publish_stats import WorkerStatusPublisher
 from meniscus.personas.common.publish_stats import WorkerStatsPublisher
+from meniscus.personas.common.routing import Router
+from meniscus.personas.common.spill_queue import SPILL_DIRECTORY
+from meniscus.personas.common.spill_queue import SpillQueue
+
+from multiprocessing import Process
+
+from portal.env import get_logger
+from portal.server import JsonStreamServer
+from portal.input.jsonstream import JsonMessageHandler
+
+
+_LOG = get_logger('meniscus.personas.normalization.app')
+
+
+class JsonHandler(JsonMessageHandler):
+
+    def __init__(self, pool):
+        self.msg_count = 0
+        self.pool = pool
+
+    def header(self, key, value):
+        pass
+
+    def body(self, body):
+        #batched dispatches arrive as a list of messages
+        if isinstance(body, list):
+            self.pool.put_many(body)
+        else:
+            self.pool.put(body)
 
 
 def start_up():
+    # the pool's queue and counters live in shared memory, so the pool is
+    # created here, before the json stream server process is forked
+    router_factory = Router
+    stats_sources = dict()
+    if SPILL_DIRECTORY:
+        # each worker process routes through its own router and spill log
+        spill_queue = SpillQueue(
+            os.path.join(SPILL_DIRECTORY, 'normalization'))
+        router_factory = lambda: spill_queue
+        stats_sources['spill'] = spill_queue
+    pool = NormalizationPool(router_factory=router_factory)
+    pool.start()
 
     versions = VersionResource()
     callback = CallbackResource()
+    stats = StatsResource(normalization=pool, **stats_sources)
+
     # Routing
     application = api = falcon.API()
 
     api.add_route('/', versions)
     api.add_route('/v1/callback', callback)
+    api.add_route('/v1/stats', stats)
 
     register_worker_online = WorkerStatusPublisher('online')
     register_worker_online.run()
@@ -22,4 +71,7 @@ def start_up():
     publish_stats_service = WorkerStatsPublisher()
     publish_stats_service.run()
 
+    server = JsonStreamServer(('0.0.0.0', 9001), JsonHandler(pool))
+    Process(target=server.start).start()
+
     return application
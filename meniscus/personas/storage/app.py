@@ -1,6 +1,7 @@
 import falcon
 
 from meniscus.api.callback.resources import CallbackResource
+from meniscus.api.stats.resources import StatsResource
 from meniscus.api.version.resources import VersionResource
 from meniscus.personas.common.publish_stats import WorkerStatusPublisher
 from meniscus.personas.common.publish_stats import WorkerStatsPublisher
@@ -12,6 +13,7 @@ from portal.server import JsonStreamServer
 from portal.input.jsonstream import JsonMessageHandler
 
 from meniscus.api.datastore_init import db_handler
+from meniscus.api.storage.persistence import TieredWriter
 
 
 _LOG = get_logger('meniscus.personas.storage.app')
@@ -19,9 +21,10 @@ _LOG = get_logger('meniscus.personas.storage.app')
 
 class JsonHandler(JsonMessageHandler):
 
-    def __init__(self, db_handler):
+    def __init__(self, db_handler, writer=None):
         self.msg_count = 0
         self.db_handler = db_handler
+        self.writer = writer or TieredWriter(db_handler)
 
     def header(self, key, value):
         # Don't really care about headers in this case... that's for later
@@ -30,18 +33,29 @@ class JsonHandler(JsonMessageHandler):
 
     def body(self, body):
         #_LOG.debug('Body: {}'.format(body))
-        self.db_handler.put('logs', body)
+        #batched dispatches arrive as a list of messages
+        if isinstance(body, list):
+            self.writer.put_many(body)
+        else:
+            self.writer.put(body)
 
 
 def start_up():
+    sink = db_handler()
+    # the writer's counters live in shared memory, so they can be reported
+    # here while the writes happen in the json stream server process
+    writer = TieredWriter(sink)
+
     versions = VersionResource()
     callback = CallbackResource()
+    stats = StatsResource(writes=writer)
 
     # Routing
     application = api = falcon.API()
 
     api.add_route('/', versions)
     api.add_route('/v1/callback', callback)
+    api.add_route('/v1/stats', stats)
 
     register_worker_online = WorkerStatusPublisher('online')
     register_worker_online.run()
@@ -50,7 +64,7 @@ def start_up():
     publish_stats_service.run()
 
     server = JsonStreamServer(
-        ('0.0.0.0', 9001), JsonHandler(db_handler()))
+        ('0.0.0.0', 9001), JsonHandler(sink, writer))
     Process(target=server.start).start()
 
     return application
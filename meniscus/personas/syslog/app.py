@@ -1,11 +1,24 @@
 import json
+import os
+
 import falcon
 
+from oslo.config import cfg
 from meniscus.api.callback.resources import CallbackResource
+from meniscus.api.stats.resources import StatsResource
 from meniscus.api.version.resources import VersionResource
+from meniscus.config import get_config
+from meniscus.config import init_config
 from meniscus.personas.common.publish_stats import WorkerStatusPublisher
 from meniscus.personas.common.publish_stats import WorkerStatsPublisher
 from meniscus.personas.common.routing import Router
+from meniscus.personas.common.spill_queue import SPILL_DIRECTORY
+from meniscus.personas.common.spill_queue import SpillQueue
+from meniscus.personas.syslog.listener import DatagramListener
+from meniscus.personas.syslog.listener import decode_message
+from meniscus.personas.syslog.listener import LISTENER_PROCESSES
+from meniscus.personas.syslog.listener import ListenerPool
+from meniscus.personas.syslog.listener import reuse_port_supported
 
 from multiprocessing import Process
 
@@ -16,13 +29,45 @@ from portal.input.rfc5424 import SyslogMessageHandler
 
 _LOG = get_logger('meniscus.personas.syslog.app')
 
+# syslog persona configuration options
+_SYSLOG_GROUP = cfg.OptGroup(name='syslog', title='Syslog Options')
+get_config().register_group(_SYSLOG_GROUP)
 
-class MessageHandler(SyslogMessageHandler):
+_SYSLOG_OPTIONS = [
+    cfg.IntOpt('max_message_size',
+               default=1048576,
+               help="""Maximum size in bytes of the message of a syslog
+                       message, longer messages are truncated. 0 leaves
+                       messages whole."""
+               )
+]
+
+get_config().register_opts(_SYSLOG_OPTIONS, group=_SYSLOG_GROUP)
+try:
+    init_config()
+    conf = get_config()
+except cfg.ConfigFilesNotFoundError:
+    conf = get_config()
+
+MAX_MESSAGE_SIZE = conf.syslog.max_message_size
 
-    def __init__(self, router):
-        self.msg = b''
+
+class MessageHandler(SyslogMessageHandler):
+    """
+    Collects the parts of each syslog message in a list, joined once the
+    message is complete, and routes the message on. Parts past
+    max_message_size are dropped and the message truncated and decoded
+    as the syslog listeners do.
+    """
+
+    def __init__(self, router, max_message_size=MAX_MESSAGE_SIZE):
+        self.msg = []
+        self.msg_size = 0
+        self.msg_truncated = False
         self.msg_head = None
         self.msg_count = 0
+        self.truncated_count = 0
+        self.max_message_size = max_message_size
         self.router = router
 
     def message_head(self, message_head):
@@ -30,15 +75,30 @@ class MessageHandler(SyslogMessageHandler):
         self.msg_head = message_head
 
     def message_part(self, message_part):
-        self.msg += message_part
+        if self.max_message_size:
+            room = self.max_message_size - self.msg_size
+            if len(message_part) > room:
+                message_part = message_part[:max(room, 0)]
+                self.msg_truncated = True
+        if message_part:
+            self.msg.append(message_part)
+            self.msg_size += len(message_part)
 
     def message_complete(self, last_message_part):
-        full_message = self.msg + last_message_part
-        outbound = self.msg_head.as_dict()
-        outbound['message'] = full_message.decode('utf-8')
-        self.router.route_message(outbound)
-        self.msg_head = None
-        self.msg = b''
+        try:
+            self.message_part(last_message_part)
+            outbound = self.msg_head.as_dict()
+            outbound['message'], truncated = decode_message(
+                b''.join(self.msg), self.max_message_size,
+                self.msg_truncated)
+            self.truncated_count += truncated
+            self.router.route_message(outbound)
+        finally:
+            #a message that failed to route must not run into the next
+            self.msg_head = None
+            self.msg = []
+            self.msg_size = 0
+            self.msg_truncated = False
 
 
 def start_up():
@@ -54,8 +114,36 @@ def start_up():
     publish_stats_service = WorkerStatsPublisher()
     publish_stats_service.run()
 
-    server = SyslogServer(
-        ("0.0.0.0", 5140), MessageHandler(Router()))
-    Process(target=server.start).start()
+    router_factory = Router
+    stats_sources = dict()
+    if SPILL_DIRECTORY:
+        # each listener process routes through its own router and spill log
+        spill_queue = SpillQueue(os.path.join(SPILL_DIRECTORY, 'syslog'))
+        router_factory = lambda: spill_queue
+        stats_sources['spill'] = spill_queue
+
+    # the listeners' counters live in shared memory, so the pools are
+    # created here, before the listener processes are forked
+    if reuse_port_supported():
+        listeners = ListenerPool(("0.0.0.0", 5140), MAX_MESSAGE_SIZE,
+                                 router_factory=router_factory)
+        listeners.start()
+        stats_sources['syslog'] = listeners
+        datagram_processes = LISTENER_PROCESSES
+    else:
+        server = SyslogServer(
+            ("0.0.0.0", 5140), MessageHandler(router_factory()))
+        Process(target=server.start).start()
+        # without SO_REUSEPORT only one socket can be bound to the port
+        datagram_processes = 1
+
+    datagram_listeners = ListenerPool(
+        ("0.0.0.0", 5140), MAX_MESSAGE_SIZE,
+        processes=datagram_processes,
+        listener_factory=DatagramListener,
+        router_factory=router_factory)
+    datagram_listeners.start()
+    api.add_route('/v1/stats', StatsResource(
+        syslog_udp=datagram_listeners, **stats_sources))
 
     return application
@@ -0,0 +1,573 @@
+from multiprocessing import Process
+import errno
+import select
+import signal
+import socket
+import sys
+import threading
+
+from oslo.config import cfg
+from meniscus.api.normalization.drivers.rfc3164 import SyslogSniffer
+from meniscus.api.normalization.drivers.rfc5424 import OCTET_COUNT_DIGITS
+from meniscus.api.normalization.drivers.rfc5424 import parse_many
+from meniscus.api.normalization.drivers.rfc5424 import ParserError
+from meniscus.api.utils import sys_assist
+from meniscus.config import get_config
+from meniscus.config import init_config
+from meniscus.personas.common.counters import SharedCounters
+from meniscus.personas.common.routing import Router
+from meniscus.personas.common.routing import RoutingException
+
+# syslog listener configuration options
+_SYSLOG_LISTENERS_GROUP = cfg.OptGroup(name='syslog_listeners',
+                                       title='Syslog Listener Options')
+get_config().register_group(_SYSLOG_LISTENERS_GROUP)
+
+_SYSLOG_LISTENERS_OPTIONS = [
+    cfg.IntOpt('processes',
+               default=0,
+               help="""Number of processes accepting syslog connections on
+                       the same port, balanced by the kernel. 0 starts one
+                       per cpu core."""
+               ),
+    cfg.FloatOpt('restart_delay',
+                 default=1.0,
+                 help="""Time in seconds between checks that the listener
+                         processes are alive, a listener found dead is
+                         started again."""
+                 ),
+    cfg.IntOpt('receive_size',
+               default=65536,
+               help="""Maximum number of bytes read from a connection at a
+                       time."""
+               ),
+    cfg.IntOpt('datagram_batch_size',
+               default=64,
+               help="""Maximum number of syslog datagrams a udp listener
+                       reads each time its socket is ready."""
+               ),
+    cfg.IntOpt('datagram_size',
+               default=65535,
+               help="""Size in bytes of the buffer each datagram is read
+                       into, longer datagrams are cut."""
+               )
+]
+
+get_config().register_opts(_SYSLOG_LISTENERS_OPTIONS,
+                           group=_SYSLOG_LISTENERS_GROUP)
+try:
+    init_config()
+    conf = get_config()
+except cfg.ConfigFilesNotFoundError:
+    conf = get_config()
+
+LISTENER_PROCESSES = conf.syslog_listeners.processes
+LISTENER_RESTART_DELAY = conf.syslog_listeners.restart_delay
+LISTENER_RECEIVE_SIZE = conf.syslog_listeners.receive_size
+LISTENER_DATAGRAM_BATCH_SIZE = conf.syslog_listeners.datagram_batch_size
+LISTENER_DATAGRAM_SIZE = conf.syslog_listeners.datagram_size
+
+LISTENER_COUNTERS = ('connections', 'bytes', 'messages', 'errors',
+                     'truncated', 'oversize', 'routing_failures', 'restarts')
+
+#python 2 does not name the option, this is its value on linux
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', None)
+if SO_REUSEPORT is None and sys.platform.startswith('linux'):
+    SO_REUSEPORT = 15
+
+#with MSG_TRUNC linux returns the full length of a datagram longer than the
+#buffer it was read into
+MSG_TRUNC = getattr(socket, 'MSG_TRUNC', 0)
+
+#bytes of a frame kept for its header and structured data when the frame is
+#cut for being longer than the message size limit
+MAX_HEADER_SIZE = 2048
+
+#milliseconds a listener waits on its sockets before checking it should stop
+POLL_TIMEOUT = 1000
+
+
+def _character_boundary(text):
+    """
+    returns text without the multibyte utf-8 character its end cuts short,
+    if any
+    """
+    for back in xrange(1, min(4, len(text)) + 1):
+        byte = ord(text[-back])
+        if byte & 0xc0 == 0x80:
+            #a continuation byte, the character starts further back
+            continue
+        if byte >= 0xf0:
+            needed = 4
+        elif byte >= 0xe0:
+            needed = 3
+        elif byte >= 0xc0:
+            needed = 2
+        else:
+            needed = 1
+        if needed > back:
+            return text[:-back]
+        return text
+    return text
+
+
+def decode_message(text, max_message_size, cut=False):
+    """
+    returns the utf-8 text of a message as unicode, truncated to
+    max_message_size bytes unless it is 0, and whether it was truncated.
+    Passing cut says the text was cut short already. A character split by
+    the cut is dropped and malformed ones are replaced.
+    """
+    if text is None:
+        return text, cut
+    if max_message_size and len(text) > max_message_size:
+        text = text[:max_message_size]
+        cut = True
+    if cut:
+        text = _character_boundary(text)
+    return text.decode('utf-8', 'replace'), cut
+
+
+def listener_parser():
+    """
+    returns the parser the listeners read messages with. They only route
+    each message's as_dict(), so rfc5424 messages are scanned lazily when
+    the configured parser can
+    """
+    return SyslogSniffer(lazy=True)
+
+
+def reuse_port_supported():
+    """
+    returns True if sockets can be bound to a port other sockets are bound
+    to with SO_REUSEPORT
+    """
+    if SO_REUSEPORT is None:
+        return False
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+
+def reuse_port_socket(address, backlog=socket.SOMAXCONN,
+                      sock_type=socket.SOCK_STREAM):
+    """
+    returns a socket bound to address with SO_REUSEPORT, so each listener
+    process binds its own socket to the port and the kernel spreads new
+    connections, or datagrams, across them. Where SO_REUSEPORT is not
+    supported the socket is bound without it, for a single listener.
+    """
+    sock = socket.socket(socket.AF_INET, sock_type)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if SO_REUSEPORT is not None:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+        except socket.error:
+            pass
+    sock.bind(address)
+    if sock_type == socket.SOCK_STREAM:
+        sock.listen(backlog)
+    sock.setblocking(0)
+    return sock
+
+
+class FrameBuffer(object):
+    """
+    Holds what has been read from a connection of the frame not yet
+    complete. Reads are kept as a list of chunks, joined only once they
+    may complete the frame: when one holds a newline, for a newline
+    terminated frame, or when its octet count has been read. A frame is
+    then neither copied nor scanned again on each read. A frame growing
+    past limit bytes, unless it is 0, is cut there and the rest of it is
+    discarded as it arrives.
+    """
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.chunks = list()
+        self.size = 0
+        #the length of an octet counted frame once its count is read
+        self.frame_size = None
+        self.newline_framed = False
+        #what is left to discard of a frame that was cut, None for all of
+        #a newline terminated frame up to its newline
+        self.discarding = False
+        self.discard_size = None
+
+    def reset(self, unfinished):
+        """
+        start over holding the unfinished frame left by a parse
+        """
+        self.chunks = [unfinished] if unfinished else list()
+        self.size = len(unfinished)
+        self.frame_size = None
+        self.newline_framed = False
+        if not unfinished:
+            return
+        if '0' <= unfinished[0] <= '9':
+            separator = unfinished.find(' ', 0, OCTET_COUNT_DIGITS)
+            if separator > 0 and unfinished[:separator].isdigit():
+                self.frame_size = separator + 1 + int(unfinished[:separator])
+        else:
+            self.newline_framed = True
+
+    def append(self, data):
+        """
+        add data read from the connection, returns True if the frame may
+        be complete and the buffer should be parsed
+        """
+        if data:
+            self.chunks.append(data)
+            self.size += len(data)
+        if self.frame_size is not None:
+            return self.size >= self.frame_size
+        if self.newline_framed:
+            return '\n' in data
+        #a new frame, or an octet count not read whole yet
+        return True
+
+    def join(self):
+        buffer = b''.join(self.chunks)
+        self.chunks = [buffer]
+        return buffer
+
+    def oversize(self):
+        return bool(self.limit) and self.size > self.limit
+
+    def cut(self):
+        """
+        returns the start of the oversize frame, limit bytes of it without
+        its octet count, and discards the rest of the frame from here on
+        """
+        buffer = self.join()
+        start = 0
+        self.discard_size = None
+        if self.frame_size is not None:
+            start = buffer.find(' ') + 1
+            self.discard_size = self.frame_size - self.size
+        self.discarding = True
+        self.reset(b'')
+        return buffer[start:start + self.limit]
+
+    def discard(self, data):
+        """
+        drops the part of data that belongs to a frame that was cut,
+        returns what follows it
+        """
+        if self.discard_size is not None:
+            dropped = min(len(data), self.discard_size)
+            self.discard_size -= dropped
+            self.discarding = self.discard_size > 0
+            return data[dropped:]
+        end = data.find('\n')
+        if end < 0:
+            return b''
+        self.discarding = False
+        return data[end + 1:]
+
+
+class SyslogListener(object):
+    """
+    Accepts syslog connections on its own SO_REUSEPORT socket and routes
+    the messages read from them. Frames are octet counted or newline
+    terminated as in rfc6587 and either rfc5424 or rfc3164. Messages
+    longer than max_message_size, unless it is 0, are truncated. A frame
+    still unfinished past max_message_size and MAX_HEADER_SIZE is cut
+    there, routed and the rest of it skipped as it is read.
+    """
+
+    def __init__(self, address, counters, max_message_size,
+                 router_factory=Router, parser_factory=listener_parser,
+                 receive_size=LISTENER_RECEIVE_SIZE):
+        self.address = address
+        self.counters = counters
+        self.max_message_size = max_message_size
+        self.router_factory = router_factory
+        self.parser_factory = parser_factory
+        self.receive_size = receive_size
+        self.running = False
+
+    def stop(self, *args):
+        self.running = False
+
+    def serve(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        listening = reuse_port_socket(self.address)
+        poller = select.poll()
+        poller.register(listening, select.POLLIN)
+        router = self.router_factory()
+        parser = self.parser_factory()
+        connections = dict()
+
+        self.running = True
+        while self.running:
+            for fd, event in self._poll(poller):
+                if fd == listening.fileno():
+                    self._accept(listening, poller, connections)
+                    continue
+                connection, frames = connections[fd]
+                if self.read(connection, frames, parser, router) is None:
+                    poller.unregister(fd)
+                    connection.close()
+                    del connections[fd]
+
+        for connection, frames in connections.values():
+            connection.close()
+        listening.close()
+        router.flush()
+
+    def _poll(self, poller):
+        try:
+            return poller.poll(POLL_TIMEOUT)
+        except select.error as ex:
+            #a signal, most likely SIGTERM, interrupted the wait
+            if ex.args[0] != errno.EINTR:
+                raise
+            return []
+
+    def _accept(self, listening, poller, connections):
+        try:
+            connection, address = listening.accept()
+        except socket.error as ex:
+            #another connection event may have been taken already
+            if ex.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+        connection.setblocking(0)
+        poller.register(connection, select.POLLIN)
+        connections[connection.fileno()] = (connection, self.frame_buffer())
+        self.counters.increment('connections')
+
+    def frame_buffer(self):
+        limit = 0
+        if self.max_message_size:
+            limit = self.max_message_size + MAX_HEADER_SIZE
+        return FrameBuffer(limit)
+
+    def read(self, connection, frames, parser, router):
+        """
+        reads from the connection into its FrameBuffer and routes the
+        messages completed, returns the FrameBuffer, or None once the
+        connection is done
+        """
+        try:
+            data = connection.recv(self.receive_size)
+        except socket.error as ex:
+            if ex.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return frames
+            data = b''
+        final = not data
+        self.counters.increment('bytes', len(data))
+
+        if frames.discarding:
+            data = frames.discard(data)
+            if not data and not final:
+                return frames
+        if frames.append(data) or final:
+            buffer = frames.join()
+            messages, errors, remainder = parse_many(buffer, parser, final)
+            self.route(messages, errors, router)
+            if final:
+                return None
+            frames.reset(buffer[remainder:])
+
+        if frames.oversize():
+            self.counters.increment('oversize')
+            messages = list()
+            errors = list()
+            try:
+                messages.append(parser.parse(frames.cut()))
+            except ParserError as ex:
+                errors.append((0, ex))
+            self.route(messages, errors, router, cut=True)
+        return frames
+
+    def route(self, messages, errors, router, cut=False):
+        """
+        routes the messages, truncating any longer than max_message_size.
+        Passing cut counts every message as truncated, as the frames they
+        were parsed from were cut short
+        """
+        truncated = 0
+        routing_failures = 0
+        invalid = 0
+        for message in messages:
+            try:
+                outbound = message.as_dict()
+            except ParserError:
+                #a lazily parsed message is checked as it is read
+                invalid += 1
+                continue
+            outbound['message'], message_cut = decode_message(
+                outbound['message'], self.max_message_size, cut)
+            truncated += message_cut
+            try:
+                router.route_message(outbound)
+            except RoutingException:
+                routing_failures += 1
+
+        self.counters.increment('messages', len(messages) - invalid)
+        self.counters.increment('errors', len(errors) + invalid)
+        self.counters.increment('truncated', truncated)
+        self.counters.increment('routing_failures', routing_failures)
+
+
+class DatagramListener(SyslogListener):
+    """
+    Reads syslog datagrams, as in rfc5426, from its own SO_REUSEPORT udp
+    socket. Each datagram holds a single message, in either format, with
+    no framing. Every time the socket is ready up to batch_size datagrams
+    are read, each into one of a set of buffers allocated once, before
+    the messages are parsed and routed together.
+    """
+
+    def __init__(self, address, counters, max_message_size,
+                 router_factory=Router, parser_factory=listener_parser,
+                 receive_size=LISTENER_DATAGRAM_SIZE,
+                 batch_size=LISTENER_DATAGRAM_BATCH_SIZE):
+        super(DatagramListener, self).__init__(
+            address, counters, max_message_size, router_factory,
+            parser_factory, receive_size)
+        self.batch_size = batch_size
+
+    def buffers(self):
+        """
+        returns the buffers datagrams are read into, one per datagram of a
+        batch
+        """
+        return [memoryview(bytearray(self.receive_size))
+                for buffer in range(self.batch_size)]
+
+    def serve(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        sock = reuse_port_socket(self.address, sock_type=socket.SOCK_DGRAM)
+        poller = select.poll()
+        poller.register(sock, select.POLLIN)
+        router = self.router_factory()
+        parser = self.parser_factory()
+        buffers = self.buffers()
+
+        self.running = True
+        while self.running:
+            if self._poll(poller):
+                self.read(sock, buffers, parser, router)
+
+        sock.close()
+        router.flush()
+
+    def read(self, sock, buffers, parser, router):
+        """
+        reads the datagrams waiting on the socket, at most one per buffer,
+        and routes the messages they hold. Returns the number of datagrams
+        read.
+        """
+        sizes = list()
+        oversize = 0
+        for buffer in buffers:
+            try:
+                size = sock.recv_into(buffer, 0, MSG_TRUNC)
+            except socket.error as ex:
+                if ex.errno in (errno.EAGAIN, errno.EWOULDBLOCK,
+                                errno.EINTR):
+                    break
+                raise
+            if size > len(buffer):
+                size = len(buffer)
+                oversize += 1
+            sizes.append(size)
+
+        messages = list()
+        errors = list()
+        for buffer, size in zip(buffers, sizes):
+            #senders often end the datagram as they would a tcp frame
+            data = buffer[:size].tobytes().rstrip('\r\n\x00')
+            try:
+                messages.append(parser.parse(data))
+            except ParserError as ex:
+                errors.append((0, ex))
+
+        self.counters.increment('bytes', sum(sizes))
+        self.counters.increment('oversize', oversize)
+        self.route(messages, errors, router)
+        return len(sizes)
+
+
+class ListenerPool(object):
+    """
+    Runs the syslog listeners in a process each, all bound to the same
+    port, and starts any listener that exits again. Each listener has its
+    own router and counters. The pool must be created before the process
+    reporting its stats is forked.
+    """
+
+    def __init__(self, address, max_message_size,
+                 processes=LISTENER_PROCESSES,
+                 restart_delay=LISTENER_RESTART_DELAY,
+                 listener_factory=SyslogListener, router_factory=Router):
+        self.address = address
+        self.max_message_size = max_message_size
+        self.router_factory = router_factory
+        self.processes = processes or int(sys_assist.get_cpu_core_count())
+        self.restart_delay = restart_delay
+        self.listener_factory = listener_factory
+        self.listener_stats = [SharedCounters(*LISTENER_COUNTERS)
+                               for listener in range(self.processes)]
+        self._listeners = [None] * self.processes
+        self._stopping = threading.Event()
+        self._supervisor = None
+
+    def _start_listener(self, listener_id):
+        listener = self.listener_factory(
+            self.address, self.listener_stats[listener_id],
+            self.max_message_size, router_factory=self.router_factory)
+        process = Process(target=listener.serve)
+        process.daemon = True
+        process.start()
+        self._listeners[listener_id] = process
+
+    def start(self):
+        for listener_id in range(self.processes):
+            self._start_listener(listener_id)
+        self._supervisor = threading.Thread(target=self._supervise)
+        self._supervisor.daemon = True
+        self._supervisor.start()
+
+    def _supervise(self):
+        while not self._stopping.wait(self.restart_delay):
+            self.restart_exited()
+
+    def restart_exited(self):
+        """
+        start again the listeners whose processes have exited
+        """
+        for listener_id, process in enumerate(self._listeners):
+            if process is not None and not process.is_alive():
+                self.listener_stats[listener_id].increment('restarts')
+                self._start_listener(listener_id)
+
+    def stop(self):
+        self._stopping.set()
+        for process in self._listeners:
+            if process is not None:
+                process.terminate()
+                process.join()
+        self._listeners = [None] * self.processes
+
+    def get_stats(self):
+        listeners = dict()
+        messages = 0
+        for listener_id, counters in enumerate(self.listener_stats):
+            stats = counters.get_stats()
+            listeners[str(listener_id)] = stats
+            messages += stats['messages']
+
+        return {
+            'processes': self.processes,
+            'messages': messages,
+            'listeners': listeners
+        }
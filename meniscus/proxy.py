@@ -30,10 +30,28 @@ class NativeProxy(object):
                 key, value, cache_expires, cache_name)
 
     def cache_update(self, key, value, cache_expires, cache_name):
+        """
+        sets the value whether or not the key is already cached
+        """
         if self.UWSGI:
             self.server.cache_update(
                 key, value, cache_expires, cache_name)
 
+    def cache_get_many(self, entries):
+        """
+        takes a list of (key, cache_name) pairs and returns their values in
+        the same order, None for each missing key
+        """
+        return [self.cache_get(key, cache_name)
+                for key, cache_name in entries]
+
+    def cache_update_many(self, entries, cache_expires):
+        """
+        takes a list of (key, value, cache_name) tuples and sets each value
+        """
+        for key, value, cache_name in entries:
+            self.cache_update(key, value, cache_expires, cache_name)
+
     def cache_del(self, key, cache_name):
         if self.UWSGI:
             self.server.cache_del(key, cache_name)
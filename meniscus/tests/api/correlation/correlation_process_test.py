@@ -165,6 +165,7 @@ class WhenTestingCorrelationMessage(unittest.TestCase):
         self.assertTrue('meniscus' in message.keys())
         self.assertTrue('correlation' in message['meniscus'].keys())
         meniscus_dict = message['meniscus']['correlation']
+        self.assertEquals(meniscus_dict['tenant_id'], self.tenant.tenant_id)
         self.assertTrue('host_id' in meniscus_dict.keys())
         self.assertEquals(meniscus_dict['host_id'], 765)
         self.assertTrue('ep_id' in meniscus_dict.keys())
@@ -238,6 +239,61 @@ class WhenTestingCorrelationMessage(unittest.TestCase):
         self.assertEquals(meniscus_dict['pattern'], None)
         self.assertFalse('job_id' in meniscus_dict.keys())
 
+    def _sshd_message(self, pname='producer99'):
+        return {
+            "host": "host1",
+            "pname": pname,
+            "time": "2013-03-19T18:16:48.411029Z",
+            "msg": "sshd[4122]: Accepted publickey for bob"
+        }
+
+    def _add_sshd_producer(self, in_profile=True, durable=False):
+        self.tenant.add_event_producer(EventProducer(
+            434, 'sshd', 'sshd[%pid:number%]: %rest:rest%', durable))
+        if in_profile:
+            self.tenant.update_profile(
+                self.profiles[0],
+                event_producers=self.profiles[0].event_producers + [434])
+
+    def test_process_message_matches_producer_patterns(self):
+        self._add_sshd_producer(durable=True)
+
+        test_message = Correlator(self.tenant, self._sshd_message())
+        test_message.process_message()
+        meniscus_dict = test_message.message['meniscus']['correlation']
+        self.assertEquals(meniscus_dict['ep_id'], 434)
+        self.assertEquals(meniscus_dict['pattern'],
+                          'sshd[%pid:number%]: %rest:rest%')
+        self.assertTrue(test_message.is_durable())
+
+    def test_process_message_prefers_the_producer_named_by_pname(self):
+        self._add_sshd_producer()
+
+        test_message = Correlator(self.tenant,
+                                  self._sshd_message('producer2'))
+        test_message.process_message()
+        meniscus_dict = test_message.message['meniscus']['correlation']
+        self.assertEquals(meniscus_dict['ep_id'], 433)
+
+    def test_process_message_skips_producers_outside_the_profile(self):
+        self._add_sshd_producer(in_profile=False)
+
+        test_message = Correlator(self.tenant, self._sshd_message())
+        test_message.process_message()
+        meniscus_dict = test_message.message['meniscus']['correlation']
+        self.assertEquals(meniscus_dict['ep_id'], None)
+
+    def test_process_message_defaults_when_no_pattern_matches(self):
+        self._add_sshd_producer()
+        body = self._sshd_message()
+        body['msg'] = 'cron[12]: job started'
+
+        test_message = Correlator(self.tenant, body)
+        test_message.process_message()
+        meniscus_dict = test_message.message['meniscus']['correlation']
+        self.assertEquals(meniscus_dict['ep_id'], None)
+        self.assertFalse(test_message.is_durable())
+
 
 class WhenTestingTenantIdentification(unittest.TestCase):
     def setUp(self):
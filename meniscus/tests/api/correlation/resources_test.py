@@ -7,6 +7,8 @@ import falcon
 import meniscus.api.correlation.correlation_exceptions as errors
 import meniscus.api.correlation.correlation_process as process
 from meniscus.api.correlation.resources import PublishMessageResource
+from meniscus.personas.common.routing import RoutingException
+from meniscus.personas.common.send_queue import SendQueueFullException
 from meniscus.data.model.tenant import Tenant
 
 
@@ -103,6 +105,8 @@ class WhenTestingPublishMessage(unittest.TestCase):
                          MagicMock(return_value=False)):
             self.resource.on_post(self.req, self.resp, self.tenant_id)
             self.assertEquals(self.resp.status, falcon.HTTP_204)
+            self.router.route_message.assert_called_once_with(
+                self.body, wait=False)
 
     def test_returns_202_for_durable_message_on_post(self):
         with patch('meniscus.api.correlation.resources.'
@@ -122,6 +126,41 @@ class WhenTestingPublishMessage(unittest.TestCase):
             self.assertEquals(self.resp.status, falcon.HTTP_202)
             self.assertTrue("job_id" in self.resp.body)
             self.assertTrue("job_status_uri" in self.resp.body)
+            self.router.route_message.assert_called_once_with(
+                self.body, wait=True)
+
+    def test_returns_500_when_durable_message_is_not_routed_on_post(self):
+        self.router.route_message.side_effect = RoutingException
+        with patch('meniscus.api.correlation.resources.'
+                   'load_body', MagicMock(return_value=self.body)), \
+            patch.object(PublishMessageResource,
+                         '_validate_req_body_on_post', MagicMock()), \
+            patch.object(process.TenantIdentification,
+                         'get_validated_tenant',
+                         MagicMock(return_value=self.tenant)), \
+            patch.object(process.Correlator,
+                         'process_message',
+                         MagicMock()), \
+            patch.object(process.Correlator,
+                         'is_durable',
+                         MagicMock(return_value=True)):
+            with self.assertRaises(falcon.HTTPError):
+                self.resource.on_post(self.req, self.resp, self.tenant_id)
+
+    def test_returns_503_when_send_queue_is_full_on_post(self):
+        self.router.route_message.side_effect = SendQueueFullException
+        with patch('meniscus.api.correlation.resources.'
+                   'load_body', MagicMock(return_value=self.body)), \
+            patch.object(PublishMessageResource,
+                         '_validate_req_body_on_post', MagicMock()), \
+            patch.object(process.TenantIdentification,
+                         'get_validated_tenant',
+                         MagicMock(return_value=self.tenant)), \
+            patch.object(process.Correlator,
+                         'process_message',
+                         MagicMock()):
+            with self.assertRaises(falcon.HTTPServiceUnavailable):
+                self.resource.on_post(self.req, self.resp, self.tenant_id)
 
 if __name__ == '__main__':
     unittest.main()
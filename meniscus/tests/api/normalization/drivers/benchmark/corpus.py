@@ -0,0 +1,103 @@
+import random
+
+"""
+Syslog messages for the parser benchmarks, grouped by the shape that
+matters to a parser. Messages are generated from a fixed seed so every
+run parses the same corpus.
+"""
+
+SEED = 5424
+MESSAGES_PER_CATEGORY = 200
+
+HOSTS = ['web-01', 'web-02', 'db-master', 'cache-3', 'lb-east-1']
+APPLICATIONS = ['nginx', 'postgres', 'rsyslogd', 'sshd', 'meniscus']
+WORDS = ['GET', 'POST', '/v1/tenant', '200', '404', 'took', 'ms', 'user',
+         'session', 'opened', 'closed', 'connection', 'from', '10.0.4.21']
+
+
+def _timestamp(rand):
+    #messages from one source share their second and offset in bursts
+    second = rand.randint(0, 3)
+    offset = rand.choice(['Z', 'Z', '-06:00', '+05:30'])
+    return '2013-06-21T10:15:{0:02d}.{1:06d}{2}'.format(
+        second, rand.randint(0, 999999), offset)
+
+
+def _header(rand):
+    return '<{0}>1 {1} {2} {3} {4} ID{5}'.format(
+        rand.randint(0, 191), _timestamp(rand), rand.choice(HOSTS),
+        rand.choice(APPLICATIONS), rand.randint(100, 65535),
+        rand.randint(1, 99))
+
+
+def _text(rand, words):
+    return ' '.join(rand.choice(WORDS) for word in range(words))
+
+
+def _element(rand, name, params):
+    return '[{0} {1}]'.format(name, ' '.join(
+        'param{0}="{1}"'.format(param, _text(rand, 2))
+        for param in range(params)))
+
+
+def no_structured_data(rand):
+    return '{0} - {1}'.format(_header(rand), _text(rand, 12))
+
+
+def one_element(rand):
+    return '{0} {1} {2}'.format(
+        _header(rand), _element(rand, 'origin', 4), _text(rand, 12))
+
+
+def many_elements(rand):
+    elements = ''.join(_element(rand, 'meta{0}@32473'.format(element), 3)
+                       for element in range(8))
+    return '{0} {1} {2}'.format(_header(rand), elements, _text(rand, 6))
+
+
+def escaped_quotes(rand):
+    return ('{0} [request uri="/v1/\\"quoted\\"" note="a \\] b"] {1}'
+            .format(_header(rand), _text(rand, 6)))
+
+
+def long_payload(rand):
+    return '{0} {1} {2}'.format(
+        _header(rand), _element(rand, 'origin', 2), _text(rand, 1200))
+
+
+def malformed(rand):
+    return rand.choice([
+        'not a syslog message at all',
+        '<13> missing version',
+        '<13>1 2013-06-21 host app 1 2 - bad timestamp',
+        '<13>1 - host app 1 2 [open element="never closed"',
+        '<13>1 - host app 1 2 [id key=unquoted] text',
+        '{0} [id a="short name"] text'.format(_header(rand)),
+        _header(rand)])
+
+
+def rfc3164(rand):
+    return '<{0}>Jun {1:2d} 10:15:{2:02d} {3} {4}[{5}]: {6}'.format(
+        rand.randint(0, 191), rand.randint(1, 30), rand.randint(0, 59),
+        rand.choice(HOSTS), rand.choice(APPLICATIONS),
+        rand.randint(100, 65535), _text(rand, 12))
+
+
+CATEGORIES = [
+    ('no_sd', no_structured_data),
+    ('one_sd', one_element),
+    ('many_sd', many_elements),
+    ('escaped_quotes', escaped_quotes),
+    ('long_payload', long_payload),
+    ('malformed', malformed),
+    ('rfc3164', rfc3164)
+]
+
+
+def build_corpus(size=MESSAGES_PER_CATEGORY, seed=SEED):
+    """
+    returns a list of (category, messages) pairs
+    """
+    rand = random.Random(seed)
+    return [(name, [generate(rand) for message in range(size)])
+            for name, generate in CATEGORIES]
@@ -0,0 +1,219 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+from meniscus.api.normalization.drivers.rfc3164 import SyslogSniffer
+from meniscus.api.normalization.drivers.rfc5424 import ParserError
+from meniscus.api.normalization.drivers.rfc5424 import RFC5424MessageParser
+from meniscus.api.normalization.drivers.rfc5424_scanner import \
+    RFC5424MessageScanner
+from meniscus.tests.api.normalization.drivers.benchmark.corpus import \
+    build_corpus
+
+"""
+Benchmarks the rfc5424 parsers over the corpus and compares the results
+with a saved baseline. Run it with
+
+    python -m meniscus.tests.api.normalization.drivers.benchmark.runner
+
+and pass --save to record the results as the new baseline. Baselines only
+mean something on the machine they were taken on.
+
+Python 2 cannot count allocations, so the objects reported per message are
+the objects tracked by the garbage collector that a parsed message keeps
+alive, which covers every container the parser leaves behind.
+"""
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_THRESHOLD = 0.10
+DEFAULT_ROUNDS = 20
+
+#each latency is the average of parsing a message this many times, which
+#keeps a few microseconds well above the resolution of the timer
+PARSES_PER_SAMPLE = 10
+
+ENGINES = [
+    ('regex', lambda: RFC5424MessageParser().parse),
+    ('scanner', lambda: RFC5424MessageScanner(False).parse),
+    ('deferred', lambda: RFC5424MessageScanner(True).parse),
+    ('lazy', lambda: RFC5424MessageScanner(False).parse_lazy),
+    ('sniffer', lambda: SyslogSniffer(RFC5424MessageScanner(False)).parse)
+]
+
+#the results compared with the baseline, p99 varies too much between runs
+HIGHER_IS_BETTER = ('throughput',)
+LOWER_IS_BETTER = ('p50_us', 'objects')
+
+
+def _parse_all(parse, messages):
+    parsed = []
+    for message in messages:
+        try:
+            parsed.append(parse(message))
+        except ParserError:
+            pass
+    return parsed
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(parse, messages, rounds=DEFAULT_ROUNDS):
+    """
+    returns the best throughput of the rounds, the p50 and p99 latencies
+    in microseconds, the objects kept alive per parsed message and the
+    share of messages that failed to parse
+    """
+    timer = time.time
+    parsed = _parse_all(parse, messages)
+
+    #the fastest round is the one least disturbed by the rest of the machine
+    fastest = None
+    for repeat in xrange(rounds):
+        start = timer()
+        _parse_all(parse, messages)
+        elapsed = timer() - start
+        if fastest is None or elapsed < fastest:
+            fastest = elapsed
+    throughput = len(messages) / fastest
+
+    latencies = []
+    samples = xrange(PARSES_PER_SAMPLE)
+    for repeat in xrange(rounds):
+        for message in messages:
+            start = timer()
+            for sample in samples:
+                try:
+                    parse(message)
+                except ParserError:
+                    pass
+            latencies.append((timer() - start) / PARSES_PER_SAMPLE)
+    latencies.sort()
+
+    objects = 0.0
+    if parsed:
+        del parsed
+        gc.collect()
+        before = len(gc.get_objects())
+        parsed = _parse_all(parse, messages)
+        gc.collect()
+        #less the list holding the messages
+        objects = (len(gc.get_objects()) - before - 1) / float(len(parsed))
+
+    return {
+        'throughput': round(throughput, 1),
+        'p50_us': round(_percentile(latencies, 0.50) * 1000000, 2),
+        'p99_us': round(_percentile(latencies, 0.99) * 1000000, 2),
+        'objects': round(objects, 2),
+        'errors': round(1 - len(_parse_all(parse, messages)) /
+                        float(len(messages)), 3)
+    }
+
+
+def run(corpus, engines=ENGINES, rounds=DEFAULT_ROUNDS):
+    """
+    returns the results of every engine for every category of the corpus
+    """
+    results = dict()
+    for engine, parser_factory in engines:
+        parse = parser_factory()
+        results[engine] = dict(
+            (category, measure(parse, messages, rounds))
+            for category, messages in corpus)
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    returns a description of every result that is worse than the baseline
+    by more than the threshold
+    """
+    regressions = []
+    for engine, categories in sorted(results.items()):
+        for category, result in sorted(categories.items()):
+            expected = baseline.get(engine, {}).get(category)
+            if not expected:
+                continue
+            for name, value in sorted(result.items()):
+                base = expected.get(name)
+                if not base:
+                    continue
+                if name in LOWER_IS_BETTER:
+                    change = (value - base) / float(base)
+                elif name in HIGHER_IS_BETTER:
+                    change = (base - value) / float(base)
+                else:
+                    continue
+                if change > threshold:
+                    regressions.append(
+                        '{0} {1} {2}: {3} against {4} ({5:+.1%})'.format(
+                            engine, category, name, value, base,
+                            (value - base) / float(base)))
+    return regressions
+
+
+def report(results, out=sys.stdout):
+    out.write('{0:10} {1:15} {2:>12} {3:>9} {4:>9} {5:>8} {6:>7}\n'.format(
+        'engine', 'category', 'msgs/s', 'p50 us', 'p99 us', 'objects',
+        'errors'))
+    for engine, categories in sorted(results.items()):
+        for category, result in sorted(categories.items()):
+            out.write('{0:10} {1:15} {throughput:12.1f} {p50_us:9.2f} '
+                      '{p99_us:9.2f} {objects:8.2f} {errors:7.1%}\n'
+                      .format(engine, category, **result))
+
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return None
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_baseline(results, path=BASELINE_FILE):
+    with open(path, 'w') as baseline_file:
+        json.dump(results, baseline_file, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        baseline_file.write('\n')
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(
+        description='Benchmark the rfc5424 parsers.')
+    arguments.add_argument('--save', action='store_true',
+                           help='save the results as the new baseline')
+    arguments.add_argument('--baseline', default=BASELINE_FILE,
+                           help='the baseline file to compare with')
+    arguments.add_argument('--threshold', type=float,
+                           default=DEFAULT_THRESHOLD,
+                           help='the change counted as a regression')
+    arguments.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS,
+                           help='the passes made over the corpus')
+    options = arguments.parse_args(argv)
+
+    results = run(build_corpus(), rounds=options.rounds)
+    report(results)
+
+    if options.save:
+        save_baseline(results, options.baseline)
+        print 'Saved the baseline to {0}'.format(options.baseline)
+        return 0
+
+    baseline = load_baseline(options.baseline)
+    if baseline is None:
+        print 'No baseline at {0}, run with --save'.format(options.baseline)
+        return 0
+
+    regressions = compare(results, baseline, options.threshold)
+    for regression in regressions:
+        print 'Regression: {0}'.format(regression)
+    if not regressions:
+        print 'No regressions beyond {0:.0%}'.format(options.threshold)
+    return len(regressions) and 1 or 0
+
+if __name__ == '__main__':
+    sys.exit(main())
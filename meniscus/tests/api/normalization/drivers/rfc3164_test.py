@@ -0,0 +1,166 @@
+import time
+import unittest
+
+from mock import MagicMock
+
+from meniscus.api.normalization.drivers.rfc3164 import FORMAT_RFC3164
+from meniscus.api.normalization.drivers.rfc3164 import FORMAT_RFC5424
+from meniscus.api.normalization.drivers.rfc3164 import RFC3164MessageParser
+from meniscus.api.normalization.drivers.rfc3164 import sniff_format
+from meniscus.api.normalization.drivers.rfc3164 import SyslogSniffer
+from meniscus.api.normalization.drivers.rfc5424 import ParserError
+from meniscus.api.normalization.drivers.rfc5424 import SyslogMessage
+from meniscus.api.normalization.drivers.rfc5424 import UTC
+from meniscus.tests.api.normalization.drivers.rfc5424_test import \
+    HAPPY_PATH_MESSAGE
+
+BSD_MESSAGE = '<38>Oct 11 22:14:15 tohru sshd[4122]: Accepted publickey'
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(WhenTestingSniffFormat))
+    suite.addTest(unittest.makeSuite(WhenTestingRFC3164MessageParser))
+    suite.addTest(unittest.makeSuite(WhenTestingSyslogSniffer))
+    return suite
+
+
+class WhenTestingSniffFormat(unittest.TestCase):
+
+    def test_formats_are_told_apart(self):
+        self.assertEqual(sniff_format(HAPPY_PATH_MESSAGE), FORMAT_RFC5424)
+        self.assertEqual(sniff_format(BSD_MESSAGE), FORMAT_RFC3164)
+
+    def test_other_lines_have_no_format(self):
+        for line in ['', 'plain text', '<not syslog', '<>1 -', '<1234>1 -',
+                     '<13> missing version', '<13>']:
+            self.assertIsNone(sniff_format(line))
+
+
+class WhenTestingRFC3164MessageParser(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = RFC3164MessageParser()
+
+    def test_message_is_parsed(self):
+        message = self.parser.parse(BSD_MESSAGE)
+
+        self.assertIsInstance(message, SyslogMessage)
+        self.assertEqual(message.priority, '38')
+        self.assertIsNone(message.version)
+        self.assertEqual(message.hostname, 'tohru')
+        self.assertEqual(message.application, 'sshd')
+        self.assertEqual(message.process_id, '4122')
+        self.assertEqual(message.message_id, '-')
+        self.assertEqual(message.structured_data, [])
+        self.assertEqual(message.message, 'Accepted publickey')
+
+    def test_timestamp_is_in_utc_this_year(self):
+        timestamp = self.parser.parse(
+            '<13>Jan  2 03:04:05 host app: text').timestamp
+
+        self.assertEqual(timestamp.tzinfo, UTC)
+        self.assertEqual((timestamp.month, timestamp.day, timestamp.hour,
+                          timestamp.minute, timestamp.second),
+                         (1, 2, 3, 4, 5))
+        self.assertEqual(timestamp.year, time.gmtime().tm_year)
+
+    def test_months_ahead_are_last_year(self):
+        parser = RFC3164MessageParser()
+        now = time.gmtime()
+        if now.tm_mon >= 11:
+            return
+        timestamp = parser.parse('<13>Dec 31 23:59:59 host app: text')\
+            .timestamp
+        self.assertEqual(timestamp.year, now.tm_year - 1)
+
+    def test_tag_without_process_id(self):
+        message = self.parser.parse('<13>Oct 11 22:14:15 host cron: run')
+
+        self.assertEqual(message.application, 'cron')
+        self.assertEqual(message.process_id, '-')
+        self.assertEqual(message.message, 'run')
+
+    def test_missing_hostname(self):
+        message = self.parser.parse('<13>Oct 11 22:14:15 su: root failed')
+
+        self.assertEqual(message.hostname, '-')
+        self.assertEqual(message.application, 'su')
+        self.assertEqual(message.message, 'root failed')
+
+    def test_missing_tag(self):
+        message = self.parser.parse('<13>Oct 11 22:14:15 host just text')
+
+        self.assertEqual(message.hostname, 'host')
+        self.assertEqual(message.application, '-')
+        self.assertEqual(message.message, 'just text')
+
+    def test_invalid_messages_raise(self):
+        for line in ['', 'plain text', '<13>1 2012-12-11T15:48:23Z h a',
+                     '<13>Foo 11 22:14:15 host app: text',
+                     '<13>Oct 11 22-14-15 host app: text',
+                     '<13>Oct xx 22:14:15 host app: text',
+                     '<13>Feb 30 22:14:15 host app: text',
+                     '<13>Oct 11 22:14']:
+            self.assertRaises(ParserError, self.parser.parse, line)
+
+
+class WhenTestingSyslogSniffer(unittest.TestCase):
+
+    def setUp(self):
+        self.rfc5424_parser = MagicMock()
+        self.rfc3164_parser = MagicMock()
+        self.sniffer = SyslogSniffer(self.rfc5424_parser,
+                                     self.rfc3164_parser)
+
+    def test_messages_go_to_the_parser_for_their_format(self):
+        self.sniffer.parse(HAPPY_PATH_MESSAGE)
+        self.sniffer.parse(BSD_MESSAGE)
+
+        self.rfc5424_parser.parse.assert_called_once_with(
+            HAPPY_PATH_MESSAGE, 0, None)
+        self.rfc3164_parser.parse.assert_called_once_with(
+            BSD_MESSAGE, 0, None)
+
+    def test_lazy_sniffers_scan_rfc5424_messages_lazily(self):
+        sniffer = SyslogSniffer(self.rfc5424_parser, self.rfc3164_parser,
+                                lazy=True)
+        sniffer.parse(HAPPY_PATH_MESSAGE)
+
+        self.rfc5424_parser.parse_lazy.assert_called_once_with(
+            HAPPY_PATH_MESSAGE, 0, None)
+        self.assertFalse(self.rfc5424_parser.parse.called)
+
+    def test_lazy_sniffers_fall_back_to_parse(self):
+        rfc5424_parser = MagicMock(spec=['parse'])
+        sniffer = SyslogSniffer(rfc5424_parser, self.rfc3164_parser,
+                                lazy=True)
+        sniffer.parse(HAPPY_PATH_MESSAGE)
+
+        rfc5424_parser.parse.assert_called_once_with(
+            HAPPY_PATH_MESSAGE, 0, None)
+
+    def test_messages_are_sniffed_where_they_lie(self):
+        buffer = 'plain text\n' + BSD_MESSAGE + '\n'
+        start = buffer.index('<')
+
+        self.sniffer.parse(buffer, start, len(buffer) - 1)
+
+        self.rfc3164_parser.parse.assert_called_once_with(
+            buffer, start, len(buffer) - 1)
+        self.assertRaises(ParserError, self.sniffer.parse, buffer, 0, 5)
+
+    def test_other_lines_are_not_parsed(self):
+        self.assertRaises(ParserError, self.sniffer.parse, 'plain text')
+        self.assertFalse(self.rfc5424_parser.parse.called)
+        self.assertFalse(self.rfc3164_parser.parse.called)
+
+    def test_default_parsers_give_syslog_messages(self):
+        sniffer = SyslogSniffer()
+
+        self.assertEqual(sniffer.parse(HAPPY_PATH_MESSAGE).hostname, 'tohru')
+        self.assertEqual(sniffer.parse(BSD_MESSAGE).hostname, 'tohru')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import sys
+
+from meniscus.api.normalization.drivers.rfc5424 import *
+from meniscus.api.normalization.drivers.rfc5424_scanner import \
+    RFC5424MessageScanner
+from meniscus.tests.api.normalization.drivers.rfc5424_test import \
+    HAPPY_PATH_MESSAGE
+
+FIELDS = ('priority', 'timestamp', 'hostname', 'application', 'process_id',
+          'message', 'message_id', 'version')
+
+
+class LegacySyslogMessage(object):
+    """
+    The syslog message as it was before it was given slots
+    """
+
+    def __init__(self):
+        self.structured_data = []
+        self.priority = None
+        self.timestamp = None
+        self.hostname = None
+        self.application = None
+        self.process_id = None
+        self.message = None
+        self.message_id = None
+        self.version = None
+
+
+class LegacyStructuredData(dict):
+    """
+    The structured data as it was before it was given slots
+    """
+
+    def __init__(self, name):
+        super(LegacyStructuredData, self).__init__()
+        self.name = name
+
+
+def to_legacy(message):
+    legacy = LegacySyslogMessage()
+    for field in FIELDS:
+        setattr(legacy, field, getattr(message, field))
+    for structured_data in message.structured_data:
+        legacy_structured_data = LegacyStructuredData(structured_data.name)
+        legacy_structured_data.update(structured_data)
+        legacy.structured_data.append(legacy_structured_data)
+    return legacy
+
+
+def footprint(message):
+    """
+    returns the bytes taken by a message and its structured data, leaving
+    out the field values that are the same whichever type holds them
+    """
+    objects = [message, message.structured_data]
+    objects.extend(message.structured_data)
+    size = 0
+    for value in objects:
+        size += sys.getsizeof(value)
+        if hasattr(value, '__dict__'):
+            size += sys.getsizeof(value.__dict__)
+    return size
+
+
+class PerformanceTest:
+    def test_performance(self):
+        message = RFC5424MessageScanner().parse(HAPPY_PATH_MESSAGE)
+        legacy = footprint(to_legacy(message))
+        slotted = footprint(message)
+
+        print ('Bytes per message with dicts: {0}. With slots: {1}. '
+               'Saved: {2:.1%}'.format(legacy, slotted,
+                                       1 - float(slotted) / legacy))
+
+
+def main():
+    PerformanceTest().test_performance()
+
+if __name__ == '__main__':
+    main()
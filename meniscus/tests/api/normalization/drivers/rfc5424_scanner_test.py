@@ -0,0 +1,378 @@
+import unittest
+
+from mock import MagicMock
+
+from meniscus.api.normalization.drivers.rfc5424 import *
+from meniscus.api.normalization.drivers.rfc5424_scanner import \
+    DeferredStructuredData
+from meniscus.api.normalization.drivers.rfc5424_scanner import \
+    parse_structured_data
+from meniscus.api.normalization.drivers.rfc5424_scanner import \
+    RFC5424MessageScanner
+from meniscus.tests.api.normalization.drivers.rfc5424_test import \
+    HAPPY_PATH_MESSAGE
+from meniscus.tests.api.normalization.drivers.rfc5424_test import \
+    PARTIAL_MESSAGE
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(WhenTestingRFC5424MessageScanner))
+    suite.addTest(unittest.makeSuite(WhenTestingLazySyslogMessage))
+    suite.addTest(unittest.makeSuite(WhenTestingDeferredStructuredData))
+    suite.addTest(unittest.makeSuite(WhenTestingGetParser))
+
+    return suite
+
+MESSAGES = [
+    HAPPY_PATH_MESSAGE,
+    '<13>1 2012-12-11T15:48:23.2Z host app 1 2 - hello world',
+    '<13>1 2012-12-11T15:48:23.2+01:30 host app 1 2 [a@1 ab="1"] text',
+    '<13>1 2012-12-11T15:48:23.2Z host app 1 2 [id ab="1" cd="x y"] text',
+    '<13>1 2012-12-11T15:48:23.2Z host app 1 2 first line\nsecond line',
+    '<13>1 2012-12-11T15:48:23.2Z host app 1 2\t""',
+    '<13>1 2012-12-11T15:48:23.2Z host app 1 2 -  ',
+    u'<13>1 2012-12-11T15:48:23.2Z host app 1 2 - unicode \u00e9'
+]
+
+INVALID_MESSAGES = [
+    '',
+    'not syslog',
+    '<1234>1 - - - - - start',
+    '<13> - - - - - start',
+    '<13>1 2012-12-11 host app 1 2 - start',
+    '<13>1 - host[1] app 1 2 - start',
+    '<13>1 - host app 1 2',
+    '<13>1 - host app 1 2 [id ab="1"',
+    '<13>1 - host app 1 2 [id a="1"] start',
+    '<13>1 - host app 1 2 [id ab=1] start',
+    '<13>1 - host app 1 2 key=value'
+]
+
+
+#structured data whose quoting trips up anything but the element walk
+TRICKY_STRUCTURED_DATA = [
+    '[x@1 kk="v\\"q" jj="]"]rest',
+    '[xx kk="]" jj="["] [yy kk="a]b"]rest',
+    '[xx kk="a"bb="c"] rest',
+    '[xx kk = "v" ]rest',
+    '[xx kk="v"][yy kk="]"] rest ] [zz',
+    '[xx kk="v"]] rest',
+    '[xx kk="v" ["] rest',
+    '[xx kk=1] rest',
+    '[xx kk="v] rest',
+    '[xx "kk"="v"] rest',
+    '[xx [yy kk="v"]] rest',
+    '[xx]',
+    '[xx kk="v"]\n[yy kk="w"] rest'
+]
+
+
+def _fields(message):
+    return (message.priority, message.version, message.timestamp,
+            message.hostname, message.application, message.process_id,
+            message.message_id, message.message,
+            [(sd.name, dict(sd)) for sd in message.structured_data])
+
+
+class WhenTestingRFC5424MessageScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.scanner = RFC5424MessageScanner()
+        self.parser = RFC5424MessageParser()
+
+    def test_parsing_full_message(self):
+        message = self.scanner.parse(HAPPY_PATH_MESSAGE)
+
+        self.assertEqual(message.version, '1')
+        self.assertEqual(message.priority, '46')
+        self.assertEqual(message.hostname, 'tohru')
+        self.assertEqual(message.application, 'rsyslogd')
+        self.assertEqual(message.process_id, '6611')
+        self.assertEqual(message.message_id, '12512')
+        self.assertEqual(message.message, 'start')
+        self.assertEqual(len(message.structured_data), 2)
+        self.assertEqual(message.structured_data[0].name, 'origin')
+        self.assertEqual(message.structured_data[0]['x-info'],
+                         'http://www.rsyslog.com')
+
+    def test_parsing_partial_message(self):
+        message = self.scanner.parse(PARTIAL_MESSAGE)
+
+        self.assertEqual(message.application, '-')
+        self.assertEqual(message.process_id, '-')
+        self.assertEqual(message.message_id, '-')
+        self.assertEqual(message.message, 'start')
+        self.assertEqual(len(message.structured_data), 0)
+
+    def test_same_messages_as_regex_parser(self):
+        for data in MESSAGES:
+            self.assertEqual(_fields(self.scanner.parse(data)),
+                             _fields(self.parser.parse(data)), data)
+
+    def test_messages_are_parsed_where_they_lie(self):
+        #what follows a message in the buffer must not change how it parses
+        for data in MESSAGES + INVALID_MESSAGES:
+            for following in ['', '\n', ' ', '0', '-', 'Z', '"]', '\0']:
+                buffer = '<13>' + data + following
+                outcomes = list()
+                for start, end in ((0, None), (4, 4 + len(data))):
+                    try:
+                        outcomes.append(_fields(self.scanner.parse(
+                            data if end is None else buffer, start, end)))
+                    except ParserError as ex:
+                        outcomes.append(type(ex))
+                self.assertEqual(outcomes[0], outcomes[1], repr(buffer))
+                if data in MESSAGES:
+                    self.assertEqual(
+                        _fields(self.parser.parse(buffer, 4, 4 + len(data))),
+                        outcomes[0], repr(buffer))
+
+    def test_structured_data_at_end_of_message(self):
+        message = self.scanner.parse(
+            '<13>1 2012-12-11T15:48:23.2Z host app 1 2 [id ab="1"]')
+
+        self.assertEqual(message.message, '')
+        self.assertEqual(dict(message.structured_data[0]), {'ab': '1'})
+
+    def test_empty_param_value(self):
+        message = self.scanner.parse(
+            '<13>1 2012-12-11T15:48:23.2Z host app 1 2 [id ab=""] text')
+
+        self.assertEqual(dict(message.structured_data[0]), {'ab': ''})
+
+    def test_invalid_messages_raise_parser_error(self):
+        for data in INVALID_MESSAGES:
+            with self.assertRaises(ParserError):
+                self.scanner.parse(data)
+
+
+class WhenTestingLazySyslogMessage(unittest.TestCase):
+
+    def setUp(self):
+        self.scanner = RFC5424MessageScanner()
+
+    def test_same_fields_as_eager_parse(self):
+        for data in MESSAGES:
+            self.assertEqual(_fields(self.scanner.parse_lazy(data)),
+                             _fields(self.scanner.parse(data)), data)
+
+    def test_tail_is_parsed_on_first_access(self):
+        self.scanner._parse_tail = MagicMock(
+            wraps=self.scanner._parse_tail)
+        message = self.scanner.parse_lazy(HAPPY_PATH_MESSAGE)
+
+        self.assertEqual(message.hostname, 'tohru')
+        self.assertFalse(self.scanner._parse_tail.called)
+
+        self.assertEqual(message.message, 'start')
+        self.assertEqual(len(message.structured_data), 2)
+        self.scanner._parse_tail.assert_called_once_with(
+            HAPPY_PATH_MESSAGE[HAPPY_PATH_MESSAGE.index('['):])
+
+    def test_invalid_fields_raise_parser_error_on_access(self):
+        message = self.scanner.parse_lazy(
+            '<13>1 2012-12-11 host app 1 2 [id ab=1] start')
+
+        self.assertEqual(message.hostname, 'host')
+        with self.assertRaises(ParserError):
+            message.timestamp
+        with self.assertRaises(ParserError):
+            message.structured_data
+
+    def test_invalid_header_raises_parser_error(self):
+        for data in ('', 'not syslog', '<13>1 - host[1] app 1 2 - start',
+                     '<13>1 - host app 1 2'):
+            with self.assertRaises(ParserError):
+                self.scanner.parse_lazy(data)
+
+    def test_assigned_fields_are_kept(self):
+        message = self.scanner.parse_lazy(HAPPY_PATH_MESSAGE)
+        message.hostname = 'uki'
+        message.message = 'stop'
+
+        self.assertEqual(message.hostname, 'uki')
+        self.assertEqual(message.message, 'stop')
+        self.assertEqual(len(message.structured_data), 2)
+
+    def test_as_dict(self):
+        message_dict = self.scanner.parse_lazy(HAPPY_PATH_MESSAGE).as_dict()
+
+        self.assertEqual(message_dict['priority'], '46')
+        self.assertEqual(message_dict['version'], '1')
+        self.assertEqual(message_dict['timestamp'],
+                         '2012-12-11T15:48:23.217459-06:00')
+        self.assertEqual(message_dict['hostname'], 'tohru')
+        self.assertEqual(message_dict['appname'], 'rsyslogd')
+        self.assertEqual(message_dict['processid'], '6611')
+        self.assertEqual(message_dict['messageid'], '12512')
+        self.assertEqual(message_dict['sd']['origin']['x-pid'], '12297')
+        self.assertEqual(message_dict['message'], 'start')
+
+    def test_as_dict_matches_the_eager_form_but_for_the_timestamp(self):
+        for data in MESSAGES:
+            lazy = self.scanner.parse_lazy(data).as_dict()
+            eager = self.scanner.parse(data).as_dict()
+            del lazy['timestamp'], eager['timestamp']
+            self.assertEqual(lazy, eager, data)
+
+    def test_as_dict_without_timestamp_gives_the_time_received(self):
+        timestamp = self.scanner.parse_lazy(PARTIAL_MESSAGE).as_dict()[
+            'timestamp']
+
+        self.assertNotEqual(timestamp, '-')
+        self.assertTrue(timestamp.endswith('+00:00'))
+
+    def test_as_dict_checks_the_timestamp(self):
+        for timestamp in ('2003-13-11T22:14:15.003Z', '2003-10-11',
+                          '2003-10-11T22:14:15.003+99:00'):
+            message = self.scanner.parse_lazy(
+                '<34>1 {0} host app 1 ID - hi'.format(timestamp))
+            with self.assertRaises(ParserError):
+                message.as_dict()
+
+    def test_as_dict_keeps_assigned_fields(self):
+        message = self.scanner.parse_lazy(HAPPY_PATH_MESSAGE)
+        message.hostname = 'uki'
+
+        message_dict = message.as_dict()
+
+        self.assertEqual(message_dict['hostname'], 'uki')
+        self.assertEqual(message_dict['timestamp'],
+                         '2012-12-11T15:48:23.217459-06:00')
+        self.assertEqual(message_dict['message'], 'start')
+
+
+class WhenTestingDeferredStructuredData(unittest.TestCase):
+
+    def setUp(self):
+        self.scanner = RFC5424MessageScanner(defer_structured_data=True)
+        self.data = ('<13>1 2012-12-11T15:48:23.2Z host app 1 2 '
+                     '[origin ip="10.0.0.1"] [meta xx="]" yy="2"] '
+                     '[origin ip="10.0.0.2"] text')
+
+    def test_same_fields_as_eager_parse(self):
+        eager_scanner = RFC5424MessageScanner(defer_structured_data=False)
+        for data in MESSAGES + [self.data]:
+            self.assertEqual(_fields(self.scanner.parse(data)),
+                             _fields(eager_scanner.parse(data)), data)
+
+    def test_structured_data_is_deferred(self):
+        structured_data = self.scanner.parse(self.data).structured_data
+
+        self.assertIsInstance(structured_data, DeferredStructuredData)
+        self.assertEqual(structured_data.raw,
+                         '[origin ip="10.0.0.1"] [meta xx="]" yy="2"] '
+                         '[origin ip="10.0.0.2"]')
+        self.assertEqual(structured_data._parsed, [None, None, None])
+
+    def test_get_parses_only_the_asked_for_sd_id(self):
+        structured_data = self.scanner.parse(self.data).structured_data
+
+        origins = structured_data.get('origin')
+
+        self.assertEqual([dict(origin) for origin in origins],
+                         [{'ip': '10.0.0.1'}, {'ip': '10.0.0.2'}])
+        self.assertIsNone(structured_data._parsed[1])
+        self.assertEqual(structured_data.get('unknown'), [])
+
+    def test_sequence_interface(self):
+        structured_data = self.scanner.parse(self.data).structured_data
+
+        self.assertEqual(len(structured_data), 3)
+        self.assertEqual(dict(structured_data[1]), {'xx': ']', 'yy': '2'})
+        self.assertEqual(structured_data[-1].name, 'origin')
+        self.assertEqual([sd.name for sd in structured_data[:2]],
+                         ['origin', 'meta'])
+        with self.assertRaises(IndexError):
+            structured_data[3]
+
+    def test_append(self):
+        structured_data = self.scanner.parse(self.data).structured_data
+        added = StructuredData('added')
+
+        structured_data.append(added)
+
+        self.assertIs(structured_data[3], added)
+        self.assertEqual(structured_data.get('added'), [added])
+        self.assertTrue(structured_data.raw.endswith('[origin ip="10.0.0.2"]'))
+
+    def test_invalid_elements_raise_parser_error(self):
+        with self.assertRaises(ParserError):
+            self.scanner.parse(
+                '<13>1 - host app 1 2 [id ab=1] [ok ab="1"] start')
+
+    def test_elements_end_where_they_do_when_parsed_eagerly(self):
+        eager_scanner = RFC5424MessageScanner(defer_structured_data=False)
+        for tail in TRICKY_STRUCTURED_DATA:
+            data = '<13>1 2012-12-11T15:48:23.2Z host app 1 2 ' + tail
+            outcomes = list()
+            for scanner in (self.scanner, eager_scanner):
+                try:
+                    outcomes.append(_fields(scanner.parse(data)))
+                except ParserError as ex:
+                    outcomes.append(type(ex))
+            self.assertEqual(outcomes[0], outcomes[1], data)
+
+    def test_unterminated_element_raises_parser_error(self):
+        with self.assertRaises(ParserError):
+            self.scanner.parse('<13>1 - host app 1 2 [id ab="]"')
+
+    def test_no_structured_data(self):
+        structured_data = self.scanner.parse(PARTIAL_MESSAGE).structured_data
+
+        self.assertEqual(len(structured_data), 0)
+        self.assertEqual(structured_data, [])
+        self.assertEqual(structured_data.raw, '')
+
+    def test_lazy_messages_defer_structured_data(self):
+        message = self.scanner.parse_lazy(self.data)
+
+        self.assertIsInstance(message.structured_data, DeferredStructuredData)
+        routed = parse_structured_data(message.as_dict()['sd'])
+        self.assertEqual(routed['meta'], {'xx': ']', 'yy': '2'})
+
+    def test_unread_structured_data_is_routed_as_text(self):
+        for message in (self.scanner.parse(self.data),
+                        self.scanner.parse_lazy(self.data)):
+            structured_data = message.structured_data
+
+            self.assertEqual(message.as_dict()['sd'], structured_data.raw)
+            self.assertEqual(structured_data._parsed, [None, None, None])
+
+    def test_read_structured_data_is_routed_as_dict(self):
+        eager_scanner = RFC5424MessageScanner(defer_structured_data=False)
+        expected = eager_scanner.parse(self.data).as_dict()['sd']
+
+        message = self.scanner.parse(self.data)
+        message.structured_data.get('meta')
+        self.assertEqual(message.as_dict()['sd'], expected)
+
+        message = self.scanner.parse(PARTIAL_MESSAGE)
+        self.assertEqual(message.as_dict()['sd'], {})
+
+    def test_parse_structured_data(self):
+        eager_scanner = RFC5424MessageScanner(defer_structured_data=False)
+        for data in MESSAGES + [self.data]:
+            structured_data = self.scanner.parse(data).structured_data
+            self.assertEqual(parse_structured_data(structured_data.raw),
+                             eager_scanner.parse(data).as_dict()['sd'], data)
+
+        with self.assertRaises(ParserError):
+            parse_structured_data('[id ab="1"] text')
+
+
+class WhenTestingGetParser(unittest.TestCase):
+
+    def test_get_parser(self):
+        self.assertIsInstance(get_parser(PARSER_REGEX), RFC5424MessageParser)
+        self.assertIsInstance(get_parser(PARSER_SCANNER),
+                              RFC5424MessageScanner)
+
+    def test_get_parser_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            get_parser('yacc')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,6 @@
 from datetime import datetime
+from datetime import timedelta
+import pickle
 import unittest
 
 from meniscus.api.normalization.drivers.rfc5424 import *
@@ -8,6 +10,8 @@ def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(FromTextToStructuredData))
     suite.addTest(unittest.makeSuite(FromTextToSyslogMessage))
+    suite.addTest(unittest.makeSuite(FromFramedBufferToSyslogMessages))
+    suite.addTest(unittest.makeSuite(WhenTestingTimestampBuilder))
 
     return suite
 
@@ -57,6 +61,20 @@ class FromTextToStructuredData(unittest.TestCase):
 
 class FromTextToSyslogMessage(unittest.TestCase):
 
+    def test_malformed_structured_data_raises_parser_error(self):
+        parser = RFC5424MessageParser()
+        for tail in ('[ex@1host', '[a', '[a b', '[ab="x"]', '[a b="x"]]'):
+            with self.assertRaises(ParserError):
+                parser.parse('<34>1 2003-10-11T22:14:15.003Z host app 1 '
+                             'ID47 ' + tail)
+
+    def test_element_ending_the_message(self):
+        message = RFC5424MessageParser().parse(
+            '<34>1 2003-10-11T22:14:15.003Z host app 1 ID47 [a]')
+
+        self.assertEqual(message.structured_data[0].name, 'a')
+        self.assertEqual(message.message, '')
+
     def test_parsing_full_message(self):
         parser = RFC5424MessageParser()
 
@@ -70,7 +88,8 @@ class FromTextToSyslogMessage(unittest.TestCase):
         self.assertEqual(message.application, 'rsyslogd')
         self.assertEqual(message.process_id, '6611')
         self.assertEqual(message.timestamp,
-                         datetime(2012, 12, 11, 9, 42, 23, 217459))
+                         datetime(2012, 12, 11, 21, 48, 23, 217459, UTC))
+        self.assertEqual(message.timestamp.utcoffset(), timedelta(hours=-6))
         self.assertEqual(message.message_id, '12512')
         self.assertEqual(message.message, 'start')
 
@@ -90,8 +109,217 @@ class FromTextToSyslogMessage(unittest.TestCase):
         self.assertEqual(message.process_id, '-')
         self.assertEqual(message.message_id, '-')
         self.assertEqual(message.message, 'start')
+        self.assertEqual(message.timestamp.tzinfo, UTC)
 
         self.assertEqual(len(message.structured_data), 0)
 
+    def test_messages_are_slotted(self):
+        message = RFC5424MessageParser().parse(HAPPY_PATH_MESSAGE)
+
+        self.assertFalse(hasattr(message, '__dict__'))
+        self.assertFalse(hasattr(message.structured_data[0], '__dict__'))
+
+    def test_messages_can_be_pickled(self):
+        message = RFC5424MessageParser().parse(HAPPY_PATH_MESSAGE)
+
+        copy = pickle.loads(pickle.dumps(message, pickle.HIGHEST_PROTOCOL))
+
+        self.assertEqual(copy.hostname, message.hostname)
+        self.assertEqual(copy.timestamp, message.timestamp)
+        self.assertEqual(copy.structured_data[0].name, 'origin')
+        self.assertEqual(copy.structured_data[0], message.structured_data[0])
+
+    def test_as_dict(self):
+        message = RFC5424MessageParser().parse(HAPPY_PATH_MESSAGE)
+
+        outbound = message.as_dict()
+
+        self.assertEqual(outbound['timestamp'],
+                         '2012-12-11T15:48:23.217459-06:00')
+        self.assertEqual(outbound['appname'], 'rsyslogd')
+        self.assertEqual(outbound['processid'], '6611')
+        self.assertEqual(outbound['messageid'], '12512')
+        self.assertEqual(outbound['sd']['origin']['x-pid'], '12297')
+        self.assertEqual(outbound['message'], 'start')
+
+
+def _octet_counted(message):
+    return '{0} {1}'.format(len(message), message)
+
+
+class FromFramedBufferToSyslogMessages(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = RFC5424MessageParser()
+
+    def test_parsing_newline_delimited_frames(self):
+        buffer = '\n'.join([HAPPY_PATH_MESSAGE, PARTIAL_MESSAGE, ''])
+
+        messages, errors, remainder = parse_many(buffer, self.parser)
+
+        self.assertEqual([message.hostname for message in messages],
+                         ['tohru', '-'])
+        self.assertEqual(errors, [])
+        self.assertEqual(remainder, len(buffer))
+
+    def test_parsing_octet_counted_frames(self):
+        #octet counted frames may hold newlines
+        multiline = PARTIAL_MESSAGE + '\nsecond line'
+        buffer = _octet_counted(HAPPY_PATH_MESSAGE) + _octet_counted(multiline)
+
+        messages, errors, remainder = parse_many(buffer, self.parser)
+
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(len(messages[0].structured_data), 2)
+        self.assertEqual(messages[1].message, 'start')
+        self.assertEqual(errors, [])
+        self.assertEqual(remainder, len(buffer))
+
+    def test_mixed_framing(self):
+        buffer = (_octet_counted(PARTIAL_MESSAGE) + '\n' +
+                  PARTIAL_MESSAGE + '\r\n' + _octet_counted(PARTIAL_MESSAGE))
+
+        messages, errors, remainder = parse_many(buffer, self.parser)
+
+        self.assertEqual(len(messages), 3)
+        self.assertEqual(errors, [])
+
+    def test_unfinished_frames_are_left_in_the_buffer(self):
+        for unfinished in (PARTIAL_MESSAGE,
+                           _octet_counted(PARTIAL_MESSAGE)[:-1],
+                           '23'):
+            buffer = PARTIAL_MESSAGE + '\n' + unfinished
+
+            messages, errors, remainder = parse_many(buffer, self.parser)
+
+            self.assertEqual(len(messages), 1)
+            self.assertEqual(errors, [])
+            self.assertEqual(buffer[remainder:], unfinished)
+
+    def test_final_buffer_parses_last_frame(self):
+        buffer = PARTIAL_MESSAGE + '\n' + PARTIAL_MESSAGE
+
+        messages, errors, remainder = parse_many(
+            buffer, self.parser, final=True)
+
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(remainder, len(buffer))
+
+    def test_final_buffer_reports_truncated_frame(self):
+        buffer = _octet_counted(PARTIAL_MESSAGE)[:-1]
+
+        messages, errors, remainder = parse_many(
+            buffer, self.parser, final=True)
+
+        self.assertEqual(messages, [])
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(remainder, len(buffer))
+
+    def test_bad_frames_are_reported_and_skipped(self):
+        buffer = '\n'.join(['not syslog', '12x bad count',
+                            '1234567890123 too long', PARTIAL_MESSAGE, ''])
+
+        messages, errors, remainder = parse_many(buffer, self.parser)
+
+        self.assertEqual(len(messages), 1)
+        self.assertEqual([offset for offset, error in errors],
+                         [0, 11, 25])
+        for offset, error in errors:
+            self.assertIsInstance(error, ParserError)
+        self.assertEqual(remainder, len(buffer))
+
+    def test_default_parser(self):
+        messages, errors, remainder = parse_many(PARTIAL_MESSAGE + '\n')
+
+        self.assertEqual(messages[0].message, 'start')
+
+
+class WhenTestingTimestampBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.builder = TimestampBuilder()
+
+    def test_offsets_are_applied(self):
+        for fields, expected in (
+                (('-', '06', '00'), datetime(2012, 12, 11, 21, 48, 23)),
+                (('+', '05', '30'), datetime(2012, 12, 11, 10, 18, 23)),
+                ((None, None, None), datetime(2012, 12, 11, 15, 48, 23))):
+            timestamp = self.builder.build(
+                '2012', '12', '11', '15', '48', '23', '.0', *fields)
+
+            self.assertEqual(timestamp, expected.replace(tzinfo=UTC))
+
+    def test_fractional_seconds(self):
+        for fraction, microseconds in (('.2', 200000), ('.217459', 217459),
+                                       ('.21745987', 217459), ('.000001', 1)):
+            timestamp = self.builder.build(
+                '2012', '12', '11', '15', '48', '23', fraction)
+
+            self.assertEqual(timestamp.microsecond, microseconds)
+
+    def test_seconds_and_timezones_are_cached(self):
+        first = self.builder.build(
+            '2012', '12', '11', '15', '48', '23', '.1', '-', '06', '00')
+        second = self.builder.build(
+            '2012', '12', '11', '15', '48', '23', '.2', '-', '06', '00')
+        third = self.builder.build(
+            '2012', '12', '11', '15', '48', '24', '.2', '-', '06', '00')
+
+        self.assertEqual(len(self.builder.seconds), 2)
+        self.assertEqual(len(self.builder.timezones), 1)
+        self.assertIs(first.tzinfo, third.tzinfo)
+        self.assertEqual(second - first, timedelta(microseconds=100000))
+
+    def test_caches_are_cleared_when_full(self):
+        builder = TimestampBuilder(cache_size=2)
+        for second in ('01', '02', '03'):
+            builder.build('2012', '12', '11', '15', '48', second, '.1')
+
+        self.assertEqual(len(builder.seconds), 1)
+
+    def test_epoch_microseconds(self):
+        builder = TimestampBuilder(epoch=True)
+
+        self.assertEqual(builder.build('1970', '01', '01', '01', '00', '01',
+                                       '.5', '+', '01', '00'), 1500000)
+        self.assertEqual(builder.build('2012', '12', '11', '21', '48', '23',
+                                       '.217459'), 1355262503217459)
+        self.assertIsInstance(builder.now(), (int, long))
+
+    def test_out_of_range_fields_raise_parser_error(self):
+        for fields in (('2003', '13', '11', '22', '14', '15'),
+                       ('2003', '02', '30', '22', '14', '15'),
+                       ('2003', '10', '11', '24', '14', '15'),
+                       ('2003', '10', '11', '22', '60', '15'),
+                       ('2003', '10', '11', '22', '14', '61')):
+            with self.assertRaises(ParserError):
+                self.builder.build(*(fields + ('.0',)))
+
+        for offset in (('+', '99', '00'), ('-', '24', '00'),
+                       ('+', '05', '60')):
+            with self.assertRaises(ParserError):
+                self.builder.build('2003', '10', '11', '22', '14', '15',
+                                   '.0', *offset)
+        self.assertEqual(self.builder.seconds, dict())
+
+    def test_parsers_raise_parser_error_on_bad_timestamps(self):
+        for engine in (PARSER_REGEX, PARSER_SCANNER):
+            parser = get_parser(engine)
+            for timestamp in ('2003-13-11T22:14:15.003Z',
+                              '2003-10-11T22:14:15.003+99:00'):
+                with self.assertRaises(ParserError):
+                    parser.parse('<34>1 {0} host app 1 ID - hi'.format(
+                        timestamp))
+
+    def test_now_is_offset_aware(self):
+        self.assertEqual(self.builder.now().tzinfo, UTC)
+
+    def test_timezone_offset(self):
+        timezone = self.builder.timezone('-', '06', '30')
+
+        self.assertEqual(timezone.utcoffset(None), timedelta(minutes=-390))
+        self.assertEqual(timezone.tzname(None), '-06:30')
+        self.assertEqual(timezone.dst(None), timedelta(0))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,210 @@
+import unittest
+
+from mock import MagicMock, patch
+
+from meniscus.api.normalization.drivers.rfc3164 import SyslogSniffer
+from meniscus.api.normalization.drivers.rfc5424 import get_parser
+from meniscus.api.normalization.normalization_process import \
+    normalize_message
+from meniscus.api.normalization.normalization_process import \
+    NormalizationPool
+from meniscus.api.normalization.patterns import PatternEngine
+from meniscus.personas.common.routing import RoutingException
+
+SYSLOG_LINE = ('<46>1 2012-12-11T15:48:23.217459-06:00 tohru rsyslogd 6611 '
+               '12512 [origin software="rsyslogd" x-pid="12297"] start')
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(WhenTestingNormalizeMessage))
+    suite.addTest(unittest.makeSuite(WhenTestingNormalizationPool))
+    return suite
+
+
+class WhenTestingNormalizeMessage(unittest.TestCase):
+    def setUp(self):
+        self.parser = get_parser()
+
+    def test_syslog_line_is_parsed_into_cee_fields(self):
+        message = {'msg': SYSLOG_LINE, 'native': {'source': 'agent'}}
+
+        self.assertTrue(normalize_message(message, self.parser))
+        self.assertEqual(message['host'], 'tohru')
+        self.assertEqual(message['pname'], 'rsyslogd')
+        self.assertEqual(message['pid'], '6611')
+        self.assertEqual(message['time'], '2012-12-11T15:48:23.217459-06:00')
+        self.assertEqual(message['msg'], 'start')
+        self.assertEqual(message['native'],
+                         {'source': 'agent',
+                          'origin': {'software': 'rsyslogd',
+                                     'x-pid': '12297'}})
+
+    def test_rfc3164_line_is_parsed_into_cee_fields(self):
+        message = {'msg': '<38>Oct 11 22:14:15 tohru sshd[4122]: Accepted'}
+
+        self.assertTrue(normalize_message(message, SyslogSniffer()))
+        self.assertEqual(message['host'], 'tohru')
+        self.assertEqual(message['pname'], 'sshd')
+        self.assertEqual(message['pid'], '4122')
+        self.assertTrue(message['time'].endswith('-10-11T22:14:15+00:00'))
+        self.assertEqual(message['msg'], 'Accepted')
+
+    def test_correlated_fields_are_kept(self):
+        message = {'host': 'ws-n01', 'pname': 'apache', 'msg': SYSLOG_LINE}
+
+        normalize_message(message, self.parser)
+
+        self.assertEqual(message['host'], 'ws-n01')
+        self.assertEqual(message['pname'], 'apache')
+
+    def test_syslog_persona_fields_are_mapped(self):
+        message = {'hostname': 'tohru', 'appname': 'dhcpcd',
+                   'processid': '3071', 'messageid': '-',
+                   'timestamp': '2013-04-05T15:51:18.607457-05:00',
+                   'message': 'wlan0: leased', 'sd': {}}
+
+        self.assertTrue(normalize_message(message, self.parser))
+        self.assertEqual(message['host'], 'tohru')
+        self.assertEqual(message['pname'], 'dhcpcd')
+        self.assertEqual(message['pid'], '3071')
+        self.assertEqual(message['time'], '2013-04-05T15:51:18.607457-05:00')
+        self.assertEqual(message['msg'], 'wlan0: leased')
+
+    def test_structured_data_routed_as_text_is_parsed(self):
+        message = {'hostname': 'tohru', 'message': 'wlan0: leased',
+                   'sd': '[origin ip="10.0.0.1"] [meta yy="2"]'}
+
+        self.assertTrue(normalize_message(message, self.parser))
+        self.assertEqual(message['native'], {'origin': {'ip': '10.0.0.1'},
+                                             'meta': {'yy': '2'}})
+
+    def test_other_messages_are_left_alone(self):
+        for message in ({'msg': 'plain text'}, {'msg': '<not syslog'}, {}):
+            original = dict(message)
+            self.assertFalse(normalize_message(message, self.parser))
+            self.assertEqual(message, original)
+
+
+class WhenTestingNormalizationPool(unittest.TestCase):
+    def setUp(self):
+        self.router = MagicMock()
+        self.pool = NormalizationPool(processes=2, batch_size=3,
+                                      router_factory=lambda: self.router)
+        self.pool._queue = MagicMock()
+        self.pool._schedule_flush = MagicMock()
+
+    def test_processes_default_to_cpu_core_count(self):
+        with patch('meniscus.api.normalization.normalization_process.'
+                   'sys_assist.get_cpu_core_count', return_value='4'):
+            pool = NormalizationPool(processes=0)
+        self.assertEqual(pool.processes, 4)
+        self.assertEqual(len(pool.worker_stats), 4)
+
+    def test_put_hands_over_full_batches(self):
+        self.pool.put_many([{'msg': 1}, {'msg': 2}])
+        self.assertFalse(self.pool._queue.put.called)
+        self.pool._schedule_flush.assert_called_with()
+
+        self.pool.put({'msg': 3})
+        self.pool._queue.put.assert_called_once_with(
+            [{'msg': 1}, {'msg': 2}, {'msg': 3}])
+
+    def test_flush_hands_over_partial_batch(self):
+        self.pool.put({'msg': 1})
+        self.pool.flush()
+        self.pool.flush()
+        self.pool._queue.put.assert_called_once_with([{'msg': 1}])
+
+    def test_process_batch_routes_and_counts(self):
+        self.router.route_message.side_effect = [None, RoutingException()]
+        correlation = {'tenant_id': '1234', 'ep_id': 3,
+                       'pattern': 'user %user:word%'}
+        batch = [{'msg': SYSLOG_LINE},
+                 {'msg': 'user bob', 'meniscus': {'correlation': correlation}}]
+
+        self.pool.process_batch(1, batch, get_parser(), PatternEngine(),
+                                self.router)
+
+        self.assertEqual(self.router.route_message.call_count, 2)
+        self.assertEqual(batch[1]['native'], {'user': 'bob'})
+        stats = self.pool.get_stats()['workers']['1']
+        self.assertEqual(stats['messages'], 2)
+        self.assertEqual(stats['normalized'], 1)
+        self.assertEqual(stats['pattern_matches'], 1)
+        self.assertEqual(stats['routing_failures'], 1)
+        self.assertEqual(self.pool.get_stats()['workers']['0']['messages'], 0)
+
+    def test_messages_failing_to_normalize_are_counted_and_routed(self):
+        engine = MagicMock()
+        engine.apply.side_effect = [ValueError(), False]
+        batch = [{'msg': 'one'}, 'not a message', {'msg': 'two'}]
+
+        with patch('meniscus.api.normalization.normalization_process._LOG'):
+            self.pool.process_batch(0, batch, get_parser(), engine,
+                                    self.router)
+
+        self.assertEqual(
+            [call[0][0] for call in self.router.route_message.call_args_list],
+            [{'msg': 'one'}, {'msg': 'two'}])
+        stats = self.pool.get_stats()['workers']['0']
+        self.assertEqual(stats['messages'], 3)
+        self.assertEqual(stats['errors'], 2)
+
+    def test_exited_workers_are_restarted(self):
+        alive = MagicMock()
+        alive.is_alive.return_value = True
+        exited = MagicMock()
+        exited.is_alive.return_value = False
+        self.pool._workers = [alive, exited]
+
+        with patch('meniscus.api.normalization.normalization_process.'
+                   'Process') as process, \
+                patch('meniscus.api.normalization.normalization_process.'
+                      '_LOG'):
+            self.pool.restart_exited()
+
+        self.assertEqual(process.call_count, 1)
+        self.assertTrue(process.return_value.start.called)
+        self.assertIs(self.pool._workers[0], alive)
+        self.assertIs(self.pool._workers[1], process.return_value)
+        self.assertEqual(self.pool.worker_stats[1].get('restarts'), 1)
+        self.assertEqual(self.pool.worker_stats[0].get('restarts'), 0)
+
+    def test_stop_ends_each_worker_and_supervision(self):
+        workers = [MagicMock(), MagicMock()]
+        self.pool._workers = list(workers)
+
+        self.pool.stop()
+
+        self.assertTrue(self.pool._stopping.is_set())
+        self.assertEqual(self.pool._queue.put.call_count, 2)
+        for worker in workers:
+            worker.join.assert_called_once_with()
+        self.assertEqual(self.pool._workers, [None, None])
+
+    def test_work_runs_until_stopped(self):
+        self.pool._queue.get.side_effect = [[{'msg': SYSLOG_LINE}], None]
+
+        self.pool._work(0)
+
+        self.assertEqual(self.router.route_message.call_count, 1)
+        self.router.flush.assert_called_once_with()
+        self.assertEqual(self.pool.get_stats()['messages'], 1)
+
+    def test_get_stats(self):
+        self.pool._queue.qsize.return_value = 5
+        self.pool.worker_stats[0].increment('messages', 10)
+        self.pool.worker_stats[0].increment('busy_seconds', 2)
+
+        stats = self.pool.get_stats()
+
+        self.assertEqual(stats['processes'], 2)
+        self.assertEqual(stats['depth'], 5)
+        self.assertEqual(stats['messages'], 10)
+        self.assertEqual(stats['workers']['0']['messages_per_second'], 5)
+        self.assertEqual(stats['workers']['1']['messages_per_second'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,266 @@
+import unittest
+
+from meniscus.api.normalization.patterns import compile_pattern
+from meniscus.api.normalization.patterns import get_producer_patterns
+from meniscus.api.normalization.patterns import LiteralMatcher
+from meniscus.api.normalization.patterns import PatternEngine
+from meniscus.api.normalization.patterns import PatternError
+from meniscus.api.normalization.patterns import ProducerPatterns
+from meniscus.data.model.tenant import EventProducer
+from meniscus.data.model.tenant import Tenant
+from meniscus.data.model.tenant import Token
+
+SSHD_PATTERN = ('sshd[%pid:number%]: Accepted %method:word% for %user:word% '
+                'from %ip:ipv4%')
+SSHD_LINE = 'sshd[4122]: Accepted publickey for bob from 10.0.4.21'
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(WhenTestingCompilePattern))
+    suite.addTest(unittest.makeSuite(WhenTestingPatternEngine))
+    suite.addTest(unittest.makeSuite(WhenTestingLiteralMatcher))
+    suite.addTest(unittest.makeSuite(WhenTestingProducerPatterns))
+    return suite
+
+
+class WhenTestingCompilePattern(unittest.TestCase):
+
+    def test_fields_are_matched(self):
+        pattern = compile_pattern(SSHD_PATTERN)
+
+        self.assertEqual(pattern.match(SSHD_LINE),
+                         {'pid': '4122', 'method': 'publickey',
+                          'user': 'bob', 'ip': '10.0.4.21'})
+
+    def test_the_whole_text_must_match(self):
+        pattern = compile_pattern(SSHD_PATTERN)
+
+        self.assertIsNone(pattern.match(SSHD_LINE + ' port 22'))
+        self.assertIsNone(pattern.match(SSHD_LINE.replace('4122', 'abc')))
+
+    def test_quoted_char_to_and_rest_fields(self):
+        pattern = compile_pattern(
+            'GET %uri:quoted% %user:char-to:,%,%note:rest%')
+
+        self.assertEqual(pattern.match('GET "/v1/a b" bob,rest of it'),
+                         {'uri': '/v1/a b', 'user': 'bob',
+                          'note': 'rest of it'})
+
+    def test_double_percent_is_a_literal(self):
+        pattern = compile_pattern('cpu %load:number%%% busy')
+
+        self.assertEqual(pattern.match('cpu 93% busy'), {'load': '93'})
+        self.assertEqual(pattern.required, '% busy')
+
+    def test_rulebase_names_are_not_compiled(self):
+        self.assertIsNone(compile_pattern('apache2.cee'))
+        self.assertIsNone(compile_pattern('100%% literal'))
+
+    def test_malformed_patterns_raise(self):
+        self.assertRaises(PatternError, compile_pattern, 'a %user:word')
+        self.assertRaises(PatternError, compile_pattern, 'a %user:float%')
+        self.assertRaises(PatternError, compile_pattern, 'a %1user:word%')
+        self.assertRaises(PatternError, compile_pattern,
+                          '%user:word% %user:word%')
+
+    def test_prefilter_checks_the_prefix_and_longest_literal(self):
+        pattern = compile_pattern(SSHD_PATTERN)
+
+        self.assertEqual(pattern.prefix, 'sshd[')
+        self.assertEqual(pattern.required, ']: Accepted ')
+        self.assertTrue(pattern.prefilter(SSHD_LINE))
+        self.assertFalse(pattern.prefilter('nginx: ' + SSHD_LINE))
+        self.assertFalse(pattern.prefilter('sshd[1]: Failed for bob'))
+
+
+class WhenTestingPatternEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = PatternEngine(cache_size=2)
+
+    def _message(self, text, pattern=SSHD_PATTERN, producer_id=1):
+        return {
+            'msg': text,
+            'meniscus': {
+                'correlation': {
+                    'tenant_id': '1234',
+                    'ep_id': producer_id,
+                    'pattern': pattern
+                }
+            }
+        }
+
+    def test_cee_fields_are_set_and_others_are_native(self):
+        message = self._message(SSHD_LINE)
+
+        self.assertTrue(self.engine.apply(message))
+        self.assertEqual(message['pid'], '4122')
+        self.assertEqual(message['native'],
+                         {'method': 'publickey', 'user': 'bob',
+                          'ip': '10.0.4.21'})
+
+    def test_messages_without_a_pattern_are_left_alone(self):
+        message = {'msg': SSHD_LINE}
+
+        self.assertFalse(self.engine.apply(message))
+        self.assertFalse(self.engine.apply(
+            self._message(SSHD_LINE, pattern='apache2.cee')))
+        self.assertEqual(message, {'msg': SSHD_LINE})
+
+    def test_patterns_are_compiled_once(self):
+        for attempt in range(3):
+            self.engine.apply(self._message(SSHD_LINE))
+
+        stats = self.engine.get_stats()
+        self.assertEqual(stats['compiled'], 1)
+        self.assertEqual(stats['matched'], 3)
+        self.assertEqual(stats['cached'], 1)
+
+    def test_changed_patterns_are_compiled_again(self):
+        first = self.engine.get_pattern('1234', 1, SSHD_PATTERN)
+        changed = self.engine.get_pattern('1234', 1, 'sshd %rest:rest%')
+
+        self.assertIsNot(first, changed)
+        self.assertEqual(self.engine.get_stats()['compiled'], 2)
+
+    def test_least_recently_used_patterns_are_evicted(self):
+        self.engine.get_pattern('1234', 1, SSHD_PATTERN)
+        self.engine.get_pattern('1234', 2, SSHD_PATTERN)
+        self.engine.get_pattern('1234', 1, SSHD_PATTERN)
+        self.engine.get_pattern('1234', 3, SSHD_PATTERN)
+        self.engine.get_pattern('1234', 1, SSHD_PATTERN)
+
+        self.assertEqual(self.engine.get_stats()['compiled'], 3)
+        self.assertEqual(self.engine.get_stats()['cached'], 2)
+
+    def test_invalid_patterns_are_cached_and_counted(self):
+        for attempt in range(2):
+            self.assertFalse(self.engine.apply(
+                self._message(SSHD_LINE, pattern='sshd %user:float%')))
+
+        self.assertEqual(self.engine.get_stats()['invalid'], 1)
+
+    def test_prefiltered_and_unmatched_messages_are_counted(self):
+        self.assertFalse(self.engine.apply(self._message('nginx: GET /')))
+        self.assertFalse(self.engine.apply(
+            self._message(SSHD_LINE.replace('10.0.4.21', 'example.com'))))
+
+        stats = self.engine.get_stats()
+        self.assertEqual(stats['prefiltered'], 1)
+        self.assertEqual(stats['unmatched'], 1)
+        self.assertEqual(stats['matched'], 0)
+
+
+class WhenTestingLiteralMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = LiteralMatcher()
+        for value, literal in enumerate(['he', 'she', 'his', 'hers']):
+            self.matcher.add(literal, value)
+
+    def test_overlapping_literals_are_found(self):
+        self.assertEqual(self.matcher.search('ushers'), set([0, 1, 3]))
+        self.assertEqual(self.matcher.search('ahis'), set([2]))
+        self.assertEqual(self.matcher.search('xyz'), set())
+
+    def test_empty_literals_are_always_found(self):
+        self.matcher.add('', 'any')
+
+        self.assertEqual(self.matcher.search('xyz'), set(['any']))
+
+    def test_literals_are_replaced_and_removed(self):
+        self.matcher.add('xy', 1)
+        self.matcher.discard(3)
+
+        self.assertEqual(self.matcher.search('ushers'), set([0]))
+        self.assertEqual(self.matcher.search('xyz'), set([1]))
+        self.assertEqual(len(self.matcher), 3)
+
+    def test_search_agrees_with_substring_checks(self):
+        literals = ['ab', 'bab', 'abc', 'c', 'bca', 'aab', 'cc']
+        matcher = LiteralMatcher()
+        for literal in literals:
+            matcher.add(literal, literal)
+
+        for text in ['abcabc', 'aabab', 'cbacca', 'bbbb', 'babcc']:
+            self.assertEqual(matcher.search(text),
+                             set(literal for literal in literals
+                                 if literal in text))
+
+
+class WhenTestingProducerPatterns(unittest.TestCase):
+
+    def setUp(self):
+        self.producers = [
+            EventProducer(1, 'sshd', SSHD_PATTERN),
+            EventProducer(2, 'cron', 'CRON[%pid:number%]: %rest:rest%'),
+            EventProducer(3, 'apache', 'apache2.cee'),
+            EventProducer(4, 'any', '%rest:rest%')
+        ]
+        self.tenant = Tenant('1234', Token(),
+                             event_producers=self.producers)
+
+    def test_candidates_are_narrowed_by_literals(self):
+        patterns = ProducerPatterns()
+        patterns.sync(self.producers)
+
+        self.assertEqual(patterns.candidates(SSHD_LINE), [1, 4])
+        self.assertEqual(patterns.candidates('CRON[1]: run'), [2, 4])
+
+    def test_first_matching_producer_is_returned(self):
+        patterns = ProducerPatterns()
+        patterns.sync(self.producers)
+
+        producer_id, fields = patterns.match(SSHD_LINE)
+        self.assertEqual(producer_id, 1)
+        self.assertEqual(fields['user'], 'bob')
+        self.assertEqual(patterns.match(SSHD_LINE, lambda p: p != 1),
+                         (4, {'rest': SSHD_LINE}))
+        self.assertIsNone(patterns.match(SSHD_LINE, lambda p: p == 2))
+
+    def test_sync_only_touches_changed_producers(self):
+        patterns = ProducerPatterns()
+        patterns.sync(self.producers)
+        sshd = patterns.patterns[1]
+
+        self.producers[1].pattern = 'CROND %rest:rest%'
+        del self.producers[3]
+        patterns.sync(self.producers)
+
+        self.assertIs(patterns.patterns[1], sshd)
+        self.assertEqual(patterns.candidates('CROND run'), [2])
+        self.assertNotIn(4, patterns.patterns)
+
+    def test_tenant_patterns_follow_producer_changes(self):
+        patterns = get_producer_patterns(self.tenant)
+        self.assertIs(get_producer_patterns(self.tenant), patterns)
+
+        self.tenant.add_event_producer(
+            EventProducer(5, 'nginx', 'nginx: %rest:rest%'))
+        self.assertEqual(
+            get_producer_patterns(self.tenant).candidates('nginx: GET /'),
+            [4, 5])
+
+        #a change that leaves the number of producers alone
+        self.tenant.update_event_producer(self.producers[4],
+                                          pattern='nginx %rest:rest%')
+        self.assertEqual(
+            get_producer_patterns(self.tenant).candidates('nginx GET /'),
+            [4, 5])
+
+        self.tenant.remove_event_producer(self.producers[3])
+        self.assertEqual(
+            get_producer_patterns(self.tenant).candidates('nginx GET /'),
+            [5])
+
+    def test_tenant_patterns_follow_a_reloaded_tenant(self):
+        get_producer_patterns(self.tenant)
+        reloaded = Tenant('1234', Token(), event_producers=[
+            EventProducer(1, 'sshd', 'sshd %rest:rest%')])
+
+        self.assertEqual(
+            get_producer_patterns(reloaded).candidates('sshd x'), [1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from mock import MagicMock
+
+import falcon
+
+from meniscus.api.stats.resources import StatsResource
+from meniscus.openstack.common import jsonutils
+
+
+def suite():
+
+    test_suite = unittest.TestSuite()
+    test_suite.addTest(WhenTestingStatsResource())
+
+    return test_suite
+
+
+class WhenTestingStatsResource(unittest.TestCase):
+
+    def setUp(self):
+        self.req = MagicMock()
+        self.resp = MagicMock()
+        self.send_queue = MagicMock()
+        self.send_queue.get_stats.return_value = {'depth': 5}
+        self.resource = StatsResource(send_queue=self.send_queue)
+
+    def test_should_return_200_on_get(self):
+        self.resource.on_get(self.req, self.resp)
+        self.assertEqual(falcon.HTTP_200, self.resp.status)
+
+    def test_should_return_stats_json(self):
+        self.resource.on_get(self.req, self.resp)
+
+        parsed_body = jsonutils.loads(self.resp.body)
+
+        self.assertEqual({'send_queue': {'depth': 5}}, parsed_body['stats'])
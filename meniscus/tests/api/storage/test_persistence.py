@@ -1,36 +1,149 @@
+import threading
 import unittest
 
 from mock import MagicMock, patch
+from pymongo.errors import AutoReconnect
 
-from meniscus.api.storage.persistence import persist_message
+from meniscus.api.storage.persistence import BulkWriter
+from meniscus.api.storage.persistence import is_durable
+from meniscus.api.storage.persistence import TieredWriter
+from meniscus.data.adapters.mongodb import MongoDatasourceHandler
+from meniscus.data.handler import DatabaseHandlerError
+from meniscus.data.handler import STATUS_CONNECTED
 
 
-class WhenTestingStoragePersistence(unittest.TestCase):
+class WhenTestingBulkWriter(unittest.TestCase):
     def setUp(self):
+        self.message = {"message": "wlan0: leased 10.6.173.172"}
+        self.sink = MagicMock()
+
+    def test_put_buffers_until_max_batch_size(self):
+        writer = BulkWriter(self.sink, max_batch_size=3)
+        writer._schedule_flush = MagicMock()
+        writer.put(self.message)
+        writer.put(self.message)
+        self.assertFalse(self.sink.put_many.called)
+        writer.put(self.message)
+        self.sink.put_many.assert_called_once_with(
+            'logs', [self.message, self.message, self.message],
+            ordered=False, durable=None)
+
+    def test_put_many_splits_into_batches(self):
+        writer = BulkWriter(self.sink, max_batch_size=2, ordered=True)
+        writer._schedule_flush = MagicMock()
+        writer.put_many([self.message] * 5)
+        self.assertEqual(self.sink.put_many.call_count, 2)
+        writer.flush()
+        self.sink.put_many.assert_called_with(
+            'logs', [self.message], ordered=True, durable=None)
+
+    def test_flush_does_nothing_when_empty(self):
+        writer = BulkWriter(self.sink)
+        writer.flush()
+        self.assertFalse(self.sink.put_many.called)
+
+    def test_flush_on_timer_writes_partial_batch(self):
+        written = threading.Event()
+        self.sink.put_many.side_effect = lambda *args, **kwargs: written.set()
+        writer = BulkWriter(self.sink, max_batch_size=10, max_linger=0.01)
+        writer.put(self.message)
+        self.assertTrue(written.wait(5))
+        self.sink.put_many.assert_called_once_with(
+            'logs', [self.message], ordered=False, durable=None)
+
+    def test_failed_batches_are_kept_and_written_again(self):
+        other = {"message": "wlan0: lost carrier"}
+        self.sink.put_many.side_effect = DatabaseHandlerError('down')
+        writer = BulkWriter(self.sink, max_batch_size=2)
+        writer._schedule_flush = MagicMock()
+        with patch('meniscus.api.storage.persistence._LOG') as log:
+            writer.put_many([self.message, self.message])
+            with self.assertRaises(DatabaseHandlerError):
+                writer.flush()
+            self.assertTrue(log.error.called)
+        self.assertTrue(writer._schedule_flush.called)
+
+        #writes are left to the timer while the datastore fails
+        writer.put(other)
+        self.assertEqual(self.sink.put_many.call_count, 2)
+
+        self.sink.put_many.side_effect = None
+        writer.flush()
+        self.sink.put_many.assert_called_with(
+            'logs', [other], ordered=False, durable=None)
+        self.assertEqual(
+            [call[0][1] for call in self.sink.put_many.call_args_list[2:]],
+            [[self.message, self.message], [other]])
+        self.assertEqual(writer.get_stats()['failed_writes'], 2)
+
+    def test_mongodb_errors_keep_the_batch(self):
+        sink = MongoDatasourceHandler(MagicMock())
+        sink.status = STATUS_CONNECTED
+        sink.database = MagicMock()
+        collection = sink.database['logs']
+        collection.insert.side_effect = AutoReconnect('connection lost')
+        writer = BulkWriter(sink, max_batch_size=2)
+        writer._schedule_flush = MagicMock()
+
+        with patch('meniscus.api.storage.persistence._LOG'):
+            writer.put_many([self.message, self.message])
+
+        self.assertEqual(writer._buffer, [self.message, self.message])
+        self.assertTrue(writer._failing)
+        self.assertEqual(writer.get_stats()['failed_writes'], 1)
+
+        collection.insert.side_effect = None
+        writer.flush()
+        self.assertEqual(writer._buffer, [])
+        self.assertFalse(writer._failing)
+
+    def test_messages_past_max_pending_are_dropped(self):
+        self.sink.put_many.side_effect = DatabaseHandlerError('down')
+        writer = BulkWriter(self.sink, max_batch_size=2, max_pending=3)
+        writer._schedule_flush = MagicMock()
+        with patch('meniscus.api.storage.persistence._LOG'):
+            writer.put_many([{'index': index} for index in range(5)])
+
+        self.assertEqual(writer._buffer,
+                         [{'index': index} for index in range(3)])
+        self.assertEqual(writer.get_stats()['dropped'], 2)
+
+    def test_flush_records_stats(self):
+        writer = BulkWriter(self.sink, max_batch_size=2)
+        writer.put_many([self.message] * 2)
+        stats = writer.get_stats()
+        self.assertEqual(stats['messages'], 2)
+        self.assertEqual(stats['batches'], 1)
+        self.assertTrue('messages_per_second' in stats)
+        self.assertTrue('average_write_seconds' in stats)
+
+
+class WhenTestingTieredWriter(unittest.TestCase):
+    def setUp(self):
+        self.durable_message = {
+            "message": "durable",
+            "meniscus": {"correlation": {"durable": True}}
+        }
         self.message = {
-            "processid": "3071",
-            "appname": "dhcpcd",
-            "timestamp": "2013-04-05T15:51:18.607457-05:00",
-            "hostname": "tohru",
-            "priority": "30",
-            "version": "1",
-            "messageid": "-",
-            "message": "wlan0: leased 10.6.173.172 for 3600 seconds\n",
-            "sd": {
-                "origin": {
-                    "software": "rsyslogd",
-                    "swVersion": "7.2.5",
-                    "x-pid": "24592",
-                    "x-info": "http://www.rsyslog.com"
-                }
-            }
+            "message": "not durable",
+            "meniscus": {"correlation": {"durable": False}}
         }
         self.sink = MagicMock()
-        self.sink.attach_mock(MagicMock(), 'put')
-        self.db_handler = MagicMock(return_value=self.sink)
-
-    def test_persist_message_calls_db_put(self):
-        with patch('meniscus.api.storage.persistence.db_handler',
-                   self.db_handler):
-            persist_message(self.message)
-            self.sink.put.assert_called_once_with('logs', self.message)
+
+    def test_is_durable(self):
+        self.assertTrue(is_durable(self.durable_message))
+        self.assertFalse(is_durable(self.message))
+        self.assertFalse(is_durable({"message": "syslog"}))
+
+    def test_messages_are_written_by_tier(self):
+        writer = TieredWriter(self.sink)
+        writer.put_many([self.durable_message, self.message])
+        writer.flush()
+        self.sink.put_many.assert_any_call(
+            'logs', [self.durable_message], ordered=False, durable=True)
+        self.sink.put_many.assert_any_call(
+            'logs', [self.message], ordered=False, durable=False)
+
+        stats = writer.get_stats()
+        self.assertEqual(stats['durable']['messages'], 1)
+        self.assertEqual(stats['standard']['messages'], 1)
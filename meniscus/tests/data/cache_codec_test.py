@@ -0,0 +1,75 @@
+import unittest
+
+from meniscus.data.cache_codec import BinaryCodec
+from meniscus.data.cache_codec import BINARY_VERSION
+from meniscus.data.cache_codec import CODEC_BINARY
+from meniscus.data.cache_codec import CODEC_JSON
+from meniscus.data.cache_codec import codec_for
+from meniscus.data.cache_codec import get_codec
+from meniscus.data.cache_codec import JsonCodec
+from meniscus.data.cache_codec import split_expiry
+from meniscus.data.cache_codec import with_expiry
+from meniscus.data.model.tenant import EventProducer
+from meniscus.data.model.tenant import Host
+from meniscus.data.model.tenant import HostProfile
+from meniscus.data.model.tenant import Tenant
+from meniscus.data.model.tenant import Token
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(WhenTestingCacheCodecs())
+    return suite
+
+
+class WhenTestingCacheCodecs(unittest.TestCase):
+    def setUp(self):
+        self.token = Token('89c38542-0c78-41f1-bcd2-5226189ccab9',
+                           '89c38542-0c78-41f1-bcd2-5226189ddab1',
+                           '2013-04-01T21:58:16.995031Z')
+        self.tenant = Tenant(
+            '1234', self.token,
+            [Host(1, 'ws-n01', '192.168.1.1', '::1', 2),
+             Host(2, 'ws-n02', None, None, None)],
+            [HostProfile(2, 'appservers', [3, 4])],
+            [EventProducer(3, 'apache', 'apache2.cee', True, False),
+             EventProducer(4, 'syslog', 'syslog.cee')])
+
+    def test_codecs_round_trip_tenants_and_tokens(self):
+        for codec in (JsonCodec(), BinaryCodec()):
+            tenant = codec.loads_tenant(codec.dumps_tenant(self.tenant))
+            self.assertEqual(tenant.format(), self.tenant.format())
+            token = codec.loads_token(codec.dumps_token(self.token))
+            self.assertEqual(token.format(), self.token.format())
+
+    def test_binary_entries_start_with_version_byte(self):
+        tenant_data = BinaryCodec().dumps_tenant(self.tenant)
+        self.assertTrue(tenant_data.startswith(BINARY_VERSION))
+
+    def test_binary_entries_are_smaller_than_json(self):
+        self.assertLess(len(BinaryCodec().dumps_tenant(self.tenant)),
+                        len(JsonCodec().dumps_tenant(self.tenant)))
+
+    def test_codec_for_detects_the_writing_codec(self):
+        self.assertIsInstance(
+            codec_for(BinaryCodec().dumps_token(self.token)), BinaryCodec)
+        self.assertIsInstance(
+            codec_for(JsonCodec().dumps_token(self.token)), JsonCodec)
+        self.assertIsNone(codec_for('\x7f'))
+
+    def test_expiry_round_trip(self):
+        token_data = BinaryCodec().dumps_token(self.token)
+
+        self.assertEqual(split_expiry(with_expiry(token_data, 1030.5)),
+                         (token_data, 1030.5))
+        self.assertEqual(split_expiry(token_data), (token_data, None))
+
+    def test_get_codec(self):
+        self.assertIsInstance(get_codec(CODEC_JSON), JsonCodec)
+        self.assertIsInstance(get_codec(CODEC_BINARY), BinaryCodec)
+        with self.assertRaises(ValueError):
+            get_codec('pickle')
+
+
+if __name__ == '__main__':
+    unittest.main()
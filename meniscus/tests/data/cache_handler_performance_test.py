@@ -0,0 +1,132 @@
+import time
+from multiprocessing import Lock
+from multiprocessing import Process
+from multiprocessing import Value
+
+from meniscus.data.cache_handler import *
+from meniscus.data.model.tenant import Tenant
+from meniscus.data.model.tenant import Token
+from meniscus.data.model.util import load_tenant_from_dict
+from meniscus.openstack.common import jsonutils
+
+PROCESSES = 12
+ITERATIONS = 20000
+TENANT_IDS = [str(tenant_id) for tenant_id in range(100)]
+
+
+class LockCountingCache(object):
+    """
+    Stands in for the uwsgi cache api. Every call takes a lock shared by all
+    of the processes, the way uwsgi locks its shared cache, and counts it.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.acquisitions = Value('i', 0, lock=False)
+        self.items = dict()
+
+    def _locked(self):
+        self.lock.acquire()
+        self.acquisitions.value += 1
+
+    def cache_exists(self, key, cache_name):
+        self._locked()
+        try:
+            return (cache_name, key) in self.items
+        finally:
+            self.lock.release()
+
+    def cache_get(self, key, cache_name):
+        self._locked()
+        try:
+            return self.items.get((cache_name, key))
+        finally:
+            self.lock.release()
+
+    def cache_set(self, key, value, cache_expires, cache_name):
+        self._locked()
+        try:
+            self.items.setdefault((cache_name, key), value)
+        finally:
+            self.lock.release()
+
+    def cache_update(self, key, value, cache_expires, cache_name):
+        self._locked()
+        try:
+            self.items[(cache_name, key)] = value
+        finally:
+            self.lock.release()
+
+
+class LegacyTenantCache(TenantCache):
+    """
+    The tenant cache as it was before lookups were reduced to a single get
+    or update on the shared cache.
+    """
+
+    def set_tenant(self, tenant):
+        if self.cache.cache_exists(tenant.tenant_id, CACHE_TENANT):
+            self.cache.cache_update(
+                tenant.tenant_id, jsonutils.dumps(tenant.format()),
+                DEFAULT_EXPIRES, CACHE_TENANT)
+        else:
+            self.cache.cache_set(
+                tenant.tenant_id, jsonutils.dumps(tenant.format()),
+                DEFAULT_EXPIRES, CACHE_TENANT)
+
+    def get_tenant(self, tenant_id):
+        if self.cache.cache_exists(tenant_id, CACHE_TENANT):
+            tenant_dict = jsonutils.loads(
+                self.cache.cache_get(tenant_id, CACHE_TENANT))
+            return load_tenant_from_dict(tenant_dict)
+        return None
+
+
+def worker(proxy, tenant_cache_class):
+    tenant_cache = tenant_cache_class()
+    tenant_cache.cache = proxy
+    tenant = Tenant(tenant_id=TENANT_IDS[0], token=Token())
+    for iteration in range(ITERATIONS):
+        tenant_id = TENANT_IDS[iteration % len(TENANT_IDS)]
+        if tenant_cache.get_tenant(tenant_id) is None:
+            tenant.tenant_id = tenant_id
+            tenant_cache.set_tenant(tenant)
+
+
+class PerformanceTest:
+    def _run(self, name, tenant_cache_class):
+        server = LockCountingCache()
+        proxy = NativeProxy()
+        proxy.server = server
+        proxy.UWSGI = True
+
+        start = time.time()
+        processes = [Process(target=worker, args=(proxy, tenant_cache_class))
+                     for process in range(PROCESSES)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        secondsTaken = time.time() - start
+
+        print (('{0}: {1} lookups in {2} processes. Lock acquisitions: {3}. '
+                'Time taken: {4} seconds.')
+               .format(name, ITERATIONS * PROCESSES, PROCESSES,
+                       server.acquisitions.value, secondsTaken))
+        return server.acquisitions.value
+
+    def test_performance(self):
+        #keep every lookup on the shared cache
+        TenantCache.local_cache = LocalCache(0)
+        legacy = self._run('exists then get/set', LegacyTenantCache)
+        single_op = self._run('single get/update', TenantCache)
+
+        print ('Lock acquisitions reduced by {0:.1%}'
+               .format(1 - float(single_op) / legacy))
+
+
+def main():
+    PerformanceTest().test_performance()
+
+if __name__ == '__main__':
+    main()
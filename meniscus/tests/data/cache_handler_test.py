@@ -3,15 +3,21 @@ import unittest
 from mock import MagicMock
 from mock import patch
 
+from meniscus.data.cache_codec import BinaryCodec
+from meniscus.data.cache_codec import with_expiry
 from meniscus.data.cache_handler import BroadcastCache
 from meniscus.data.cache_handler import Cache
 from meniscus.data.cache_handler import CACHE_BROADCAST
+from meniscus.data.cache_handler import CACHE_CODEC
 from meniscus.data.cache_handler import CACHE_CONFIG
+from meniscus.data.cache_handler import CACHE_SIZE_STATS
 from meniscus.data.cache_handler import CACHE_TENANT
 from meniscus.data.cache_handler import CACHE_TOKEN
 from meniscus.data.cache_handler import ConfigCache
+from meniscus.data.cache_handler import CacheSizeStats
 from meniscus.data.cache_handler import CONFIG_EXPIRES
 from meniscus.data.cache_handler import DEFAULT_EXPIRES
+from meniscus.data.cache_handler import LocalCache
 from meniscus.data.cache_handler import TenantCache
 from meniscus.data.cache_handler import TokenCache
 from meniscus.data.cache_handler import NativeProxy
@@ -36,13 +42,63 @@ class WhenTestingBaseCache(unittest.TestCase):
             cache.clear()
 
 
+class WhenTestingLocalCache(unittest.TestCase):
+    def setUp(self):
+        self.local_cache = LocalCache(max_size=2)
+
+    def test_get_returns_none_for_missing_key(self):
+        self.assertIsNone(self.local_cache.get('missing'))
+
+    def test_least_recently_used_item_is_evicted(self):
+        self.local_cache.set('a', 1, 0)
+        self.local_cache.set('b', 2, 0)
+        self.local_cache.get('a')
+        self.local_cache.set('c', 3, 0)
+        self.assertEqual(len(self.local_cache), 2)
+        self.assertEqual(self.local_cache.get('a'), 1)
+        self.assertIsNone(self.local_cache.get('b'))
+        self.assertEqual(self.local_cache.get('c'), 3)
+
+    def test_expired_item_is_not_returned(self):
+        with patch('meniscus.data.cache_handler.time.time',
+                   MagicMock(side_effect=[100, 200])):
+            self.local_cache.set('a', 1, 50)
+            self.assertIsNone(self.local_cache.get('a'))
+        self.assertEqual(len(self.local_cache), 0)
+
+    def test_size_zero_disables_cache(self):
+        local_cache = LocalCache(max_size=0)
+        local_cache.set('a', 1, 0)
+        self.assertIsNone(local_cache.get('a'))
+
+    def test_delete_and_clear(self):
+        self.local_cache.set('a', 1, 0)
+        self.local_cache.set('b', 2, 0)
+        self.local_cache.delete('a')
+        self.assertIsNone(self.local_cache.get('a'))
+        self.local_cache.clear()
+        self.assertEqual(len(self.local_cache), 0)
+
+
+class WhenTestingCacheSizeStats(unittest.TestCase):
+    def test_record_tracks_writes_and_sizes(self):
+        size_stats = CacheSizeStats('cache-a', 'cache-b')
+        size_stats.record('cache-a', 'x' * 10)
+        size_stats.record('cache-a', 'x' * 30)
+
+        stats = size_stats.get_stats()
+        self.assertEqual(stats['cache-a']['writes'], 2)
+        self.assertEqual(stats['cache-a']['bytes'], 40)
+        self.assertEqual(stats['cache-a']['max_bytes'], 30)
+        self.assertEqual(stats['cache-a']['average_bytes'], 20)
+        self.assertEqual(stats['cache-b']['average_bytes'], 0)
+
+
 class WhenTestingConfigCache(unittest.TestCase):
     def setUp(self):
         self.cache_clear = MagicMock()
-        self.cache_true = MagicMock(return_value=True)
-        self.cache_false = MagicMock(return_value=False)
+        self.cache_none = MagicMock(return_value=None)
         self.cache_update = MagicMock()
-        self.cache_set = MagicMock()
         self.cache_del = MagicMock()
         self.config = WorkerConfiguration(
             personality='correlation',
@@ -87,9 +143,7 @@ class WhenTestingConfigCache(unittest.TestCase):
         self.cache_clear.assert_called_once_with(CACHE_CONFIG)
 
     def test_set_config_calls_cache_update(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_update', self.cache_update):
+        with patch.object(NativeProxy, 'cache_update', self.cache_update):
             config_cache = ConfigCache()
             config_cache.set_config(self.config)
 
@@ -97,21 +151,8 @@ class WhenTestingConfigCache(unittest.TestCase):
             'worker_configuration', jsonutils.dumps(self.config.format()),
             CONFIG_EXPIRES, CACHE_CONFIG)
 
-    def test_set_config_calls_cache_set(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false
-        ), patch.object(NativeProxy, 'cache_set', self.cache_set):
-            config_cache = ConfigCache()
-            config_cache.set_config(self.config)
-
-        self.cache_set.assert_called_once_with(
-            'worker_configuration', jsonutils.dumps(self.config.format()),
-            CONFIG_EXPIRES, CACHE_CONFIG)
-
     def test_get_config_calls_returns_config(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_get',  self.cache_get_config):
+        with patch.object(NativeProxy, 'cache_get', self.cache_get_config):
             config_cache = ConfigCache()
             config = config_cache.get_config()
 
@@ -120,38 +161,22 @@ class WhenTestingConfigCache(unittest.TestCase):
         self.assertIsInstance(config, WorkerConfiguration)
 
     def test_get_config_calls_returns_none(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false):
+        with patch.object(NativeProxy, 'cache_get', self.cache_none):
             config_cache = ConfigCache()
             config = config_cache.get_config()
 
         self.assertIs(config, None)
 
     def test_delete_config_calls_cache_del(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_del', self.cache_del):
+        with patch.object(NativeProxy, 'cache_del', self.cache_del):
             config_cache = ConfigCache()
             config_cache.delete_config()
 
         self.cache_del.assert_called_once_with(
             'worker_configuration', CACHE_CONFIG)
 
-    def test_delete_config_does_not_call_cache_del(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false
-        ), patch.object(NativeProxy, 'cache_del', self.cache_del):
-            config_cache = ConfigCache()
-            config_cache.delete_config()
-
-        with self.assertRaises(AssertionError):
-            self.cache_del.assert_called_once_with(
-                'worker_configuration', CACHE_CONFIG)
-
     def test_set_routes_calls_cache_update(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_update', self.cache_update):
+        with patch.object(NativeProxy, 'cache_update', self.cache_update):
             config_cache = ConfigCache()
             config_cache.set_routes(self.routes)
 
@@ -159,21 +184,8 @@ class WhenTestingConfigCache(unittest.TestCase):
             'routes', jsonutils.dumps(self.routes),
             CONFIG_EXPIRES, CACHE_CONFIG)
 
-    def test_set_routes_calls_cache_set(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false
-        ), patch.object(NativeProxy, 'cache_set', self.cache_set):
-            config_cache = ConfigCache()
-            config_cache.set_routes(self.routes)
-
-        self.cache_set.assert_called_once_with(
-            'routes', jsonutils.dumps(self.routes),
-            CONFIG_EXPIRES, CACHE_CONFIG)
-
     def test_get_routes_calls_returns_config(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_get',  self.cache_get_routes):
+        with patch.object(NativeProxy, 'cache_get', self.cache_get_routes):
             config_cache = ConfigCache()
             routes = config_cache.get_routes()
 
@@ -182,42 +194,26 @@ class WhenTestingConfigCache(unittest.TestCase):
         self.assertEqual(routes, self.routes)
 
     def test_get_routes_calls_returns_none(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false):
+        with patch.object(NativeProxy, 'cache_get', self.cache_none):
             config_cache = ConfigCache()
             routes = config_cache.get_routes()
 
         self.assertIs(routes, None)
 
     def test_delete_routes_calls_cache_del(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_del', self.cache_del):
+        with patch.object(NativeProxy, 'cache_del', self.cache_del):
             config_cache = ConfigCache()
             config_cache.delete_routes()
 
         self.cache_del.assert_called_once_with(
             'routes', CACHE_CONFIG)
 
-    def test_delete_routes_does_not_call_cache_del(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false
-        ), patch.object(NativeProxy, 'cache_del', self.cache_del):
-            config_cache = ConfigCache()
-            config_cache.delete_routes()
-
-        with self.assertRaises(AssertionError):
-            self.cache_del.assert_called_once_with(
-                'routes', CACHE_CONFIG)
-
 
 class WhenTestingTenantCache(unittest.TestCase):
     def setUp(self):
         self.cache_clear = MagicMock()
-        self.cache_true = MagicMock(return_value=True)
-        self.cache_false = MagicMock(return_value=False)
+        self.cache_none = MagicMock(return_value=None)
         self.cache_update = MagicMock()
-        self.cache_set = MagicMock()
         self.cache_del = MagicMock()
         self.tenant_id = '101'
         self.tenant = Tenant(
@@ -226,6 +222,8 @@ class WhenTestingTenantCache(unittest.TestCase):
         )
         self.tenant_json = jsonutils.dumps(self.tenant.format())
         self.cache_get_tenant = MagicMock(return_value=self.tenant_json)
+        TenantCache.local_cache.clear()
+        TokenCache.local_cache.clear()
 
     def test_clear_calls_cache_clear(self):
         with patch.object(NativeProxy, 'cache_clear', self.cache_clear):
@@ -234,31 +232,40 @@ class WhenTestingTenantCache(unittest.TestCase):
         self.cache_clear.assert_called_once_with(CACHE_TENANT)
 
     def test_set_tenant_calls_cache_update(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_update', self.cache_update):
+        with patch.object(NativeProxy, 'cache_update', self.cache_update), \
+                patch('meniscus.data.cache_handler.time.time',
+                      MagicMock(return_value=1000.0)):
             tenant_cache = TenantCache()
             tenant_cache.set_tenant(self.tenant)
 
         self.cache_update.assert_called_once_with(
-            self.tenant_id, jsonutils.dumps(self.tenant.format()),
+            self.tenant_id,
+            with_expiry(CACHE_CODEC.dumps_tenant(self.tenant),
+                        1000.0 + DEFAULT_EXPIRES),
             DEFAULT_EXPIRES, CACHE_TENANT)
 
-    def test_set_tenant_calls_cache_set(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false
-        ), patch.object(NativeProxy, 'cache_set', self.cache_set):
-            tenant_cache = TenantCache()
-            tenant_cache.set_tenant(self.tenant)
-
-        self.cache_set.assert_called_once_with(
-            self.tenant_id, jsonutils.dumps(self.tenant.format()),
-            DEFAULT_EXPIRES, CACHE_TENANT)
+    def test_local_copy_expires_with_the_shared_entry(self):
+        cache_get = MagicMock(return_value=with_expiry(
+            CACHE_CODEC.dumps_tenant(self.tenant), 1030.0))
+        with patch.object(NativeProxy, 'cache_get', cache_get), \
+                patch('meniscus.data.cache_handler.time.time',
+                      MagicMock(return_value=1000.0)):
+            TenantCache().get_tenant(self.tenant_id)
+
+        value, expires_at = TenantCache.local_cache._items[self.tenant_id]
+        self.assertEqual(expires_at, 1030.0)
+
+    def test_expired_shared_entry_is_a_miss(self):
+        cache_get = MagicMock(return_value=with_expiry(
+            CACHE_CODEC.dumps_tenant(self.tenant), 990.0))
+        with patch.object(NativeProxy, 'cache_get', cache_get), \
+                patch('meniscus.data.cache_handler.time.time',
+                      MagicMock(return_value=1000.0)):
+            self.assertIsNone(TenantCache().get_tenant(self.tenant_id))
+        self.assertEqual(len(TenantCache.local_cache), 0)
 
     def test_get_tenant_calls_returns_tenant(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_get',  self.cache_get_tenant):
+        with patch.object(NativeProxy, 'cache_get', self.cache_get_tenant):
             tenant_cache = TenantCache()
             tenant = tenant_cache.get_tenant(self.tenant_id)
 
@@ -267,47 +274,128 @@ class WhenTestingTenantCache(unittest.TestCase):
         self.assertIsInstance(tenant, Tenant)
 
     def test_get_tenant_calls_returns_none(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false):
+        with patch.object(NativeProxy, 'cache_get', self.cache_none):
             tenant_cache = TenantCache()
             tenant = tenant_cache.get_tenant(self.tenant_id)
 
         self.assertIs(tenant, None)
 
-    def test_delete_tenant_calls_cache_del(self):
+    def test_get_tenant_reads_binary_entries(self):
+        cache_get = MagicMock(
+            return_value=BinaryCodec().dumps_tenant(self.tenant))
+        with patch.object(NativeProxy, 'cache_get', cache_get):
+            tenant = TenantCache().get_tenant(self.tenant_id)
+
+        self.assertEqual(tenant.format(), self.tenant.format())
+
+    def test_get_tenant_treats_unknown_codec_version_as_a_miss(self):
+        cache_get = MagicMock(return_value='\x7f unknown')
+        with patch.object(NativeProxy, 'cache_get', cache_get):
+            self.assertIsNone(TenantCache().get_tenant(self.tenant_id))
+
+    def test_set_tenant_records_entry_size(self):
+        writes = CACHE_SIZE_STATS.get_stats()[CACHE_TENANT]['writes']
+        with patch.object(NativeProxy, 'cache_update', self.cache_update):
+            TenantCache().set_tenant(self.tenant)
+
+        stats = CACHE_SIZE_STATS.get_stats()[CACHE_TENANT]
+        self.assertEqual(stats['writes'], writes + 1)
+        self.assertGreaterEqual(
+            stats['max_bytes'], len(CACHE_CODEC.dumps_tenant(self.tenant)))
+
+    def test_get_tenant_returns_local_copy_after_first_get(self):
+        with patch.object(NativeProxy, 'cache_get', self.cache_get_tenant):
+            tenant_cache = TenantCache()
+            tenant = tenant_cache.get_tenant(self.tenant_id)
+            self.assertIs(tenant_cache.get_tenant(self.tenant_id), tenant)
+
+        self.cache_get_tenant.assert_called_once_with(
+            self.tenant_id, CACHE_TENANT)
+
+    def test_delete_tenant_removes_local_copy(self):
         with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
+                NativeProxy, 'cache_update', self.cache_update
+        ), patch.object(
+                NativeProxy, 'cache_get', self.cache_none
         ), patch.object(NativeProxy, 'cache_del', self.cache_del):
+            tenant_cache = TenantCache()
+            tenant_cache.set_tenant(self.tenant)
+            self.assertIs(tenant_cache.get_tenant(self.tenant_id),
+                          self.tenant)
+            tenant_cache.delete_tenant(self.tenant_id)
+            self.assertIsNone(tenant_cache.get_tenant(self.tenant_id))
+
+    def test_delete_tenant_calls_cache_del(self):
+        with patch.object(NativeProxy, 'cache_del', self.cache_del):
             tenant_cache = TenantCache()
             tenant_cache.delete_tenant(self.tenant_id)
 
         self.cache_del.assert_called_once_with(
             self.tenant_id, CACHE_TENANT)
 
-    def test_delete_tenant_does_not_call_cache_del(self):
+    def test_set_many_updates_tenants_and_tokens_together(self):
+        cache_update_many = MagicMock()
+        expires_at = 1000.0 + DEFAULT_EXPIRES
         with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false
-        ), patch.object(NativeProxy, 'cache_del', self.cache_del):
+                NativeProxy, 'cache_update_many', cache_update_many), \
+                patch('meniscus.data.cache_handler.time.time',
+                      MagicMock(return_value=1000.0)):
             tenant_cache = TenantCache()
-            tenant_cache.delete_tenant(self.tenant_id)
+            tenant_cache.set_many([self.tenant])
+            self.assertIs(TokenCache.local_cache.get(self.tenant_id),
+                          self.tenant.token)
+
+        cache_update_many.assert_called_once_with([
+            (self.tenant_id,
+             with_expiry(CACHE_CODEC.dumps_tenant(self.tenant), expires_at),
+             CACHE_TENANT),
+            (self.tenant_id,
+             with_expiry(CACHE_CODEC.dumps_token(self.tenant.token),
+                         expires_at),
+             CACHE_TOKEN)
+        ], DEFAULT_EXPIRES)
+
+    def test_get_many_returns_tenant_and_token_pairs(self):
+        token_json = jsonutils.dumps(self.tenant.token.format())
+        cache_get_many = MagicMock(
+            return_value=[self.tenant_json, token_json, None, None])
+        with patch.object(NativeProxy, 'cache_get_many', cache_get_many):
+            tenant_cache = TenantCache()
+            pairs = tenant_cache.get_many([self.tenant_id, '102'])
+
+        cache_get_many.assert_called_once_with([
+            (self.tenant_id, CACHE_TENANT), (self.tenant_id, CACHE_TOKEN),
+            ('102', CACHE_TENANT), ('102', CACHE_TOKEN)
+        ])
+        tenant, token = pairs[0]
+        self.assertIsInstance(tenant, Tenant)
+        self.assertIsInstance(token, Token)
+        self.assertEqual(pairs[1], (None, None))
 
-        with self.assertRaises(AssertionError):
-            self.cache_del.assert_called_once_with(
-                self.tenant_id, CACHE_TENANT)
+    def test_get_many_skips_shared_cache_for_local_copies(self):
+        cache_get_many = MagicMock(return_value=[])
+        with patch.object(
+                NativeProxy, 'cache_update_many', MagicMock()
+        ), patch.object(NativeProxy, 'cache_get_many', cache_get_many):
+            tenant_cache = TenantCache()
+            tenant_cache.set_many([self.tenant])
+            pairs = tenant_cache.get_many([self.tenant_id])
+
+        cache_get_many.assert_called_once_with([])
+        self.assertEqual(pairs, [(self.tenant, self.tenant.token)])
 
 
 class WhenTestingTokenCache(unittest.TestCase):
     def setUp(self):
         self.cache_clear = MagicMock()
-        self.cache_true = MagicMock(return_value=True)
-        self.cache_false = MagicMock(return_value=False)
+        self.cache_none = MagicMock(return_value=None)
         self.cache_update = MagicMock()
-        self.cache_set = MagicMock()
         self.cache_del = MagicMock()
         self.tenant_id = '101'
         self.token = Token()
         self.token_json = jsonutils.dumps(self.token.format())
         self.cache_get_token = MagicMock(return_value=self.token_json)
+        TokenCache.local_cache.clear()
 
     def test_clear_calls_cache_clear(self):
         with patch.object(NativeProxy, 'cache_clear', self.cache_clear):
@@ -316,31 +404,20 @@ class WhenTestingTokenCache(unittest.TestCase):
         self.cache_clear.assert_called_once_with(CACHE_TOKEN)
 
     def test_set_token_calls_cache_update(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_update', self.cache_update):
+        with patch.object(NativeProxy, 'cache_update', self.cache_update), \
+                patch('meniscus.data.cache_handler.time.time',
+                      MagicMock(return_value=1000.0)):
             token_cache = TokenCache()
             token_cache.set_token(self.tenant_id, self.token)
 
         self.cache_update.assert_called_once_with(
-            self.tenant_id, jsonutils.dumps(self.token.format()),
-            DEFAULT_EXPIRES, CACHE_TOKEN)
-
-    def test_set_token_calls_cache_set(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false
-        ), patch.object(NativeProxy, 'cache_set', self.cache_set):
-            token_cache = TokenCache()
-            token_cache.set_token(self.tenant_id, self.token)
-
-        self.cache_set.assert_called_once_with(
-            self.tenant_id, jsonutils.dumps(self.token.format()),
+            self.tenant_id,
+            with_expiry(CACHE_CODEC.dumps_token(self.token),
+                        1000.0 + DEFAULT_EXPIRES),
             DEFAULT_EXPIRES, CACHE_TOKEN)
 
     def test_get_token_calls_returns_tenant(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_get',  self.cache_get_token):
+        with patch.object(NativeProxy, 'cache_get', self.cache_get_token):
             token_cache = TokenCache()
             token = token_cache.get_token(self.tenant_id)
 
@@ -349,42 +426,36 @@ class WhenTestingTokenCache(unittest.TestCase):
         self.assertIsInstance(token, Token)
 
     def test_get_token_calls_returns_none(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false):
+        with patch.object(NativeProxy, 'cache_get', self.cache_none):
             token_cache = TokenCache()
             token = token_cache.get_token(self.tenant_id)
 
         self.assertIs(token, None)
 
-    def test_delete_token_calls_cache_del(self):
+    def test_set_token_replaces_local_copy(self):
+        new_token = Token()
         with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_del', self.cache_del):
+                NativeProxy, 'cache_get', self.cache_get_token), \
+                patch.object(NativeProxy, 'cache_update', self.cache_update):
             token_cache = TokenCache()
-            token_cache.delete_token(self.tenant_id)
-
-        self.cache_del.assert_called_once_with(
-            self.tenant_id, CACHE_TOKEN)
+            token_cache.get_token(self.tenant_id)
+            token_cache.set_token(self.tenant_id, new_token)
+            self.assertIs(token_cache.get_token(self.tenant_id), new_token)
 
-    def test_delete_token_does_not_call_cache_del(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false
-        ), patch.object(NativeProxy, 'cache_del', self.cache_del):
+    def test_delete_token_calls_cache_del(self):
+        with patch.object(NativeProxy, 'cache_del', self.cache_del):
             token_cache = TokenCache()
             token_cache.delete_token(self.tenant_id)
 
-        with self.assertRaises(AssertionError):
-            self.cache_del.assert_called_once_with(
-                self.tenant_id, CACHE_TOKEN)
+        self.cache_del.assert_called_once_with(
+            self.tenant_id, CACHE_TOKEN)
 
 
 class WhenTestingBroadcastCache(unittest.TestCase):
     def setUp(self):
         self.cache_clear = MagicMock()
-        self.cache_true = MagicMock(return_value=True)
-        self.cache_false = MagicMock(return_value=False)
+        self.cache_none = MagicMock(return_value=None)
         self.cache_update = MagicMock()
-        self.cache_set = MagicMock()
         self.cache_del = MagicMock()
         self.message_type = 'ROUTES'
         self.target_list = [
@@ -404,9 +475,7 @@ class WhenTestingBroadcastCache(unittest.TestCase):
         self.cache_clear.assert_called_once_with(CACHE_BROADCAST)
 
     def test_set_message_and_targets_calls_cache_update(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_update', self.cache_update):
+        with patch.object(NativeProxy, 'cache_update', self.cache_update):
             broadcast_cache = BroadcastCache()
             broadcast_cache.set_message_and_targets(self.message_type,
                                                     self.target_list)
@@ -415,22 +484,8 @@ class WhenTestingBroadcastCache(unittest.TestCase):
             self.message_type, str(self.target_list),
             DEFAULT_EXPIRES, CACHE_BROADCAST)
 
-    def test_set_message_and_targets_calls_cache_set(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false
-        ), patch.object(NativeProxy, 'cache_set', self.cache_set):
-            broadcast_cache = BroadcastCache()
-            broadcast_cache.set_message_and_targets(self.message_type,
-                                                    self.target_list)
-
-        self.cache_set.assert_called_once_with(
-            self.message_type, str(self.target_list),
-            DEFAULT_EXPIRES, CACHE_BROADCAST)
-
     def test_get_targets_calls_returns_target_list(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_get',  self.cache_get_targets):
+        with patch.object(NativeProxy, 'cache_get', self.cache_get_targets):
             broadcast_cache = BroadcastCache()
             targets = broadcast_cache.get_targets(self.message_type)
 
@@ -439,34 +494,20 @@ class WhenTestingBroadcastCache(unittest.TestCase):
         self.assertEquals(targets, self.target_list)
 
     def test_get_targets_calls_returns_none(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false):
+        with patch.object(NativeProxy, 'cache_get', self.cache_none):
             broadcast_cache = BroadcastCache()
             targets = broadcast_cache.get_targets(self.target_list)
 
         self.assertIs(targets, None)
 
     def test_delete_message_calls_cache_del(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_true
-        ), patch.object(NativeProxy, 'cache_del', self.cache_del):
+        with patch.object(NativeProxy, 'cache_del', self.cache_del):
             broadcast_cache = BroadcastCache()
             broadcast_cache.delete_message(self.message_type)
 
         self.cache_del.assert_called_once_with(
             self.message_type, CACHE_BROADCAST)
 
-    def test_delete_message_does_not_call_cache_del(self):
-        with patch.object(
-                NativeProxy, 'cache_exists', self.cache_false
-        ), patch.object(NativeProxy, 'cache_del', self.cache_del):
-            broadcast_cache = BroadcastCache()
-            broadcast_cache.delete_message(self.message_type)
-
-        with self.assertRaises(AssertionError):
-            self.cache_del.assert_called_once_with(
-                self.message_type, CACHE_BROADCAST)
-
 
 class WhenTestingBlacklistCache(unittest.TestCase):
     pass
@@ -14,6 +14,7 @@ def suite():
     suite.addTest(WhenTestingHostObject())
     suite.addTest(WhenTestingTokenObject())
     suite.addTest(WhenTestingTenantObject())
+    suite.addTest(WhenTestingTenantIndex())
 
 
 class WhenTestingEventProducerObject(unittest.TestCase):
@@ -165,5 +166,82 @@ class WhenTestingTenantObject(unittest.TestCase):
         self.assertEqual(tenant_dict['event_producers'], [])
         self.assertEqual(tenant_dict['_id'], 'MDBid')
 
+    def test_tenants_do_not_share_default_lists(self):
+        tenant = Tenant('1023', self.test_token)
+        tenant.hosts.append(Host(1, 'ws-n01'))
+        self.assertEqual(Tenant('1024', self.test_token).hosts, [])
+
+
+class WhenTestingTenantIndex(unittest.TestCase):
+    def setUp(self):
+        self.host = Host(1, 'ws-n01')
+        self.duplicate_host = Host(2, 'ws-n01')
+        self.profile = HostProfile(3, 'appservers', [4])
+        self.producer = EventProducer(4, 'apache', 'apache2.cee')
+        self.tenant = Tenant('1022', Token(),
+                             [self.host, self.duplicate_host],
+                             [self.profile], [self.producer])
+
+    def test_index_maps_ids_and_names(self):
+        index = self.tenant.get_index()
+        self.assertIs(index.hosts_by_id[2], self.duplicate_host)
+        self.assertIs(index.profiles_by_name['appservers'], self.profile)
+        self.assertIs(index.producers_by_id[4], self.producer)
+        self.assertIs(index.producers_by_name['apache'], self.producer)
+
+    def test_first_of_duplicate_names_wins(self):
+        self.assertIs(self.tenant.get_index().hosts_by_name['ws-n01'],
+                      self.host)
+
+    def test_index_is_built_once(self):
+        self.assertIs(self.tenant.get_index(), self.tenant.get_index())
+
+    def test_index_is_rebuilt_when_a_list_changes(self):
+        new_host = Host(5, 'ws-n02')
+        self.tenant.get_index()
+        self.tenant.add_host(new_host)
+        self.assertIs(self.tenant.get_index().hosts_by_id[5], new_host)
+
+        self.tenant.remove_event_producer(self.producer)
+        self.assertEqual(self.tenant.get_index().producers_by_id, {})
+        self.assertEqual(self.profile.event_producers, [])
+
+    def test_index_is_rebuilt_after_a_rename(self):
+        self.tenant.get_index()
+        self.tenant.update_profile(self.profile, name='webservers')
+        self.assertIs(self.tenant.get_index().profiles_by_name['webservers'],
+                      self.profile)
+
+    def test_index_is_rebuilt_when_a_producer_is_replaced(self):
+        replacement = EventProducer(6, 'nginx', 'nginx.cee')
+        self.tenant.get_index()
+        self.tenant.remove_event_producer(self.producer)
+        self.tenant.add_event_producer(replacement)
+        self.assertEqual(self.tenant.get_index().producers_by_id,
+                         {6: replacement})
+
+    def test_every_change_bumps_the_version(self):
+        versions = [self.tenant.version]
+        self.tenant.update_event_producer(self.producer, pattern='x')
+        versions.append(self.tenant.version)
+        self.tenant.update_host(self.host, hostname='ws-n03')
+        versions.append(self.tenant.version)
+        self.tenant.remove_profile(self.profile)
+        versions.append(self.tenant.version)
+
+        self.assertEqual(versions, [0, 1, 2, 3])
+        self.assertEqual(self.producer.pattern, 'x')
+        self.assertIsNone(self.host.profile)
+
+    def test_profile_has_event_producer(self):
+        self.assertTrue(self.profile.has_event_producer(4))
+        self.assertFalse(self.profile.has_event_producer(5))
+        self.profile.set_event_producers([5])
+        self.assertTrue(self.profile.has_event_producer(5))
+        self.assertFalse(self.profile.has_event_producer(4))
+        self.profile.remove_event_producer(5)
+        self.assertFalse(self.profile.has_event_producer(5))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -59,6 +59,8 @@ class WhenTestingWorkerObject(unittest.TestCase):
         self.assertEqual(self.worker_route['worker_id'], '0123456789')
         self.assertEqual(self.worker_route['ip_address_v4'], '172.23.1.100')
         self.assertEqual(self.worker_route['ip_address_v6'], '::1')
+        self.assertEqual(self.worker_route['load_average'],
+                         self.system_info.load_average)
 
     def test_get_status(self):
         self.assertEqual(self.worker_status['hostname'], 'worker01')
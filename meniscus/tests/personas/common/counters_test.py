@@ -0,0 +1,33 @@
+import unittest
+
+from meniscus.personas.common.counters import SharedCounters
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(WhenTestingSharedCounters())
+    return suite
+
+
+class WhenTestingSharedCounters(unittest.TestCase):
+    def setUp(self):
+        self.counters = SharedCounters('messages', 'max_seconds')
+
+    def test_increment(self):
+        self.counters.increment('messages')
+        self.counters.increment('messages', 4)
+        self.assertEqual(self.counters.get('messages'), 5)
+
+    def test_maximum_only_raises_value(self):
+        self.counters.maximum('max_seconds', 2.5)
+        self.counters.maximum('max_seconds', 1.0)
+        self.assertEqual(self.counters.get('max_seconds'), 2.5)
+
+    def test_get_stats(self):
+        self.counters.increment('messages')
+        self.assertEqual(self.counters.get_stats(),
+                         {'messages': 1, 'max_seconds': 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from meniscus.personas.common.hash_ring import HashRing
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(WhenTestingHashRing())
+    return suite
+
+
+class WhenTestingHashRing(unittest.TestCase):
+    def setUp(self):
+        self.nodes = ['worker_1', 'worker_2', 'worker_3', 'worker_4']
+        self.keys = ['tenant_{0}'.format(i) for i in range(1000)]
+        self.ring = HashRing(self.nodes)
+
+    def test_get_node_returns_none_for_empty_ring(self):
+        self.assertIsNone(HashRing().get_node('tenant_1'))
+
+    def test_get_node_is_stable(self):
+        self.assertEqual(self.ring.get_node('tenant_1'),
+                         HashRing(self.nodes).get_node('tenant_1'))
+        self.assertEqual(self.ring.get_node(u'tenant_\xe9'),
+                         self.ring.get_node(u'tenant_\xe9'))
+
+    def test_keys_are_spread_across_nodes(self):
+        owners = [self.ring.get_node(key) for key in self.keys]
+        for node in self.nodes:
+            self.assertTrue(owners.count(node) > 100)
+
+    def test_removing_node_only_remaps_its_keys(self):
+        before = dict((key, self.ring.get_node(key)) for key in self.keys)
+        self.ring.remove_node('worker_2')
+        self.assertEqual(len(self.ring), 3)
+
+        for key in self.keys:
+            if before[key] != 'worker_2':
+                self.assertEqual(self.ring.get_node(key), before[key])
+            else:
+                self.assertNotEqual(self.ring.get_node(key), 'worker_2')
+
+    def test_adding_node_back_restores_mapping(self):
+        before = dict((key, self.ring.get_node(key)) for key in self.keys)
+        self.ring.remove_node('worker_2')
+        self.ring.add_node('worker_2')
+        after = dict((key, self.ring.get_node(key)) for key in self.keys)
+        self.assertEqual(before, after)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import httplib
+import struct
 import unittest
 
 from mock import MagicMock
@@ -166,6 +167,7 @@ class WhenTestingRouter(unittest.TestCase):
         with patch.object(routing.ConfigCache, 'get_config', self.get_config):
             router = routing.Router()
 
+        router._get_route_targets = MagicMock(return_value=None)
         router._personality = personalities.CORRELATION
         next_service_domain = router._get_next_service_domain()
         self.assertEqual(next_service_domain, personalities.STORAGE)
@@ -182,6 +184,68 @@ class WhenTestingRouter(unittest.TestCase):
         next_service_domain = router._get_next_service_domain()
         self.assertIsNone(next_service_domain)
 
+    def test_messages_go_to_normalization_workers_when_listed(self):
+        self.routes.append({"service_domain": "normalization",
+                            "targets": self.targets})
+        with patch.object(routing.ConfigCache, 'get_config',
+                          self.get_config), \
+                patch.object(routing.ConfigCache, 'get_routes',
+                             self.get_routes):
+            router = routing.Router()
+            router._blacklist_cache = self.blacklist_cache
+            self.blacklist_cache.is_worker_blacklisted.return_value = False
+            router._connect_worker = MagicMock()
+
+            for personality in (personalities.CORRELATION,
+                                personalities.SYSLOG):
+                router._personality = personality
+                self.assertEqual(router._get_next_service_domain(),
+                                 personalities.NORMALIZATION)
+            router._personality = personalities.NORMALIZATION
+            self.assertEqual(router._get_next_service_domain(),
+                             personalities.STORAGE)
+
+            #the routes are only looked at again once the refresh is due
+            del self.routes[-1]
+            router._personality = personalities.SYSLOG
+            checks = self.get_routes.call_count
+            self.assertEqual(router._get_next_service_domain(),
+                             personalities.NORMALIZATION)
+            self.assertEqual(self.get_routes.call_count, checks)
+            router._normalization_checked -= router._pool_refresh_interval + 1
+            self.assertEqual(router._get_next_service_domain(),
+                             personalities.STORAGE)
+        self.assertEqual(self.get_routes.call_count, checks + 1)
+
+    def test_messages_go_to_storage_without_normalization_connections(self):
+        self.routes.append({"service_domain": "normalization",
+                            "targets": self.targets})
+        with patch.object(routing.ConfigCache, 'get_config',
+                          self.get_config), \
+                patch.object(routing.ConfigCache, 'get_routes',
+                             self.get_routes):
+            router = routing.Router()
+            router._blacklist_cache = self.blacklist_cache
+            router._connect_worker = MagicMock()
+            router._personality = personalities.SYSLOG
+
+            #every listed normalization worker is blacklisted
+            self.blacklist_cache.is_worker_blacklisted.return_value = True
+            self.assertEqual(router._get_next_service_domain(),
+                             personalities.STORAGE)
+
+            self.blacklist_cache.is_worker_blacklisted.return_value = False
+            router._normalization_checked -= router._pool_refresh_interval + 1
+            self.assertEqual(router._get_next_service_domain(),
+                             personalities.NORMALIZATION)
+
+            #the connections are lost before the routes are checked again
+            pool = router._worker_pools[personalities.NORMALIZATION]
+            for worker_id in pool.worker_ids():
+                pool.remove(worker_id)
+            self.assertEqual(router._get_next_service_domain(),
+                             personalities.STORAGE)
+
     def test_get_route_targets(self):
         with patch.object(routing.ConfigCache, 'get_config',
                           self.get_config), \
@@ -203,6 +267,10 @@ class WhenTestingRouter(unittest.TestCase):
             router._blacklist_cache = self.blacklist_cache
             worker_id = '27f96f4e-f6f1-4e98-8fc1-2c59fd6387bf'
             service_domain = 'correlation'
+            sock = MagicMock()
+            pool = routing.WorkerPool()
+            pool.add({'worker_id': worker_id}, sock)
+            router._worker_pools[service_domain] = pool
             router._blacklist_worker(service_domain, worker_id)
         http_request.assert_called_once_with(
             "{0}/worker/{1}".format(self.config.coordinator_uri, worker_id),
@@ -212,7 +280,8 @@ class WhenTestingRouter(unittest.TestCase):
             },
             http_verb='PUT'
         )
-        self.assertIsNone(router._active_worker_socket[service_domain])
+        self.assertEqual(len(pool), 0)
+        sock.close.assert_called_once_with()
 
     def test_blacklist_worker_except(self):
         http_request = MagicMock(side_effect=requests.RequestException)
@@ -223,6 +292,10 @@ class WhenTestingRouter(unittest.TestCase):
             router._blacklist_cache = self.blacklist_cache
             worker_id = '27f96f4e-f6f1-4e98-8fc1-2c59fd6387bf'
             service_domain = 'correlation'
+            sock = MagicMock()
+            pool = routing.WorkerPool()
+            pool.add({'worker_id': worker_id}, sock)
+            router._worker_pools[service_domain] = pool
             router._blacklist_worker(service_domain, worker_id)
         http_request.assert_called_once_with(
             "{0}/worker/{1}".format(self.config.coordinator_uri, worker_id),
@@ -232,16 +305,18 @@ class WhenTestingRouter(unittest.TestCase):
             },
             http_verb='PUT'
         )
-        self.assertIsNone(router._active_worker_socket[service_domain])
+        self.assertEqual(len(pool), 0)
+        sock.close.assert_called_once_with()
 
     def test_get_worker_socket_returns_cached_socket(self):
         with patch.object(routing.ConfigCache, 'get_config', self.get_config):
             router = routing.Router()
             service_domain = 'correlation'
-            cached_worker_socket = ('worker', 'socket')
-            router._active_worker_socket[service_domain] = cached_worker_socket
+            pool = routing.WorkerPool()
+            pool.add(self.targets[0], 'socket')
+            router._worker_pools[service_domain] = pool
             worker_socket = router._get_worker_socket(service_domain)
-            self.assertEqual(cached_worker_socket, worker_socket)
+            self.assertEqual((self.targets[0], 'socket'), worker_socket)
 
     def test_get_worker_socket_returns_none(self):
         with patch.object(
@@ -251,7 +326,6 @@ class WhenTestingRouter(unittest.TestCase):
                 MagicMock(return_value=list())):
             router = routing.Router()
             service_domain = 'correlation'
-            router._active_worker_socket[service_domain] = None
             self.assertIsNone(router._get_worker_socket(service_domain))
 
     def test_get_worker_socket_returns_ipv4_socket(self):
@@ -265,9 +339,10 @@ class WhenTestingRouter(unittest.TestCase):
                       MagicMock(return_value=sock)):
             router = routing.Router()
             service_domain = 'correlation'
-            router._active_worker_socket[service_domain] = None
             self.assertTrue(router._get_worker_socket(service_domain))
-            sock.connect.assert_called_once_with(('127.0.0.1', 9001))
+            sock.connect.assert_called_with(('127.0.0.1', 9001))
+            self.assertEqual(len(router._worker_pools[service_domain]),
+                             len(self.targets))
 
     def test_get_worker_socket_returns_ipv6_socket(self):
         sock = MagicMock()
@@ -281,9 +356,8 @@ class WhenTestingRouter(unittest.TestCase):
                   MagicMock(return_value=sock)):
             router = routing.Router()
             service_domain = 'correlation'
-            router._active_worker_socket[service_domain] = None
             self.assertTrue(router._get_worker_socket(service_domain))
-            sock.connect.assert_called_once_with(('ff06::c3', 9001, 0, 0))
+            sock.connect.assert_any_call(('ff06::c3', 9001, 0, 0))
 
     def test_get_worker_socket_throws_exception(self):
         sock = MagicMock()
@@ -299,7 +373,6 @@ class WhenTestingRouter(unittest.TestCase):
                 patch.object(routing.Router, '_blacklist_worker', blacklist):
             router = routing.Router()
             service_domain = 'correlation'
-            router._active_worker_socket[service_domain] = None
             self.assertIsNone(router._get_worker_socket(service_domain))
             blacklist.assert_called()
 
@@ -325,9 +398,10 @@ class WhenTestingRouter(unittest.TestCase):
                          MagicMock(return_value='storage')), \
             patch.object(routing.Router, '_get_worker_socket',
                          MagicMock(return_value=None)):
-            with self.assertRaises(routing.RoutingException):
-                router = routing.Router()
+            router = routing.Router()
+            with self.assertRaises(routing.RoutingException) as raised:
                 router.route_message(self.message)
+            self.assertEqual(raised.exception.messages, [self.message])
 
     def test_route_message_calls_blacklist_on_failure(self):
         dispatch_message = MagicMock(side_effect=routing.DispatchException)
@@ -348,6 +422,201 @@ class WhenTestingRouter(unittest.TestCase):
                 router.route_message(self.message)
                 blacklist_worker.assert_called()
 
+    def test_route_message_buffers_until_batch_size(self):
+        dispatch_messages = MagicMock()
+        with patch.object(routing.ConfigCache, 'get_config',
+                          self.get_config), \
+                patch.object(routing.Router, '_get_next_service_domain',
+                             MagicMock(return_value='storage')), \
+                patch.object(routing.Router, '_get_worker_socket',
+                             MagicMock(return_value=({'worker_id': 'some_id'},
+                                                     'socket'))), \
+                patch.object(routing.Router, '_schedule_flush',
+                             MagicMock()), \
+                patch.object(routing.Dispatch, 'dispatch_messages',
+                             dispatch_messages):
+            router = routing.Router(batch_size=3)
+            router.route_message(self.message)
+            router.route_message(self.message)
+            self.assertFalse(dispatch_messages.called)
+            router.route_message(self.message)
+            dispatch_messages.assert_called_once_with(
+                [self.message, self.message, self.message], 'socket')
+            self.assertEqual(router._batches, dict())
+
+    def test_flush_dispatches_partial_batch(self):
+        dispatch_messages = MagicMock()
+        with patch.object(routing.ConfigCache, 'get_config',
+                          self.get_config), \
+                patch.object(routing.Router, '_get_next_service_domain',
+                             MagicMock(return_value='storage')), \
+                patch.object(routing.Router, '_get_worker_socket',
+                             MagicMock(return_value=({'worker_id': 'some_id'},
+                                                     'socket'))), \
+                patch.object(routing.Router, '_schedule_flush',
+                             MagicMock()), \
+                patch.object(routing.Dispatch, 'dispatch_messages',
+                             dispatch_messages):
+            router = routing.Router(batch_size=10)
+            router.route_message(self.message)
+            router.flush()
+            dispatch_messages.assert_called_once_with(
+                [self.message], 'socket')
+
+    def test_flush_throws_routing_exception(self):
+        with patch.object(routing.ConfigCache, 'get_config',
+                          self.get_config), \
+                patch.object(routing.Router, '_get_next_service_domain',
+                             MagicMock(return_value='storage')), \
+                patch.object(routing.Router, '_get_worker_socket',
+                             MagicMock(return_value=None)), \
+                patch.object(routing.Router, '_schedule_flush',
+                             MagicMock()):
+            router = routing.Router(batch_size=10)
+            router.route_message(self.message)
+            with self.assertRaises(routing.RoutingException) as raised:
+                router.flush()
+            self.assertEqual(raised.exception.messages, [self.message])
+            self.assertEqual(router._batches, dict())
+
+    def test_failed_timer_flush_calls_failure_handler(self):
+        with patch.object(routing.ConfigCache, 'get_config',
+                          self.get_config), \
+                patch.object(routing.Router, '_get_next_service_domain',
+                             MagicMock(return_value='storage')), \
+                patch.object(routing.Router, '_get_worker_socket',
+                             MagicMock(return_value=None)), \
+                patch.object(routing.Router, '_schedule_flush',
+                             MagicMock()):
+            router = routing.Router(batch_size=10)
+            router.on_failure = MagicMock()
+            router.route_message(self.message)
+            router._flush_on_timer()
+            router.on_failure.assert_called_once_with([self.message])
+            self.assertEqual(router.dropped_count, 0)
+
+    def test_failed_timer_flush_without_handler_counts_drops(self):
+        with patch.object(routing.ConfigCache, 'get_config',
+                          self.get_config), \
+                patch.object(routing.Router, '_get_next_service_domain',
+                             MagicMock(return_value='storage')), \
+                patch.object(routing.Router, '_get_worker_socket',
+                             MagicMock(return_value=None)), \
+                patch.object(routing.Router, '_schedule_flush',
+                             MagicMock()), \
+                patch.object(routing, '_LOG') as log:
+            router = routing.Router(batch_size=10)
+            router.route_message(self.message)
+            router.route_message(self.message)
+            router._flush_on_timer()
+            self.assertEqual(router.dropped_count, 2)
+            self.assertTrue(log.error.called)
+
+    def test_refresh_updates_connected_workers(self):
+        with patch.object(routing.ConfigCache, 'get_config',
+                          self.get_config):
+            router = routing.Router()
+        pool = routing.WorkerPool()
+        pool.add(dict(self.targets[0], load_average={'1': 0.5}), 'socket')
+        updated = dict(self.targets[0], load_average={'1': 9.0})
+        with patch.object(routing.Router, '_get_route_targets',
+                          MagicMock(return_value=[updated])), \
+                patch.object(router, '_blacklist_cache', self.blacklist_cache):
+            self.blacklist_cache.is_worker_blacklisted.return_value = False
+            router._refresh_worker_pool('correlation', pool)
+        self.assertEqual(pool.connections, [(updated, 'socket')])
+
+    def test_get_routing_key(self):
+        with patch.object(routing.ConfigCache, 'get_config',
+                          self.get_config):
+            router = routing.Router(hash_key=routing.HASH_KEY_TENANT)
+            self.assertEqual(router._get_routing_key(self.message),
+                             u'/tohru')
+
+            self.message['meniscus'] = {
+                'correlation': {'tenant_id': '1234'}}
+            self.assertEqual(router._get_routing_key(self.message), '1234')
+
+            router._hash_key = routing.HASH_KEY_HOST
+            self.assertEqual(router._get_routing_key(self.message),
+                             u'1234/tohru')
+
+    def test_route_message_uses_routing_key_for_consistent_hash(self):
+        get_worker_socket = MagicMock(
+            return_value=({'worker_id': 'some_id'}, 'socket'))
+        with patch.object(routing.ConfigCache, 'get_config',
+                          self.get_config), \
+                patch.object(routing.Router, '_get_next_service_domain',
+                             MagicMock(return_value='storage')), \
+                patch.object(routing.Router, '_get_worker_socket',
+                             get_worker_socket), \
+                patch.object(routing.Dispatch, 'dispatch_message',
+                             MagicMock()):
+            router = routing.Router(
+                balance_strategy=routing.CONSISTENT_HASH)
+            router.route_message(self.message)
+            get_worker_socket.assert_called_once_with('storage', u'/tohru')
+
+
+class WhenTestingWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.workers = [
+            {'worker_id': 'worker_1', 'load_average': {'1': 0.0}},
+            {'worker_id': 'worker_2', 'load_average': {'1': 0.0}},
+            {'worker_id': 'worker_3', 'load_average': {'1': 50.0}}
+        ]
+        self.pool = routing.WorkerPool()
+        for worker in self.workers:
+            self.pool.add(worker, MagicMock())
+
+    def test_select_returns_none_for_empty_pool(self):
+        self.assertIsNone(routing.WorkerPool().select())
+
+    def test_round_robin_cycles_through_workers(self):
+        selected = [self.pool.select(routing.ROUND_ROBIN)[0]['worker_id']
+                    for i in range(6)]
+        self.assertEqual(selected, ['worker_1', 'worker_2', 'worker_3',
+                                    'worker_1', 'worker_2', 'worker_3'])
+
+    def test_least_outstanding_skips_busy_workers(self):
+        unacked = {1: 4096, 2: 512, 3: 0}
+        for fileno, (worker, sock) in enumerate(self.pool.connections, 1):
+            sock.fileno.return_value = fileno
+
+        def ioctl(fileno, request, arg):
+            return struct.pack('i', unacked[fileno])
+        with patch('meniscus.personas.common.routing.fcntl.ioctl', ioctl):
+            self.assertEqual(self.pool.outstanding(
+                self.pool.connections[0][1]), 4096)
+            selected = [
+                self.pool.select(routing.LEAST_OUTSTANDING)[0]['worker_id']
+                for i in range(3)]
+        self.assertEqual(selected, ['worker_3'] * 3)
+
+    def test_least_outstanding_counts_closed_sockets_as_idle(self):
+        sock = MagicMock()
+        sock.fileno.side_effect = routing.socket.error
+        self.assertEqual(self.pool.outstanding(sock), 0)
+
+    def test_load_average_prefers_idle_workers(self):
+        selected = [self.pool.select(routing.LOAD_AVERAGE)[0]['worker_id']
+                    for i in range(300)]
+        self.assertTrue(selected.count('worker_3') <
+                        selected.count('worker_1'))
+
+    def test_remove_closes_socket(self):
+        worker, sock = self.pool.connections[0]
+        self.pool.remove('worker_1')
+        sock.close.assert_called_once_with()
+        self.assertEqual(self.pool.worker_ids(), ['worker_2', 'worker_3'])
+        self.assertEqual(len(self.pool.ring), 2)
+
+    def test_consistent_hash_keeps_key_on_same_worker(self):
+        first = self.pool.select(routing.CONSISTENT_HASH, 'tenant_1')
+        for i in range(5):
+            self.assertEqual(
+                self.pool.select(routing.CONSISTENT_HASH, 'tenant_1'), first)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,119 @@
+import threading
+import unittest
+
+from mock import MagicMock
+
+from meniscus.personas.common.routing import RoutingException
+from meniscus.personas.common.send_queue import SendQueue
+from meniscus.personas.common.send_queue import SendQueueFullException
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(WhenTestingSendQueue())
+    return suite
+
+
+class WhenTestingSendQueue(unittest.TestCase):
+    def setUp(self):
+        self.router = MagicMock()
+        self.message = {"message": "wlan0: leased 10.6.173.172"}
+
+    def test_route_message_hands_message_to_router(self):
+        send_queue = SendQueue(self.router)
+        send_queue.route_message(self.message)
+        send_queue._queue.join()
+        self.router.route_message.assert_called_once_with(self.message)
+        self.assertEqual(send_queue.sent_count, 1)
+        self.assertEqual(send_queue.depth(), 0)
+
+    def test_routing_failures_are_counted(self):
+        self.router.route_message.side_effect = RoutingException
+        send_queue = SendQueue(self.router)
+        send_queue.route_message(self.message)
+        send_queue._queue.join()
+        self.assertEqual(send_queue.failed_count, 1)
+
+    def test_each_message_of_a_failed_batch_is_counted(self):
+        self.router.route_message.side_effect = RoutingException(
+            [self.message, self.message, self.message])
+        send_queue = SendQueue(self.router)
+        send_queue.route_message(self.message)
+        send_queue._queue.join()
+        self.assertEqual(send_queue.failed_count, 3)
+        self.assertFalse(self.router.flush.called)
+
+    def test_route_message_raises_when_queue_is_full(self):
+        send_queue = SendQueue(self.router, max_size=1)
+        send_queue._start_sender = MagicMock()
+        send_queue.route_message(self.message)
+        with self.assertRaises(SendQueueFullException):
+            send_queue.route_message(self.message)
+        self.assertEqual(send_queue.rejected_count, 1)
+        self.assertEqual(send_queue.get_stats()['depth'], 1)
+
+    def test_waiting_callers_return_once_the_message_is_routed(self):
+        send_queue = SendQueue(self.router)
+        send_queue.route_message(self.message, wait=True)
+        self.router.route_message.assert_called_once_with(self.message)
+        self.router.flush.assert_called_once_with()
+
+    def test_waiting_callers_are_told_of_failed_flushes(self):
+        self.router.flush.side_effect = RoutingException(
+            [{'message': 'other'}, self.message])
+        send_queue = SendQueue(self.router)
+        with self.assertRaises(RoutingException):
+            send_queue.route_message(self.message, wait=True)
+        self.assertEqual(send_queue.failed_count, 2)
+
+    def test_waiting_callers_are_not_failed_by_other_messages(self):
+        self.router.flush.side_effect = RoutingException(
+            [{'message': 'other'}])
+        send_queue = SendQueue(self.router)
+        send_queue.route_message(self.message, wait=True)
+        self.assertEqual(send_queue.failed_count, 1)
+
+    def test_waiting_callers_are_told_of_routing_failures(self):
+        self.router.route_message.side_effect = RoutingException
+        send_queue = SendQueue(self.router)
+        with self.assertRaises(RoutingException) as raised:
+            send_queue.route_message(self.message, wait=True)
+        self.assertEqual(raised.exception.messages, [self.message])
+
+    def test_waiting_callers_give_up_after_wait_timeout(self):
+        send_queue = SendQueue(self.router, wait_timeout=0.01)
+        start_sender = send_queue._start_sender
+        send_queue._start_sender = MagicMock()
+        with self.assertRaises(RoutingException):
+            send_queue.route_message(self.message, wait=True)
+
+        #the message the caller was told failed is not routed later
+        start_sender()
+        send_queue._queue.join()
+        self.assertFalse(self.router.route_message.called)
+        self.assertEqual(send_queue.get_stats()['expired'], 1)
+
+    def test_waiting_callers_wait_for_a_message_being_routed(self):
+        routing = threading.Event()
+        release = threading.Event()
+
+        def route_message(message):
+            routing.set()
+            release.wait()
+        self.router.route_message.side_effect = route_message
+        send_queue = SendQueue(self.router, wait_timeout=0.01)
+        caller = threading.Thread(target=send_queue.route_message,
+                                  args=(self.message, True))
+        caller.start()
+        routing.wait()
+        caller.join(0.05)
+        self.assertTrue(caller.is_alive())
+
+        release.set()
+        caller.join()
+        self.assertEqual(send_queue.get_stats()['expired'], 0)
+        self.assertEqual(send_queue.sent_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,282 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from mock import MagicMock
+from mock import patch
+
+from meniscus.personas.common.routing import RoutingException
+from meniscus.personas.common.spill_queue import spill_size
+from meniscus.personas.common.spill_queue import SpillLog
+from meniscus.personas.common.spill_queue import SpillQueue
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(WhenTestingSpillLog))
+    suite.addTest(unittest.makeSuite(WhenTestingSpillQueue))
+    suite.addTest(unittest.makeSuite(WhenTestingSpillQueueReplay))
+    return suite
+
+
+def _message(index):
+    return {'hostname': 'tohru', 'message': 'message {0}'.format(index)}
+
+
+def _read_all(spill_log):
+    messages = list()
+    while spill_log.peek() is not None:
+        messages.append(spill_log.peek())
+        spill_log.pop()
+    return messages
+
+
+class WhenTestingSpillLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp('spill')
+        self.spill_log = SpillLog(self.directory, segment_size=100,
+                                  max_size=1000)
+
+    def tearDown(self):
+        self.spill_log.close()
+        shutil.rmtree(self.directory)
+
+    def _segment_files(self):
+        return [name for name in os.listdir(self.spill_log.directory)
+                if name.endswith('.spill')]
+
+    def test_each_log_claims_its_own_directory(self):
+        other = SpillLog(self.directory)
+        other.append(_message(0))
+        self.spill_log.append(_message(1))
+
+        self.assertNotEqual(other.directory, self.spill_log.directory)
+        self.assertEqual(spill_size(self.directory),
+                         other.size + self.spill_log.size)
+        other.close()
+        self.assertEqual(SpillLog(self.directory).directory, other.directory)
+
+    def test_messages_are_read_in_the_order_appended(self):
+        for index in range(5):
+            self.assertTrue(self.spill_log.append(_message(index)))
+
+        self.assertEqual(_read_all(self.spill_log),
+                         [_message(index) for index in range(5)])
+        self.assertIsNone(self.spill_log.peek())
+
+    def test_peek_does_not_consume(self):
+        self.spill_log.append(_message(0))
+        self.spill_log.append(_message(1))
+
+        self.assertEqual(self.spill_log.peek(), _message(0))
+        self.assertEqual(self.spill_log.peek(), _message(0))
+        self.spill_log.pop()
+        self.assertEqual(self.spill_log.peek(), _message(1))
+
+    def test_segments_are_rolled_and_deleted_once_read(self):
+        for index in range(5):
+            self.spill_log.append(_message(index))
+        self.assertEqual(len(self._segment_files()), 3)
+
+        _read_all(self.spill_log)
+
+        self.assertEqual(self._segment_files(), [])
+        self.assertEqual(self.spill_log.size, 0)
+
+    def test_appends_past_max_size_are_refused(self):
+        appended = 0
+        while self.spill_log.append(_message(appended)):
+            appended += 1
+
+        self.assertTrue(self.spill_log.size <= 1000)
+        self.assertEqual(len(_read_all(self.spill_log)), appended)
+
+    def test_reading_goes_on_from_the_synced_position(self):
+        for index in range(5):
+            self.spill_log.append(_message(index))
+        self.spill_log.peek()
+        self.spill_log.pop()
+        self.spill_log.sync()
+        self.spill_log.peek()
+        self.spill_log.pop()
+        self.spill_log.close()
+
+        spill_log = SpillLog(self.directory, segment_size=100)
+        spill_log.append(_message(5))
+
+        self.assertEqual(spill_log.directory, self.spill_log.directory)
+        self.assertEqual(_read_all(spill_log),
+                         [_message(index) for index in range(1, 6)])
+        spill_log.sync()
+        self.assertFalse(os.path.exists(
+            os.path.join(spill_log.directory, 'cursor')))
+        spill_log.close()
+
+    def test_records_cut_short_are_skipped(self):
+        self.spill_log.append(_message(0))
+        self.spill_log.append(_message(1))
+        self.spill_log.append(_message(2))
+        self.spill_log.close()
+        first = os.path.join(self.spill_log.directory,
+                             sorted(self._segment_files())[0])
+        with open(first, 'r+b') as segment:
+            segment.truncate(os.path.getsize(first) - 1)
+
+        spill_log = SpillLog(self.directory)
+
+        self.assertEqual(_read_all(spill_log), [_message(0), _message(2)])
+        spill_log.close()
+
+
+class WhenTestingSpillQueue(unittest.TestCase):
+    def setUp(self):
+        self.router = MagicMock()
+        self.spill_log = MagicMock()
+        self.spill_log.append.return_value = True
+        self.spill_queue = SpillQueue(
+            '/tmp/spill', router_factory=MagicMock(return_value=self.router),
+            spill_log_factory=MagicMock(return_value=self.spill_log))
+        self.spill_queue._start_replayer = MagicMock()
+        self.message = _message(0)
+
+    def test_each_process_gets_its_own_router_and_spill_log(self):
+        self.spill_queue.route_message(self.message)
+        self.spill_queue.route_message(self.message)
+        self.assertEqual(self.spill_queue.router_factory.call_count, 1)
+        self.spill_queue.spill_log_factory.assert_called_once_with(
+            '/tmp/spill')
+
+        with patch('meniscus.personas.common.spill_queue.os.getpid',
+                   return_value=-1):
+            self.spill_queue.route_message(self.message)
+
+        self.assertEqual(self.spill_queue.router_factory.call_count, 2)
+        self.assertEqual(self.spill_queue._start_replayer.call_count, 2)
+        self.assertIs(self.router.on_failure.__self__, self.spill_queue)
+
+    def test_failed_messages_are_spilled(self):
+        self.router.route_message.side_effect = RoutingException(
+            [_message(1), self.message])
+
+        self.spill_queue.route_message(self.message)
+
+        self.assertEqual(self.spill_log.append.call_count, 2)
+        self.assertEqual(self.spill_queue.counters.get('spilled'), 2)
+
+    def test_messages_are_dropped_when_the_log_is_full(self):
+        self.router.route_message.side_effect = RoutingException()
+        self.spill_log.append.return_value = False
+
+        with self.assertRaises(RoutingException):
+            self.spill_queue.route_message(self.message)
+        self.spill_log.append.assert_called_once_with(self.message)
+        self.assertEqual(self.spill_queue.counters.get('dropped'), 1)
+
+    def test_failed_timer_flushes_are_spilled(self):
+        self.spill_queue.flush()
+        self.router.on_failure([self.message])
+
+        self.spill_log.append.assert_called_once_with(self.message)
+
+    def test_failed_flushes_are_spilled(self):
+        self.router.flush.side_effect = RoutingException([self.message])
+
+        self.spill_queue.flush()
+
+        self.spill_log.append.assert_called_once_with(self.message)
+
+    def test_replay_routes_spilled_messages_up_to_limit(self):
+        self.spill_log.peek.return_value = self.message
+
+        self.assertEqual(self.spill_queue.replay(3), 3)
+
+        self.assertEqual(self.router.route_message.call_count, 3)
+        self.assertEqual(self.spill_log.pop.call_count, 3)
+        self.assertTrue(self.spill_log.sync.called)
+        self.assertEqual(self.spill_queue.counters.get('replayed'), 3)
+
+    def test_replay_stops_at_the_first_failure(self):
+        other = _message(1)
+        self.spill_log.peek.return_value = self.message
+        self.router.route_message.side_effect = RoutingException(
+            [other, self.message])
+
+        self.assertEqual(self.spill_queue.replay(3), 0)
+
+        self.assertFalse(self.spill_log.pop.called)
+        self.spill_log.append.assert_called_once_with(other)
+
+    def test_replay_stops_when_the_log_is_empty(self):
+        self.spill_log.peek.side_effect = [self.message, None]
+
+        self.assertEqual(self.spill_queue.replay(3), 1)
+
+    def test_get_stats(self):
+        with patch('meniscus.personas.common.spill_queue.spill_size',
+                   return_value=42):
+            stats = self.spill_queue.get_stats()
+
+        self.assertEqual(stats['disk_size'], 42)
+        self.assertEqual(stats['spilled'], 0)
+
+
+class SerialRouter(object):
+    """
+    a router that records any call made into it while another is running
+    """
+
+    def __init__(self):
+        self.running = 0
+        self.overlaps = 0
+        self.sent = list()
+        self.on_failure = None
+
+    def route_message(self, message):
+        self.running += 1
+        if self.running > 1:
+            self.overlaps += 1
+        time.sleep(0.0001)
+        self.sent.append(message)
+        self.running -= 1
+
+    def flush(self):
+        pass
+
+
+class WhenTestingSpillQueueReplay(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp('spill')
+        self.router = SerialRouter()
+        self.spill_queue = SpillQueue(
+            self.directory, router_factory=lambda: self.router)
+        self.spill_queue._start_replayer = MagicMock()
+
+    def tearDown(self):
+        self.spill_queue._spill_log.close()
+        shutil.rmtree(self.directory)
+
+    def test_replay_and_live_messages_do_not_overlap_in_the_router(self):
+        self.spill_queue._start()
+        spilled = [_message(index) for index in range(200)]
+        self.spill_queue._spill(spilled)
+        live = [_message(index) for index in range(200, 400)]
+
+        def route_live():
+            for message in live:
+                self.spill_queue.route_message(message)
+        sender = threading.Thread(target=route_live)
+        sender.start()
+        replayed = self.spill_queue.replay(len(spilled))
+        sender.join()
+
+        self.assertEqual(replayed, len(spilled))
+        self.assertEqual(self.router.overlaps, 0)
+        self.assertEqual(sorted(self.router.sent),
+                         sorted(spilled + live))
+
+
+if __name__ == '__main__':
+    unittest.main()
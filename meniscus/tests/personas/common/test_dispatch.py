@@ -41,3 +41,12 @@ class WhenTestingDispatch(unittest.TestCase):
         with patch.object(ObjectJsonWriter, 'write', write):
             with self.assertRaises(DispatchException):
                 dispatch.dispatch_message(self.message, self.sock)
+
+    def test_dispatch_messages_writes_batch_as_list(self):
+        dispatch = Dispatch()
+        write = MagicMock()
+        with patch.object(ObjectJsonWriter, 'write', write):
+            dispatch.dispatch_messages(
+                (self.message, self.message), self.sock)
+        write.assert_called_once_with(
+            dict(), [self.message, self.message], self.sock)
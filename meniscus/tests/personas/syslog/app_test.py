@@ -0,0 +1,106 @@
+import unittest
+
+from mock import MagicMock
+from mock import patch
+
+from meniscus.personas.common.routing import RoutingException
+from meniscus.personas.syslog.app import MessageHandler
+from meniscus.personas.syslog.app import start_up
+from meniscus.personas.syslog.listener import DatagramListener
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(WhenTestingMessageHandler))
+    suite.addTest(unittest.makeSuite(WhenTestingStartUp))
+    return suite
+
+
+class WhenTestingMessageHandler(unittest.TestCase):
+    def setUp(self):
+        self.router = MagicMock()
+        self.handler = MessageHandler(self.router, max_message_size=10)
+        self.head = MagicMock()
+        self.head.as_dict.return_value = {'hostname': 'tohru'}
+
+    def _routed(self):
+        return self.router.route_message.call_args[0][0]
+
+    def test_parts_are_joined_into_one_message(self):
+        self.handler.message_head(self.head)
+        self.handler.message_part(b'one ')
+        self.handler.message_part(b'two ')
+        self.handler.message_complete(b'3')
+
+        self.assertEqual(self._routed(),
+                         {'hostname': 'tohru', 'message': u'one two 3'})
+        self.assertEqual(self.handler.msg_count, 1)
+        self.assertEqual(self.handler.truncated_count, 0)
+
+    def test_oversize_messages_are_truncated_and_counted(self):
+        self.handler.message_head(self.head)
+        self.handler.message_part(b'12345678')
+        self.handler.message_part(b'90abc')
+        self.handler.message_complete(b'def')
+
+        self.assertEqual(self._routed()['message'], u'1234567890')
+        self.assertEqual(self.handler.truncated_count, 1)
+
+    def test_truncation_drops_a_split_character(self):
+        self.handler.message_head(self.head)
+        self.handler.message_complete(b'123456789\xc3\xa9')
+
+        self.assertEqual(self._routed()['message'], u'123456789')
+
+    def test_state_is_reset_for_the_next_message(self):
+        self.handler.message_head(self.head)
+        self.handler.message_complete(b'far too long a message')
+        self.handler.message_head(self.head)
+        self.handler.message_complete(b'short')
+
+        self.assertEqual(self._routed()['message'], u'short')
+        self.assertEqual(self.handler.msg_count, 2)
+        self.assertEqual(self.handler.truncated_count, 1)
+
+    def test_state_is_reset_when_routing_fails(self):
+        self.router.route_message.side_effect = RoutingException()
+        self.handler.message_head(self.head)
+        with self.assertRaises(RoutingException):
+            self.handler.message_complete(b'far too long a message')
+        self.router.route_message.side_effect = None
+        self.handler.message_head(self.head)
+        self.handler.message_complete(b'short')
+
+        self.assertEqual(self._routed()['message'], u'short')
+
+    def test_zero_leaves_messages_whole(self):
+        handler = MessageHandler(self.router, max_message_size=0)
+        handler.message_head(self.head)
+        handler.message_part(b'x' * 100)
+        handler.message_complete(b'')
+
+        self.assertEqual(len(self._routed()['message']), 100)
+        self.assertEqual(handler.truncated_count, 0)
+
+
+class WhenTestingStartUp(unittest.TestCase):
+
+    def test_one_udp_listener_runs_without_reuse_port_support(self):
+        app = 'meniscus.personas.syslog.app.'
+        with patch(app + 'reuse_port_supported', return_value=False), \
+                patch(app + 'ListenerPool') as listener_pool, \
+                patch(app + 'SyslogServer'), patch(app + 'Process'), \
+                patch(app + 'Router'), \
+                patch(app + 'WorkerStatusPublisher'), \
+                patch(app + 'WorkerStatsPublisher'):
+            start_up()
+
+        self.assertEqual(listener_pool.call_count, 1)
+        kwargs = listener_pool.call_args[1]
+        self.assertEqual(kwargs['processes'], 1)
+        self.assertIs(kwargs['listener_factory'], DatagramListener)
+        listener_pool.return_value.start.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import select
+import socket
+import time
+
+from mock import MagicMock
+
+from meniscus.api.normalization.drivers.rfc5424 import ParserError
+from meniscus.personas.common.counters import SharedCounters
+from meniscus.personas.syslog.listener import DatagramListener
+from meniscus.personas.syslog.listener import LISTENER_COUNTERS
+
+"""
+Times reading syslog datagrams from a udp socket, comparing the
+DatagramListener, which reads a batch into preallocated buffers at each
+wakeup, with polling, receiving, parsing and routing one datagram at a
+time. Run it with
+
+    python -m meniscus.tests.personas.syslog.datagram_listener_performance_test
+"""
+
+MESSAGE = '<13>1 2012-12-11T15:48:23.2Z host app 1 2 - a udp syslog message'
+#small enough rounds that the socket's receive buffer holds them all
+ROUND_SIZE = 100
+ROUNDS = 200
+BATCH_SIZES = [1, 16, 64]
+
+
+class PerformanceTest:
+    def setUp(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.setblocking(0)
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.poller = select.poll()
+        self.poller.register(self.sock, select.POLLIN)
+
+    def tearDown(self):
+        self.sock.close()
+        self.sender.close()
+
+    def _time(self, read):
+        address = self.sock.getsockname()
+        elapsed = 0.0
+        for round in xrange(ROUNDS):
+            for index in xrange(ROUND_SIZE):
+                self.sender.sendto(MESSAGE, address)
+            start = time.time()
+            received = 0
+            while received < ROUND_SIZE:
+                self.poller.poll(1000)
+                received += read()
+            elapsed += time.time() - start
+        return elapsed / (ROUNDS * ROUND_SIZE)
+
+    def _naive(self, listener, parser, router):
+        def read():
+            data = self.sock.recv(listener.receive_size)
+            try:
+                listener.route([parser.parse(data)], [], router)
+            except ParserError as ex:
+                listener.route([], [(0, ex)], router)
+            return 1
+        return read
+
+    def test_performance(self):
+        self.setUp()
+        try:
+            for batch_size in BATCH_SIZES:
+                listener = DatagramListener(
+                    None, SharedCounters(*LISTENER_COUNTERS), 0,
+                    batch_size=batch_size)
+                parser = listener.parser_factory()
+                router = MagicMock()
+                buffers = listener.buffers()
+
+                batched = self._time(lambda: listener.read(
+                    self.sock, buffers, parser, router))
+                naive = self._time(self._naive(listener, parser, router))
+
+                print (('batch of {0:>3}: batched reads {1:.2f} us, one '
+                        'datagram per wakeup {2:.2f} us per datagram')
+                       .format(batch_size, batched * 1000000,
+                               naive * 1000000))
+        finally:
+            self.tearDown()
+
+
+def main():
+    PerformanceTest().test_performance()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+import socket
+import unittest
+
+from mock import MagicMock, patch
+
+from meniscus.api.normalization.drivers.rfc3164 import SyslogSniffer
+from meniscus.api.normalization.drivers.rfc5424 import parse_many
+from meniscus.api.normalization.drivers.rfc5424_scanner import \
+    RFC5424MessageScanner
+from meniscus.personas.common.counters import SharedCounters
+from meniscus.personas.common.routing import RoutingException
+from meniscus.personas.syslog.listener import DatagramListener
+from meniscus.personas.syslog.listener import decode_message
+from meniscus.personas.syslog.listener import LISTENER_COUNTERS
+from meniscus.personas.syslog.listener import ListenerPool
+from meniscus.personas.syslog.listener import reuse_port_socket
+from meniscus.personas.syslog.listener import reuse_port_supported
+from meniscus.personas.syslog.listener import SyslogListener
+
+RFC5424_LINE = '<13>1 2012-12-11T15:48:23.2Z host app 1 2 - hello\n'
+RFC3164_LINE = '<13>Oct 11 22:14:15 host app[3]: hi\n'
+#lines the regex parser used to fail on with more than ParserError
+MALFORMED_LINES = [
+    '<34>1 2003-10-11T22:14:15.003Z host app 1 ID47 [ex@1host\n',
+    '<34>1 2003-10-11T22:14:15.003Z host app 1 ID47 [a\n',
+    '<34>1 2003-13-11T22:14:15.003Z host app 1 ID47 - hi\n'
+]
+
+
+def suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(WhenTestingDecodeMessage))
+    suite.addTest(unittest.makeSuite(WhenTestingReusePortSocket))
+    suite.addTest(unittest.makeSuite(WhenTestingSyslogListener))
+    suite.addTest(unittest.makeSuite(WhenTestingDatagramListener))
+    suite.addTest(unittest.makeSuite(WhenTestingListenerPool))
+    return suite
+
+
+class WhenTestingDecodeMessage(unittest.TestCase):
+    def test_short_messages_are_left_whole(self):
+        self.assertEqual(decode_message(b'caf\xc3\xa9', 10),
+                         (u'caf\xe9', False))
+
+    def test_long_messages_are_cut_at_a_character_boundary(self):
+        self.assertEqual(decode_message(b'12\xc3\xa9', 3), (u'12', True))
+        self.assertEqual(decode_message(b'1\xe2\x82\xac', 3), (u'1', True))
+        self.assertEqual(decode_message(b'\xf0\x9f\x98\x80', 3),
+                         (u'', True))
+        self.assertEqual(decode_message(b'12\xc3\xa9x', 4),
+                         (u'12\xe9', True))
+
+    def test_messages_cut_already_are_cut_at_a_character_boundary(self):
+        self.assertEqual(decode_message(b'ab\xc3', 0, cut=True),
+                         (u'ab', True))
+
+    def test_malformed_characters_are_replaced(self):
+        self.assertEqual(decode_message(b'a\xffb', 0), (u'a\ufffdb', False))
+
+    def test_missing_messages_are_left_missing(self):
+        self.assertEqual(decode_message(None, 10), (None, False))
+
+
+class WhenTestingReusePortSocket(unittest.TestCase):
+
+    def test_sockets_share_a_port(self):
+        if not reuse_port_supported():
+            return
+        first = reuse_port_socket(('127.0.0.1', 0))
+        second = reuse_port_socket(first.getsockname())
+        try:
+            self.assertEqual(first.getsockname(), second.getsockname())
+        finally:
+            first.close()
+            second.close()
+
+    def test_datagram_sockets_share_a_port(self):
+        if not reuse_port_supported():
+            return
+        first = reuse_port_socket(('127.0.0.1', 0),
+                                  sock_type=socket.SOCK_DGRAM)
+        second = reuse_port_socket(first.getsockname(),
+                                   sock_type=socket.SOCK_DGRAM)
+        try:
+            self.assertEqual(second.type, socket.SOCK_DGRAM)
+            self.assertEqual(first.getsockname(), second.getsockname())
+        finally:
+            first.close()
+            second.close()
+
+    def test_socket_is_bound_without_reuse_port_support(self):
+        with patch('meniscus.personas.syslog.listener.SO_REUSEPORT', None):
+            sock = reuse_port_socket(('127.0.0.1', 0),
+                                     sock_type=socket.SOCK_DGRAM)
+        try:
+            self.assertNotEqual(sock.getsockname()[1], 0)
+        finally:
+            sock.close()
+
+
+class WhenTestingSyslogListener(unittest.TestCase):
+
+    def setUp(self):
+        self.counters = SharedCounters(*LISTENER_COUNTERS)
+        self.listener = SyslogListener(('127.0.0.1', 0), self.counters, 20)
+        self.router = MagicMock()
+        self.parser = self.listener.parser_factory()
+        self.connection = MagicMock()
+        self.frames = self.listener.frame_buffer()
+
+    def _read(self, data):
+        self.connection.recv.return_value = data
+        return self.listener.read(self.connection, self.frames, self.parser,
+                                  self.router)
+
+    def _routed(self):
+        return [call[0][0] for call in
+                self.router.route_message.call_args_list]
+
+    def test_complete_frames_are_routed_in_either_format(self):
+        self.assertIs(self._read(RFC5424_LINE + RFC3164_LINE + '<13>1 - h'),
+                      self.frames)
+
+        self.assertEqual(self.frames.join(), '<13>1 - h')
+        routed = self._routed()
+        self.assertEqual([message['message'] for message in routed],
+                         [u'hello', u'hi'])
+        self.assertEqual(routed[1]['processid'], '3')
+        self.assertEqual(self.counters.get('messages'), 2)
+        self.assertEqual(self.counters.get('bytes'),
+                         len(RFC5424_LINE + RFC3164_LINE) + 9)
+
+    def test_closed_connections_finish_the_last_frame(self):
+        self._read(RFC5424_LINE.rstrip('\n'))
+
+        self.assertIsNone(self._read(b''))
+        self.assertEqual(self._routed()[0]['message'], u'hello')
+
+    def test_unfinished_frames_are_only_parsed_once_they_may_be_complete(self):
+        octet_counted = '{0} {1}'.format(len(RFC5424_LINE), RFC5424_LINE)
+        with patch('meniscus.personas.syslog.listener.parse_many',
+                   wraps=parse_many) as parse:
+            for data in (RFC5424_LINE[:10], RFC5424_LINE[10:20],
+                         RFC5424_LINE[20:], octet_counted[:20],
+                         octet_counted[20:30], octet_counted[30:]):
+                self._read(data)
+
+        #the first read of each frame and the read completing it
+        self.assertEqual(parse.call_count, 4)
+        self.assertEqual(len(self._routed()), 2)
+
+    def test_unparsable_frames_are_counted(self):
+        self._read('not syslog\n' + RFC5424_LINE)
+
+        self.assertEqual(self.counters.get('errors'), 1)
+        self.assertEqual(self.counters.get('messages'), 1)
+
+    def test_malformed_lines_are_counted_as_errors(self):
+        self._read(''.join(MALFORMED_LINES) + RFC5424_LINE)
+
+        self.assertEqual(self.counters.get('errors'), len(MALFORMED_LINES))
+        self.assertEqual([message['message'] for message in self._routed()],
+                         [u'hello'])
+
+    def test_lazily_scanned_messages_are_checked_as_routed(self):
+        self.parser = SyslogSniffer(RFC5424MessageScanner(), lazy=True)
+
+        self._read(RFC5424_LINE.replace(' - ', ' [id ab=1] ') +
+                   RFC5424_LINE + RFC3164_LINE)
+
+        self.assertEqual([message['message'] for message in self._routed()],
+                         [u'hello', u'hi'])
+        self.assertEqual(self._routed()[0]['timestamp'],
+                         '2012-12-11T15:48:23.2Z')
+        self.assertEqual(self.counters.get('errors'), 1)
+        self.assertEqual(self.counters.get('messages'), 2)
+
+    def test_long_messages_are_truncated(self):
+        self._read(RFC5424_LINE.replace('hello', 'x' * 30))
+
+        self.assertEqual(self._routed()[0]['message'], u'x' * 20)
+        self.assertEqual(self.counters.get('truncated'), 1)
+
+    def test_truncation_drops_a_split_character(self):
+        self._read(RFC5424_LINE.replace('hello', 'x' * 19 + '\xc3\xa9'))
+
+        self.assertEqual(self._routed()[0]['message'], u'x' * 19)
+        self.assertEqual(self.counters.get('truncated'), 1)
+
+    def test_oversize_frames_are_cut_and_routed(self):
+        frame = '<13>1 - host app 1 2 - ' + 'x' * 3000
+
+        self.assertIs(self._read(frame[:1500]), self.frames)
+        self.assertIs(self._read(frame[1500:]), self.frames)
+        self._read('x' * 100 + '\n' + RFC5424_LINE)
+
+        self.assertEqual([message['message'] for message in self._routed()],
+                         [u'x' * 20, u'hello'])
+        self.assertEqual(self.counters.get('oversize'), 1)
+        self.assertEqual(self.counters.get('truncated'), 1)
+        self.assertEqual(self.counters.get('errors'), 0)
+
+    def test_oversize_octet_counted_frames_are_cut_and_routed(self):
+        message = '<13>1 - host app 1 2 - ' + 'x' * 3000
+        frame = '{0} {1}'.format(len(message), message)
+
+        self._read(frame[:2500])
+        self._read(frame[2500:2800])
+        self._read(frame[2800:] + RFC5424_LINE)
+
+        self.assertEqual([message['message'] for message in self._routed()],
+                         [u'x' * 20, u'hello'])
+        self.assertEqual(self.counters.get('oversize'), 1)
+        self.assertEqual(self.counters.get('truncated'), 1)
+
+    def test_routing_failures_are_counted(self):
+        self.router.route_message.side_effect = RoutingException()
+
+        self._read(RFC5424_LINE)
+
+        self.assertEqual(self.counters.get('routing_failures'), 1)
+
+    def test_interrupted_reads_keep_the_buffer(self):
+        self.connection.recv.side_effect = socket.error(11, 'again')
+
+        self.frames.reset(b'<13>')
+
+        self.assertIs(self.listener.read(self.connection, self.frames,
+                                         self.parser, self.router),
+                      self.frames)
+        self.assertEqual(self.frames.join(), b'<13>')
+
+
+class WhenTestingDatagramListener(unittest.TestCase):
+
+    def setUp(self):
+        self.counters = SharedCounters(*LISTENER_COUNTERS)
+        self.listener = DatagramListener(
+            ('127.0.0.1', 0), self.counters, 20, receive_size=70,
+            batch_size=2)
+        self.router = MagicMock()
+        self.parser = self.listener.parser_factory()
+        self.buffers = self.listener.buffers()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.setblocking(0)
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def tearDown(self):
+        self.sock.close()
+        self.sender.close()
+
+    def _send(self, *datagrams):
+        for datagram in datagrams:
+            self.sender.sendto(datagram, self.sock.getsockname())
+
+    def _read(self):
+        return self.listener.read(self.sock, self.buffers, self.parser,
+                                  self.router)
+
+    def _routed(self):
+        return [call[0][0]['message'] for call in
+                self.router.route_message.call_args_list]
+
+    def test_buffers_are_allocated_once_per_batch(self):
+        self.assertEqual(len(self.buffers), 2)
+        self.assertEqual([len(buffer) for buffer in self.buffers], [70, 70])
+
+    def test_each_datagram_holds_one_message(self):
+        self._send(RFC5424_LINE, RFC3164_LINE.rstrip('\n'))
+
+        self.assertEqual(self._read(), 2)
+        self.assertEqual(self._routed(), [u'hello', u'hi'])
+        self.assertEqual(self.counters.get('messages'), 2)
+        self.assertEqual(self.counters.get('bytes'),
+                         len(RFC5424_LINE + RFC3164_LINE) - 1)
+
+    def test_a_read_takes_at_most_a_batch(self):
+        self._send(RFC5424_LINE, RFC5424_LINE, RFC5424_LINE)
+
+        self.assertEqual(self._read(), 2)
+        self.assertEqual(self._read(), 1)
+        self.assertEqual(self._read(), 0)
+        self.assertEqual(self.counters.get('messages'), 3)
+
+    def test_unparsable_datagrams_are_counted(self):
+        self._send('not syslog', '')
+
+        self._read()
+
+        self.assertEqual(self.counters.get('errors'), 2)
+        self.assertFalse(self.router.route_message.called)
+
+    def test_malformed_datagrams_are_counted_as_errors(self):
+        self.listener.batch_size = len(MALFORMED_LINES) + 1
+        self.buffers = self.listener.buffers()
+        self._send(*(MALFORMED_LINES + [RFC5424_LINE]))
+
+        self._read()
+
+        self.assertEqual(self.counters.get('errors'), len(MALFORMED_LINES))
+        self.assertEqual(self._routed(), [u'hello'])
+
+    def test_long_datagrams_are_cut_and_counted(self):
+        self._send(RFC5424_LINE.replace('hello', 'x' * 60))
+
+        self._read()
+
+        self.assertEqual(self.counters.get('oversize'), 1)
+        self.assertEqual(self.counters.get('bytes'), 70)
+        self.assertEqual(self._routed(), [u'x' * 20])
+        self.assertEqual(self.counters.get('truncated'), 1)
+
+
+class WhenTestingListenerPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ListenerPool(('127.0.0.1', 0), 1024, processes=2)
+
+    def test_processes_default_to_cpu_core_count(self):
+        with patch('meniscus.personas.syslog.listener.'
+                   'sys_assist.get_cpu_core_count', return_value='3'):
+            pool = ListenerPool(('127.0.0.1', 0), 1024, processes=0)
+        self.assertEqual(pool.processes, 3)
+        self.assertEqual(len(pool.listener_stats), 3)
+
+    def test_exited_listeners_are_restarted(self):
+        alive = MagicMock()
+        alive.is_alive.return_value = True
+        exited = MagicMock()
+        exited.is_alive.return_value = False
+        self.pool._listeners = [alive, exited]
+
+        with patch('meniscus.personas.syslog.listener.Process') as process:
+            self.pool.restart_exited()
+
+        self.assertEqual(process.call_count, 1)
+        self.assertTrue(process.return_value.start.called)
+        self.assertIs(self.pool._listeners[0], alive)
+        self.assertIs(self.pool._listeners[1], process.return_value)
+        self.assertEqual(self.pool.listener_stats[1].get('restarts'), 1)
+        self.assertEqual(self.pool.listener_stats[0].get('restarts'), 0)
+
+    def test_listeners_route_through_the_router_factory(self):
+        listener_factory = MagicMock()
+        router_factory = MagicMock()
+        pool = ListenerPool(('127.0.0.1', 0), 1024, processes=1,
+                            listener_factory=listener_factory,
+                            router_factory=router_factory)
+
+        with patch('meniscus.personas.syslog.listener.Process'):
+            pool.start()
+        pool._stopping.set()
+
+        listener_factory.assert_called_once_with(
+            ('127.0.0.1', 0), pool.listener_stats[0], 1024,
+            router_factory=router_factory)
+
+    def test_get_stats(self):
+        self.pool.listener_stats[0].increment('messages', 3)
+        self.pool.listener_stats[1].increment('messages', 4)
+
+        stats = self.pool.get_stats()
+
+        self.assertEqual(stats['processes'], 2)
+        self.assertEqual(stats['messages'], 7)
+        self.assertEqual(stats['listeners']['1']['messages'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
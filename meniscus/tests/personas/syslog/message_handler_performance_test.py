@@ -0,0 +1,70 @@
+import time
+
+from mock import MagicMock
+
+from meniscus.personas.syslog.app import MessageHandler
+
+"""
+Times assembling large syslog messages from many parts, comparing the
+MessageHandler with concatenating the parts onto a string as it did
+before. Run it with
+
+    python -m meniscus.tests.personas.syslog.message_handler_performance_test
+"""
+
+PART_SIZE = 512
+MESSAGE_SIZES = [64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024]
+
+
+class ConcatenatingHandler(object):
+
+    def __init__(self):
+        self.msg = b''
+
+    def message_head(self, message_head):
+        pass
+
+    def message_part(self, message_part):
+        self.msg += message_part
+
+    def message_complete(self, last_message_part):
+        full_message = self.msg + last_message_part
+        self.msg = b''
+        return full_message.decode('utf-8')
+
+
+class PerformanceTest:
+    def _time(self, handler, message_size, iterations):
+        head = MagicMock()
+        head.as_dict.return_value = {}
+        part = b'x' * PART_SIZE
+        parts = message_size // PART_SIZE
+        start = time.time()
+        for iteration in xrange(iterations):
+            handler.message_head(head)
+            for index in xrange(parts):
+                handler.message_part(part)
+            handler.message_complete(b'')
+        return (time.time() - start) / iterations
+
+    def test_performance(self):
+        for message_size in MESSAGE_SIZES:
+            iterations = max(1, (4 * 1024 * 1024) // message_size)
+
+            chunked = self._time(
+                MessageHandler(MagicMock(), max_message_size=0),
+                message_size, iterations)
+            concatenated = self._time(
+                ConcatenatingHandler(), message_size, iterations)
+
+            print (('{0:>5} KB message in {1} byte parts: chunk list '
+                    '{2:.2f} ms, concatenation {3:.2f} ms')
+                   .format(message_size // 1024, PART_SIZE,
+                           chunked * 1000, concatenated * 1000))
+
+
+def main():
+    PerformanceTest().test_performance()
+
+if __name__ == '__main__':
+    main()